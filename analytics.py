@@ -0,0 +1,315 @@
+import logging
+import os
+import re
+import threading
+from array import array
+from typing import Dict, Iterable, List, Optional
+from urllib.parse import quote
+
+import numpy as np
+
+from query_filters import NO_DATE, extract_filters, from_day, mentions, to_day
+
+AGGREGATE_PATTERN = re.compile(
+    r"\b(how much|how many|total|totals|sum|spent|spend|spending|count|average|breakdown|per category|by category|by month)\b"
+)
+
+_CODED = ("category", "merchant", "user", "source")
+
+
+class _Dictionary:
+    """Maps string values to dense integer codes"""
+
+    def __init__(self, values: Iterable[str] = ()):
+        self.values: List[str] = []
+        self.codes: Dict[str, int] = {}
+        for value in values:
+            self.code(value)
+
+    def code(self, value: str) -> int:
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+
+class TransactionBatch:
+    """Transaction rows collected during one sync, kept in compact arrays"""
+
+    def __init__(self):
+        self.amount = array('d')
+        self.day = array('i')
+        self.codes = {name: array('i') for name in _CODED}
+        self.dictionaries = {name: _Dictionary() for name in _CODED}
+
+    def __len__(self) -> int:
+        return len(self.amount)
+
+    def add(self, metadata: dict, username: str, source_id: str):
+        self.amount.append(float(metadata.get('amount') or 0))
+        day = metadata.get('date_days')
+        self.day.append(day if day is not None else to_day(metadata.get('date') or ''))
+        values = {
+            "category": metadata.get('category') or '',
+            "merchant": metadata.get('merchant') or '',
+            "user": (username or '').lower(),
+            "source": source_id,
+        }
+        for name, value in values.items():
+            self.codes[name].append(self.dictionaries[name].code(value))
+
+
+class TransactionColumns:
+    """Columnar transactions of one namespace: amounts, epoch days and coded strings"""
+
+    def __init__(self):
+        self.amount = np.zeros(0, dtype=np.float64)
+        self.day = np.zeros(0, dtype=np.int32)
+        self.codes = {name: np.zeros(0, dtype=np.int32) for name in _CODED}
+        self.dictionaries = {name: _Dictionary() for name in _CODED}
+
+    def __len__(self) -> int:
+        return len(self.amount)
+
+    def append(self, batch: TransactionBatch):
+        self.amount = np.concatenate([self.amount, np.frombuffer(batch.amount, dtype=np.float64)])
+        self.day = np.concatenate([self.day, np.frombuffer(batch.day, dtype=np.int32)])
+        for name in _CODED:
+            # Translate the batch's codes into this store's dictionary
+            mapping = np.array(
+                [self.dictionaries[name].code(value) for value in batch.dictionaries[name].values],
+                dtype=np.int32
+            )
+            codes = np.frombuffer(batch.codes[name], dtype=np.int32)
+            self.codes[name] = np.concatenate([self.codes[name], mapping[codes] if len(codes) else codes])
+
+    def keep(self, mask: np.ndarray):
+        self.amount = self.amount[mask]
+        self.day = self.day[mask]
+        for name in _CODED:
+            self.codes[name] = self.codes[name][mask]
+
+    def code_mask(self, name: str, values: Iterable[str]) -> np.ndarray:
+        codes = [self.dictionaries[name].codes[value] for value in values if value in self.dictionaries[name].codes]
+        return np.isin(self.codes[name], codes)
+
+    def mask(self, username: Optional[str] = None, categories: Optional[List[str]] = None,
+             merchants: Optional[List[str]] = None, start_day: Optional[int] = None,
+             end_day: Optional[int] = None, month_of_year: Optional[int] = None,
+             min_amount: Optional[float] = None, max_amount: Optional[float] = None) -> np.ndarray:
+        mask = np.ones(len(self), dtype=bool)
+        if username is not None:
+            mask &= self.code_mask("user", [username])
+        if categories:
+            mask &= self.code_mask("category", categories)
+        if merchants:
+            mask &= self.code_mask("merchant", merchants)
+        if start_day is not None:
+            mask &= self.day >= start_day
+        if end_day is not None:
+            mask &= (self.day <= end_day) & (self.day != NO_DATE)
+        if month_of_year is not None:
+            months = self.day.astype('datetime64[D]').astype('datetime64[M]').astype(np.int64) % 12 + 1
+            mask &= (months == month_of_year) & (self.day != NO_DATE)
+        if min_amount is not None:
+            mask &= np.abs(self.amount) >= min_amount
+        if max_amount is not None:
+            mask &= np.abs(self.amount) <= max_amount
+        return mask
+
+    def totals(self, mask: np.ndarray) -> dict:
+        amounts = self.amount[mask]
+        days = self.day[mask]
+        days = days[days != NO_DATE]
+        return {
+            "count": int(mask.sum()),
+            "debit": float(amounts[amounts >= 0].sum()),
+            "credit": float(amounts[amounts < 0].sum()),
+            "first_day": int(days.min()) if len(days) else None,
+            "last_day": int(days.max()) if len(days) else None,
+        }
+
+    def group_by(self, name: str, mask: np.ndarray) -> Dict[str, dict]:
+        """Count, debit and credit totals per value of a coded column"""
+        codes = self.codes[name][mask]
+        amounts = self.amount[mask]
+        size = len(self.dictionaries[name].values)
+        counts = np.bincount(codes, minlength=size)
+        debits = np.bincount(codes, weights=np.where(amounts >= 0, amounts, 0), minlength=size)
+        credits = np.bincount(codes, weights=np.where(amounts < 0, amounts, 0), minlength=size)
+        return {
+            self.dictionaries[name].values[code]: {
+                "count": int(counts[code]), "debit": float(debits[code]), "credit": float(credits[code])
+            }
+            for code in np.flatnonzero(counts)
+        }
+
+    def group_by_month(self, mask: np.ndarray) -> Dict[str, dict]:
+        mask = mask & (self.day != NO_DATE)
+        months = self.day[mask].astype('datetime64[D]').astype('datetime64[M]')
+        amounts = self.amount[mask]
+        groups = {}
+        for month in np.unique(months):
+            selected = amounts[months == month]
+            groups[str(month)] = {
+                "count": int(len(selected)),
+                "debit": float(selected[selected >= 0].sum()),
+                "credit": float(selected[selected < 0].sum()),
+            }
+        return groups
+
+    def save(self, path: str):
+        arrays = {"amount": self.amount, "day": self.day}
+        for name in _CODED:
+            arrays[f"{name}_codes"] = self.codes[name]
+            arrays[f"{name}_values"] = np.array(self.dictionaries[name].values, dtype=str)
+        tmp_path = f"{path}.tmp.npz"
+        np.savez(tmp_path, **arrays)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "TransactionColumns":
+        columns = cls()
+        with np.load(path) as data:
+            columns.amount = data["amount"]
+            columns.day = data["day"]
+            for name in _CODED:
+                columns.codes[name] = data[f"{name}_codes"]
+                columns.dictionaries[name] = _Dictionary(data[f"{name}_values"].tolist())
+        return columns
+
+
+def _merge(groups: Dict[str, dict], more: Dict[str, dict]):
+    for key, values in more.items():
+        target = groups.setdefault(key, {"count": 0, "debit": 0.0, "credit": 0.0})
+        for field in ("count", "debit", "credit"):
+            target[field] += values[field]
+
+
+def _format_groups(title: str, groups: Dict[str, dict], limit: int, rank: bool = True) -> List[str]:
+    lines = [f"{title}:"]
+    ranked = list(groups.items())
+    if rank:
+        ranked.sort(key=lambda item: item[1]["debit"], reverse=True)
+    for key, values in ranked[:limit]:
+        lines.append(
+            f"- {key or 'Unknown'}: {values['count']} transactions, "
+            f"debits ${values['debit']:.2f}, credits ${values['credit']:.2f}"
+        )
+    if len(ranked) > limit:
+        lines.append(f"- ... and {len(ranked) - limit} more")
+    return lines
+
+
+class TransactionAnalytics:
+    """Per-namespace columnar transaction stores with sum/count/group-by queries.
+
+    Each namespace is persisted as one ``.npz`` file under ``path`` and loaded
+    on first use.
+    """
+
+    def __init__(self, path: str = "analytics"):
+        self.path = path
+        self._stores: Dict[str, TransactionColumns] = {}
+        self._lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+
+    def _file(self, namespace: str) -> str:
+        return os.path.join(self.path, f"{quote(namespace, safe='')}.npz")
+
+    def _store(self, namespace: str) -> Optional[TransactionColumns]:
+        store = self._stores.get(namespace)
+        if store is None and os.path.exists(self._file(namespace)):
+            store = self._stores[namespace] = TransactionColumns.load(self._file(namespace))
+        return store
+
+    def replace_source(self, namespace: str, source_id: str, batch: TransactionBatch):
+        """Replace all rows of a source in a namespace with a freshly synced batch"""
+        with self._lock:
+            store = self._store(namespace) or TransactionColumns()
+            if len(store):
+                store.keep(~store.code_mask("source", [source_id]))
+            store.append(batch)
+            self._stores[namespace] = store
+            store.save(self._file(namespace))
+        logging.info(f"Stored {len(batch)} transactions from {source_id} in columnar store for {namespace}")
+
+    def remove_source(self, namespace: str, source_id: str):
+        with self._lock:
+            store = self._store(namespace)
+            if store is None:
+                return
+            store.keep(~store.code_mask("source", [source_id]))
+            if len(store):
+                store.save(self._file(namespace))
+            else:
+                self._stores.pop(namespace, None)
+                os.remove(self._file(namespace))
+
+    def describe(self, namespaces: List[str], username: str, question: str) -> Optional[str]:
+        """Exact aggregates for the transactions a question asks about, as prompt context.
+
+        Returns None when none of the namespaces hold columnar data for the user,
+        so the caller can fall back to document retrieval.
+        """
+        question_lower = question.lower()
+        with self._lock:
+            stores = [store for store in (self._store(ns) for ns in namespaces) if store is not None]
+            stores = [store for store in stores if username in store.dictionaries["user"].codes]
+            if not stores:
+                return None
+
+            # Categories and merchants named in the question, matched against known values
+            categories = set()
+            merchants = set()
+            for store in stores:
+                for value in store.dictionaries["category"].values:
+                    if value and mentions(question_lower, value, plural=True):
+                        categories.add(value)
+                for value in store.dictionaries["merchant"].values:
+                    if value and mentions(question_lower, value):
+                        merchants.add(value)
+
+            bounds = extract_filters(question)
+            filters = {"username": username, "categories": sorted(categories), "merchants": sorted(merchants),
+                       **bounds.bounds()}
+
+            totals = {"count": 0, "debit": 0.0, "credit": 0.0}
+            first_days, last_days = [], []
+            by_category, by_month, by_merchant = {}, {}, {}
+            for store in stores:
+                mask = store.mask(**filters)
+                result = store.totals(mask)
+                _merge({"all": totals}, {"all": result})
+                if result["first_day"] is not None:
+                    first_days.append(result["first_day"])
+                    last_days.append(result["last_day"])
+                _merge(by_category, store.group_by("category", mask))
+                _merge(by_merchant, store.group_by("merchant", mask))
+                _merge(by_month, store.group_by_month(mask))
+
+        scope = [f"period: {bounds.period}"]
+        amounts = bounds.describe_amount()
+        if amounts:
+            scope.append(f"amounts: {amounts}")
+        if categories:
+            scope.append(f"categories: {', '.join(c.replace('_', ' ').title() for c in sorted(categories))}")
+        if merchants:
+            scope.append(f"merchants: {', '.join(sorted(merchants))}")
+        lines = [
+            f"Exact aggregates computed over all stored transactions for {username} ({'; '.join(scope)}):",
+            f"- Number of transactions: {totals['count']}",
+            f"- Total debits: ${totals['debit']:.2f}",
+            f"- Total credits: ${totals['credit']:.2f}",
+            f"- Net change: ${(totals['debit'] + totals['credit']):.2f}",
+        ]
+        if first_days:
+            lines.append(f"- Date range: {from_day(min(first_days))} to {from_day(max(last_days))}")
+        if totals["count"]:
+            by_category = {key.replace('_', ' ').title(): values for key, values in by_category.items()}
+            lines += _format_groups("By category", by_category, limit=20)
+            if len(by_month) > 1:
+                lines += _format_groups("By month", dict(sorted(by_month.items())), limit=24, rank=False)
+            lines += _format_groups("Top merchants", by_merchant, limit=10)
+        return "\n".join(lines)
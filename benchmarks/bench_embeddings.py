@@ -0,0 +1,80 @@
+"""Measure document embedding throughput by number of worker processes.
+
+Formats a synthetic transaction feed the way ingestion does and embeds it
+with `PooledEmbeddings` at each worker count, plus the in-process model as
+the baseline. Pool start-up (spawning workers and loading the model) is
+excluded by a warm-up call, so the numbers reflect steady-state ingestion.
+With --fake the hashing embedder from `fakes.py` stands in for the model,
+which measures only the pool's dispatch overhead and runs offline.
+
+    python benchmarks/bench_embeddings.py --texts 20000 --workers 1,2,4,8
+"""
+import argparse
+import os
+import sys
+import time
+from functools import partial
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bench_formatter import feed  # noqa: E402
+
+
+def texts(count: int) -> list:
+    from formatters import RecordFormatter
+
+    usernames = {str(user_id): f"client{user_id}" for user_id in range(100)}
+    return [record.page_content for record in RecordFormatter().format_batch(feed(count), usernames)]
+
+
+def factory(args):
+    if args.fake:
+        from fakes import HashEmbeddings
+        return partial(HashEmbeddings, dim=args.dim)
+    from langchain_huggingface import HuggingFaceEmbeddings
+    return partial(HuggingFaceEmbeddings, model_name=args.model, encode_kwargs={"batch_size": args.batch_size})
+
+
+def measure(embeddings, corpus: list, chunk: int) -> float:
+    """Sentences/sec embedding the corpus in ingestion-sized calls"""
+    embeddings.embed_documents(corpus[:chunk])  # Warm up: load the model or start the workers
+    start = time.perf_counter()
+    for offset in range(0, len(corpus), chunk):
+        embeddings.embed_documents(corpus[offset:offset + chunk])
+    return len(corpus) / (time.perf_counter() - start)
+
+
+def main():
+    from embedding_pool import PooledEmbeddings, available_cpus
+
+    cpus = available_cpus()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--texts", type=int, default=20000)
+    parser.add_argument("--workers", default=",".join(str(2 ** i) for i in range(cpus.bit_length()) if 2 ** i <= cpus),
+                        help="comma separated worker counts")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--chunk", type=int, default=1000, help="texts per embed_documents call")
+    parser.add_argument("--model", default="sentence-transformers/all-mpnet-base-v2")
+    parser.add_argument("--fake", action="store_true", help="use the hashing embedder instead of the model")
+    parser.add_argument("--dim", type=int, default=768)
+    args = parser.parse_args()
+
+    corpus = texts(args.texts)
+    build = factory(args)
+    print(f"{len(corpus)} texts, {cpus} cores, batch size {args.batch_size}, {args.chunk} texts per call")
+
+    baseline = measure(build(), corpus, args.chunk)
+    print(f"  {'in-process':<12}{baseline:>12,.0f} sentences/sec")
+    for workers in [int(value) for value in args.workers.split(",")]:
+        pooled = PooledEmbeddings(build, workers=workers, batch_size=args.batch_size)
+        try:
+            rate = measure(pooled, corpus, args.chunk)
+        finally:
+            pooled.close()
+        print(f"  {f'{workers} workers':<12}{rate:>12,.0f} sentences/sec  "
+              f"({rate / workers:,.0f} per worker, {rate / baseline:.2f}x in-process)")
+
+
+if __name__ == "__main__":
+    main()
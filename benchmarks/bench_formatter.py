@@ -0,0 +1,121 @@
+"""Measure rows/sec of turning raw transaction records into ingestible documents.
+
+"before" is the previous path: each row formatted on its own with amounts
+round-tripped through str, wrapped in a langchain Document, and every batch
+run through the text splitter. "after" is `RecordFormatter.format_batch`
+followed by `split_long`, which passes one-chunk documents through. Both
+cover the same work up to tagging and embedding; no HTTP or vector store is
+involved.
+
+    python benchmarks/bench_formatter.py --rows 1000000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import date, timedelta
+from itertools import batched
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from fakes import CATEGORIES, MERCHANTS  # noqa: E402
+
+BATCH_SIZE = 256
+
+
+def feed(rows: int, users: int = 100, seed: int = 7) -> list:
+    rng = random.Random(seed)
+    start = date(2024, 1, 1)
+    return [
+        {
+            "id": f"{i % users}-{i}",
+            "user_id": i % users,
+            "amount": round(rng.uniform(1, 400), 2) * (-1 if rng.random() < 0.1 else 1),
+            "category": rng.choice(CATEGORIES),
+            "name": rng.choice(MERCHANTS),
+            "date": (start + timedelta(days=rng.randrange(366))).isoformat() + "T00:00:00Z",
+        }
+        for i in range(rows)
+    ]
+
+
+def legacy_format(item: dict, username: str):
+    """The per-row formatting APILoader used before RecordFormatter"""
+    metadata = {
+        "type": "transaction",
+        "data_type": "transaction",
+        "user_id": str(item.get('user_id', '')),
+        "username": username,
+        "transaction_id": str(item.get('id', '')),
+        "category": item.get('category', ''),
+        "amount": str(item.get('amount', 0)),
+        "date": item.get('date', '').split('T')[0],
+        "merchant": item.get('name', ''),
+        "transaction_type": "credit" if item.get('amount', 0) < 0 else "debit"
+    }
+    if metadata['transaction_id']:
+        metadata['doc_id'] = f"transaction-{metadata['transaction_id']}"
+    content = (
+        f"A {metadata['transaction_type']} transaction of ${abs(float(metadata['amount']))} "
+        f"by {username if username else 'user ' + metadata['user_id']} "
+        f"at {metadata['merchant']} on {metadata['date']} "
+        f"in the {metadata['category'].replace('_', ' ').title()} category."
+    )
+    return content, metadata
+
+
+def before(rows: list, usernames: dict, splitter) -> int:
+    from langchain_core.documents import Document
+
+    count = 0
+    for batch in batched(rows, BATCH_SIZE):
+        documents = []
+        for item in batch:
+            content, metadata = legacy_format(item, usernames.get(str(item['user_id'])))
+            documents.append(Document(page_content=content, metadata=metadata))
+        count += len(splitter.split_documents(documents))
+    return count
+
+
+def after(rows: list, usernames: dict, splitter, chunk_size: int) -> int:
+    from formatters import RecordFormatter, split_long
+
+    formatter = RecordFormatter()
+    count = 0
+    for batch in batched(rows, BATCH_SIZE):
+        count += len(split_long(formatter.format_batch(batch, usernames), splitter, chunk_size))
+    return count
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    count = function(*args)
+    return count, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--chunk-size", type=int, default=500)
+    parser.add_argument("--skip-before", action="store_true", help="only measure the new path")
+    args = parser.parse_args()
+
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+    splitter = RecursiveCharacterTextSplitter(chunk_size=args.chunk_size, chunk_overlap=0)
+    rows = feed(args.rows)
+    usernames = {str(user_id): f"client{user_id}" for user_id in range(100)}
+    print(f"{args.rows} synthetic transactions, batches of {BATCH_SIZE}")
+
+    count, seconds = timed(after, rows, usernames, splitter, args.chunk_size)
+    print(f"  after:  {count / seconds:>12,.0f} rows/sec ({seconds:.2f}s, {count} documents)")
+    if not args.skip_before:
+        legacy_count, legacy_seconds = timed(before, rows, usernames, splitter)
+        print(f"  before: {legacy_count / legacy_seconds:>12,.0f} rows/sec ({legacy_seconds:.2f}s, {legacy_count} documents)")
+        print(f"  speedup: {legacy_seconds / seconds:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
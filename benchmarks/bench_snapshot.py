@@ -0,0 +1,97 @@
+"""Measure namespace snapshot export and import against ingesting from the API.
+
+Ingests one synthetic transaction source into an in-memory `LocalVectorStore`
+(with the hashing embedder from `fakes.py`, so the ingest figure excludes
+real embedding cost and is an upper bound), exports the namespace with each
+vector dtype and imports every snapshot into a fresh environment. Reports
+docs/sec per step, bytes per document and the largest change in top-10
+search scores after the round trip (scores rather than ids, since the
+hashing embedder produces many ties).
+
+    python benchmarks/bench_snapshot.py --rows 50000
+"""
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import time
+import types
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from suite import build_mqr, offline_config  # noqa: E402
+
+QUESTIONS = ["coffee at Starbucks", "flights with Delta", "groceries at Whole Foods", "streaming subscription"]
+
+
+def top_scores(mqr, namespace: str, k: int = 10) -> list:
+    return [
+        score
+        for question in QUESTIONS
+        for _, score in mqr.vector_store.similarity_search_with_score(question, k=k, namespace=namespace)
+    ]
+
+
+def timed(function, *args, **kwargs):
+    start = time.perf_counter()
+    if not function(*args, **kwargs):
+        raise RuntimeError(f"{function.__name__} failed")
+    return time.perf_counter() - start
+
+
+def measure(args, api, workdir: str):
+    fakes = types.SimpleNamespace(dim=args.dim, llm_first_token_ms=0, llm_token_ms=0, multi_query=False)
+    namespace = "transactions-client1"
+    os.makedirs(os.path.join(workdir, "source"))
+    os.chdir(os.path.join(workdir, "source"))
+    mqr = build_mqr(fakes)
+    config = {
+        "name": "tx", "endpoint": f"{api.url}/users/1/transactions", "description": "Synthetic transactions",
+        "namespace": namespace, "data_key": "data", "data_type": "transactions",
+        "username": "client1", "user_id": "1", "pagination": {"type": "page", "page_size": 1000},
+    }
+    seconds = timed(mqr.add_api_source, "tx", config)
+    documents = mqr.vector_store.count(namespace)
+    expected = top_scores(mqr, namespace)
+    print(f"{documents} documents, dimension {args.dim}")
+    print(f"  {'ingest from API':<22}{documents / seconds:>12,.0f} docs/sec (hashing embedder)")
+
+    for dtype in ("float32", "float16"):
+        path = os.path.join(workdir, f"{namespace}.{dtype}.fsnap")
+        seconds = timed(mqr.export_namespace, namespace, path, dtype=dtype)
+        print(f"  {f'export {dtype}':<22}{documents / seconds:>12,.0f} docs/sec, "
+              f"{os.path.getsize(path) / documents:,.0f} bytes/doc")
+
+        os.makedirs(os.path.join(workdir, dtype))
+        os.chdir(os.path.join(workdir, dtype))
+        restored = build_mqr(fakes)
+        seconds = timed(restored.import_namespace, path)
+        error = max(abs(a - b) for a, b in zip(expected, top_scores(restored, namespace)))
+        print(f"  {f'import {dtype}':<22}{documents / seconds:>12,.0f} docs/sec, "
+              f"{restored.vector_store.count(namespace)} restored, top-10 score error {error:.1e}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=50000)
+    parser.add_argument("--dim", type=int, default=768)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    offline_config()
+    from fakes import SyntheticAPI
+
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix="finsight-snapshot-", ignore_cleanup_errors=True) as workdir, \
+            SyntheticAPI(users=1, rows_per_user=args.rows) as api:
+        try:
+            measure(args, api, workdir)
+        finally:
+            os.chdir(cwd)
+
+
+if __name__ == "__main__":
+    main()
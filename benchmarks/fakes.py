@@ -0,0 +1,157 @@
+"""Offline stand-ins for the transaction API, embedding model and LLM.
+
+Everything here is deterministic so benchmark runs are comparable.
+"""
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Iterator, List, Optional
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+CATEGORIES = ["food_and_drink", "groceries", "transportation", "entertainment", "shopping", "utilities", "travel"]
+MERCHANTS = ["Starbucks", "Whole Foods", "Uber", "Netflix", "Amazon", "Shell", "Delta", "Chipotle", "Target", "Lyft"]
+_WORD = re.compile(r"\w+")
+
+
+class SyntheticAPI:
+    """Local HTTP server with /users and /users/<id>/transactions endpoints.
+
+    Responses are paginated with ``page`` and ``per_page`` the same way the
+    loader's default page pagination expects, and wrapped in a ``data`` key.
+    """
+
+    def __init__(self, users: int = 10, rows_per_user: int = 1000, seed: int = 7):
+        self.users = [{"id": i, "username": f"client{i}"} for i in range(1, users + 1)]
+        self.rows_per_user = rows_per_user
+        self.seed = seed
+        self.requests = 0
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def transactions(self, user_id: int, start: int, stop: int) -> List[dict]:
+        rows = []
+        for i in range(start, min(stop, self.rows_per_user)):
+            rng = random.Random(f"{self.seed}:{user_id}:{i}")
+            amount = round(rng.uniform(1, 400), 2) * (-1 if rng.random() < 0.1 else 1)
+            rows.append({
+                "id": f"{user_id}-{i}",
+                "user_id": user_id,
+                "amount": amount,
+                "category": rng.choice(CATEGORIES),
+                "name": rng.choice(MERCHANTS),
+                "date": (date(2024, 1, 1) + timedelta(days=rng.randrange(366))).isoformat() + "T00:00:00Z",
+            })
+        return rows
+
+    def _handler(self):
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                api.requests += 1
+                url = urlparse(self.path)
+                query = parse_qs(url.query)
+                page = int(query.get("page", ["1"])[0])
+                per_page = int(query.get("per_page", ["100"])[0])
+                start = (page - 1) * per_page
+                parts = url.path.strip("/").split("/")
+                if parts == ["users"]:
+                    data = api.users[start:start + per_page]
+                elif len(parts) == 3 and parts[0] == "users" and parts[2] == "transactions":
+                    data = api.transactions(int(parts[1]), start, start + per_page)
+                else:
+                    self.send_error(404)
+                    return
+                body = json.dumps({"data": data, "page": page}).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+class HashEmbeddings(Embeddings):
+    """Deterministic bag-of-words feature hashing in place of a sentence-transformer"""
+
+    def __init__(self, dim: int = 768):
+        self.dim = dim
+
+    def _embed(self, text: str) -> List[float]:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for word in _WORD.findall(text.lower()):
+            digest = hashlib.blake2b(word.encode("utf-8"), digest_size=8).digest()
+            bucket = int.from_bytes(digest[:4], "little") % self.dim
+            vector[bucket] += 1.0 if digest[4] & 1 else -1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text)
+
+
+class CannedChatModel(BaseChatModel):
+    """Chat model that answers instantly from a template, with optional simulated latency.
+
+    ``first_token_delay`` stands in for prompt processing and ``token_delay``
+    for generation. Rewrite prompts get a few paraphrases of the question.
+    """
+
+    answer: str = "Based on the available data, here is a summary of the transactions you asked about."
+    first_token_delay: float = 0.0
+    token_delay: float = 0.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "canned"
+
+    def _respond(self, messages: List[BaseMessage]) -> str:
+        prompt = messages[-1].content
+        if "Original question:" in prompt:
+            question = prompt.rsplit("Original question:", 1)[1].strip()
+            return "\n".join([f"{question} details", f"list {question}", f"records about {question}"])
+        return self.answer
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager=None, **kwargs: Any) -> ChatResult:
+        text = "".join(chunk.message.content for chunk in self._stream(messages, stop, run_manager, **kwargs))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                run_manager=None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        time.sleep(self.first_token_delay)
+        for i, token in enumerate(re.findall(r"\S+\s*", self._respond(messages))):
+            if i:
+                time.sleep(self.token_delay)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
@@ -0,0 +1,56 @@
+"""Measure CLI time-to-prompt in command mode.
+
+Each run starts a fresh interpreter that imports mqr, constructs MQR and lists
+the active sources, which is everything `main()` does before the first
+prompt. The first run is reported as cold, the median of the remaining runs
+as warm. With --eager the LLM, embedding model and vector store are built as
+well, which is what startup used to cost before components became lazy.
+
+    python benchmarks/startup.py --runs 5 [--eager]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = """
+import json, resource, time
+start = time.perf_counter()
+import mqr
+instance = mqr.MQR()
+instance.source_manager.get_active_sources()
+if {eager}:
+    instance.llm, instance.embeddings, instance.vector_store
+elapsed = time.perf_counter() - start
+print(json.dumps({{"seconds": elapsed, "max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss}}))
+"""
+
+
+def run_once(eager: bool) -> dict:
+    result = subprocess.run(
+        [sys.executable, "-c", PROBE.format(eager=eager)],
+        cwd=ROOT, capture_output=True, text=True, check=True
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--eager", action="store_true", help="also build the LLM, embeddings and vector store")
+    args = parser.parse_args()
+
+    runs = [run_once(args.eager) for _ in range(max(args.runs, 2))]
+    warm = [run["seconds"] for run in runs[1:]]
+    print(f"{'eager' if args.eager else 'lazy'} startup over {len(runs)} runs")
+    print(f"  cold time-to-prompt: {runs[0]['seconds']:.3f}s")
+    print(f"  warm time-to-prompt: {statistics.median(warm):.3f}s (median), {min(warm):.3f}s (best)")
+    print(f"  peak RSS: {max(run['max_rss_kb'] for run in runs) / 1024:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,232 @@
+"""End-to-end ingest and chat benchmark that runs fully offline.
+
+A local synthetic API serves users and paginated transactions. The embedding
+model, vector store and LLM are replaced on the `MQR` instance with a hashing
+embedder, an in-memory `LocalVectorStore` and a canned chat model. The suite
+then adds every source, refreshes them unchanged, asks a fixed mix of chat
+questions twice (uncached and cached) and removes the sources. Everything
+runs inside a temporary directory, so no local state is touched.
+
+Results are compared against a stored baseline, and the exit status is 1
+when a metric is worse than the baseline by more than --tolerance.
+
+    python benchmarks/suite.py --users 20 --rows 2000 [--save-baseline]
+"""
+import argparse
+import contextlib
+import io
+import json
+import logging
+import os
+import resource
+import statistics
+import sys
+import tempfile
+import time
+import types
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+DEFAULT_BASELINE = os.path.join(ROOT, "benchmarks", "baseline.json")
+
+# Metric -> whether higher values are better
+METRICS = {
+    "ingest_docs_per_sec": True,
+    "refresh_docs_per_sec": True,
+    "chat_p50_ms": False,
+    "chat_p99_ms": False,
+    "cached_chat_p50_ms": False,
+    "remove_seconds": False,
+    "peak_rss_mb": False,
+}
+
+
+def offline_config():
+    """Provide config values when no config.py exists; none of them are used offline"""
+    try:
+        import config  # noqa: F401
+    except ImportError:
+        config = types.ModuleType("config")
+        config.pinecone_api_key = ""
+        config.pinecone_index_name = ""
+        config.llama_endpoint = "http://127.0.0.1:9/v1"
+        config.vector_backend = "local"
+        sys.modules["config"] = config
+
+
+def build_mqr(args):
+    from fakes import CannedChatModel, HashEmbeddings
+    from local_store import LocalVectorStore
+    from mqr import MQR
+
+    mqr = MQR()
+    # Lazy components are plain instance attributes once set, so the fakes replace them
+    mqr.vector_backend = "local"
+    mqr.embeddings = HashEmbeddings(dim=args.dim)
+    mqr.embedding_workers = 1  # Keep ingestion on the fake instead of spawning model workers
+    mqr.vector_store = LocalVectorStore(embedding=mqr.embeddings, path=None)
+    mqr.llm = CannedChatModel(first_token_delay=args.llm_first_token_ms / 1000, token_delay=args.llm_token_ms / 1000)
+    mqr.multi_query = args.multi_query
+    return mqr
+
+
+def questions(usernames):
+    asked = ["Who are the users?"]
+    for username in usernames:
+        asked += [
+            f"How much did {username} spend on groceries in March?",
+            f"Show the transaction summary for {username}",
+            f"What did {username} buy at Starbucks?",
+            f"Any travel transactions for {username} in 2024?",
+        ]
+    return asked
+
+
+def percentile(samples, q):
+    ordered = sorted(samples)
+    return ordered[min(int(q / 100 * len(ordered)), len(ordered) - 1)]
+
+
+def run(args) -> dict:
+    from fakes import SyntheticAPI
+    from tracing import tracer
+
+    tracer.enabled = True
+    tracer.reset()
+    with SyntheticAPI(users=args.users, rows_per_user=args.rows) as api:
+        mqr = build_mqr(args)
+        pagination = {"type": "page", "page_size": args.page_size}
+        sources = {"users": {
+            "name": "users", "endpoint": f"{api.url}/users", "description": "Synthetic users",
+            "namespace": "users", "data_key": "data", "data_type": "users", "pagination": pagination,
+        }}
+        for user in api.users:
+            sources[f"tx-{user['username']}"] = {
+                "name": f"tx-{user['username']}", "endpoint": f"{api.url}/users/{user['id']}/transactions",
+                "description": f"Synthetic transactions of {user['username']}",
+                "namespace": f"transactions-{user['username']}", "data_key": "data",
+                "data_type": "transactions", "username": user["username"], "user_id": str(user["id"]),
+                "pagination": pagination,
+            }
+        documents = args.users * (args.rows + 1) + args.users
+
+        start = time.perf_counter()
+        for source_id, config in sources.items():
+            if not mqr.add_api_source(source_id, config):
+                raise RuntimeError(f"Failed to add {source_id}")
+        ingest_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for source_id in sources:
+            if not mqr.refresh_api_source(source_id):
+                raise RuntimeError(f"Failed to refresh {source_id}")
+        refresh_seconds = time.perf_counter() - start
+
+        asked = questions([user["username"] for user in api.users])
+        uncached, cached = [], []
+        for timings in (uncached, cached):
+            for question in asked:
+                start = time.perf_counter()
+                mqr.chat(question)
+                timings.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            for source_id in sources:
+                mqr.remove_api_source(source_id)
+        remove_seconds = time.perf_counter() - start
+
+    return {
+        "metrics": {
+            "ingest_docs_per_sec": documents / ingest_seconds,
+            "refresh_docs_per_sec": documents / refresh_seconds,
+            "chat_p50_ms": statistics.median(uncached) * 1000,
+            "chat_p99_ms": percentile(uncached, 99) * 1000,
+            "cached_chat_p50_ms": statistics.median(cached) * 1000,
+            "remove_seconds": remove_seconds,
+            "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        },
+        "documents": documents,
+        "questions": len(asked),
+        "http_requests": api.requests,
+        "stages": tracer.stats(),
+    }
+
+
+def compare(metrics: dict, baseline: dict, tolerance: float) -> list:
+    regressions = []
+    for name, higher_is_better in METRICS.items():
+        if name not in baseline or not baseline[name]:
+            continue
+        change = (metrics[name] - baseline[name]) / baseline[name]
+        if (-change if higher_is_better else change) > tolerance:
+            regressions.append(f"{name}: {metrics[name]:.2f} vs baseline {baseline[name]:.2f} ({change:+.0%})")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--rows", type=int, default=1000, help="transactions per user")
+    parser.add_argument("--page-size", type=int, default=500)
+    parser.add_argument("--dim", type=int, default=768, help="embedding dimension")
+    parser.add_argument("--llm-first-token-ms", type=float, default=0.0)
+    parser.add_argument("--llm-token-ms", type=float, default=0.0)
+    parser.add_argument("--multi-query", action="store_true")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="store this run as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed relative regression")
+    parser.add_argument("--output", help="also write the full results as JSON")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    offline_config()
+    # The run happens inside a temporary directory, so resolve the caller's paths first
+    args.baseline = os.path.abspath(args.baseline)
+    args.output = os.path.abspath(args.output) if args.output else None
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix="finsight-bench-", ignore_cleanup_errors=True) as workdir:
+        os.chdir(workdir)
+        try:
+            results = run(args)
+        finally:
+            os.chdir(cwd)
+
+    metrics = results["metrics"]
+    print(f"{results['documents']} documents from {results['http_requests']} HTTP requests, "
+          f"{results['questions']} questions")
+    for name, value in metrics.items():
+        print(f"  {name:<22}{value:>12.2f}")
+    print("\nStages:")
+    for name, summary in results["stages"]["latency"].items():
+        print(f"  {name:<26}{summary['count']:>7}  p50 {summary['p50'] * 1000:8.2f} ms  "
+              f"p99 {summary['p99'] * 1000:8.2f} ms  total {summary['mean'] * summary['count']:8.2f} s")
+    for name, value in results["stages"]["counters"].items():
+        print(f"  {name:<26}{value:>12g}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(metrics, f, indent=2)
+        print(f"\nBaseline saved to {args.baseline}")
+        return
+
+    if not os.path.exists(args.baseline):
+        print(f"\nNo baseline at {args.baseline}; run with --save-baseline to record one")
+        return
+    with open(args.baseline) as f:
+        regressions = compare(metrics, json.load(f), args.tolerance)
+    if regressions:
+        print(f"\nREGRESSION against {args.baseline} (tolerance {args.tolerance:.0%}):")
+        for line in regressions:
+            print(f"  {line}")
+        sys.exit(1)
+    print(f"\nNo regressions against {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,61 @@
+import threading
 from config import pinecone_api_key, pinecone_index_name, llama_endpoint
-from langchain_openai import ChatOpenAI
-from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_pinecone import PineconeVectorStore
-from pinecone import Pinecone
+
+try:
+    from config import vector_backend
+except ImportError:
+    vector_backend = "pinecone"  # "pinecone" or "local"
+
+try:
+    from config import local_store_path
+except ImportError:
+    local_store_path = "local_vector_store"
+
+try:
+    from config import embedding_workers
+except ImportError:
+    embedding_workers = None  # Processes encoding documents during ingestion; None sizes the pool to the machine, 1 disables it
+
+try:
+    from config import embedding_batch_size
+except ImportError:
+    embedding_batch_size = 32
+
+_init_lock = threading.RLock()
+
+class lazy:
+    """Attribute built on first access and then kept on the instance.
+
+    Heavy clients and models are only constructed (and their libraries only
+    imported) when something actually uses them, so commands such as `list`
+    start instantly. The lock makes concurrent first use build them once.
+    """
+
+    def __init__(self, build):
+        self.build = build
+        self.name = build.__name__
+        self.__doc__ = build.__doc__
+
+    def __get__(self, obj, owner=None):
+        if obj is None:
+            return self
+        with _init_lock:
+            if self.name not in obj.__dict__:
+                obj.__dict__[self.name] = self.build(obj)
+        return obj.__dict__[self.name]
 
 class components:
-    def __init__(self):
-        self.llm = ChatOpenAI(
+    def __init__(self, vector_backend: str = vector_backend):
+        self.vector_backend = vector_backend
+        self.embedding_model = "sentence-transformers/all-mpnet-base-v2"
+        self.embedding_workers = embedding_workers
+        self.embedding_batch_size = embedding_batch_size
+        self.text_key = "text"
+
+    @lazy
+    def llm(self):
+        from langchain_openai import ChatOpenAI
+        return ChatOpenAI(
             model="llama2",
             temperature=0,
             max_tokens=256,
@@ -14,9 +63,96 @@ class components:
             base_url=llama_endpoint,
             api_key="not-needed"
         )
-        
-        self.embeddings = HuggingFaceEmbeddings(model_name="sentence-transformers/all-mpnet-base-v2")
 
+    def _embedding_factory(self):
+        from functools import partial
+        from langchain_huggingface import HuggingFaceEmbeddings
+        return partial(HuggingFaceEmbeddings, model_name=self.embedding_model,
+                       encode_kwargs={"batch_size": self.embedding_batch_size})
+
+    @lazy
+    def embeddings(self):
+        return self._embedding_factory()()
+
+    @lazy
+    def document_embeddings(self):
+        # Ingestion encodes on a process pool with its own copies of the same model;
+        # queries and small batches still use the in-process model
+        from embedding_pool import PooledEmbeddings, default_workers
+        workers = self.embedding_workers if self.embedding_workers is not None else default_workers()
+        if workers <= 1:
+            return self.embeddings
+        return PooledEmbeddings(self._embedding_factory(), workers=workers, batch_size=self.embedding_batch_size,
+                                local=lambda: self.embeddings)
+
+    @lazy
+    def cached_embeddings(self):
+        # Ingestion goes through the cache so unchanged documents are not re-embedded
+        from embedding_cache import CachedEmbeddings, EmbeddingCache
+        return CachedEmbeddings(self.document_embeddings, EmbeddingCache(), self.embedding_model)
+
+    @lazy
+    def index(self):
+        if self.vector_backend == "local":
+            return None
+        from pinecone import Pinecone
         self.pc = Pinecone(api_key=pinecone_api_key)
-        self.index = self.pc.Index(pinecone_index_name)
-        self.vector_store = PineconeVectorStore(embedding=self.embeddings, index=self.index)
\ No newline at end of file
+        return self.pc.Index(pinecone_index_name)
+
+    @lazy
+    def vector_store(self):
+        if self.vector_backend == "local":
+            # In-process NumPy store, no network round trips
+            from local_store import LocalVectorStore
+            return LocalVectorStore(embedding=self.embeddings, path=local_store_path)
+        from langchain_pinecone import PineconeVectorStore
+        return PineconeVectorStore(embedding=self.embeddings, index=self.index, text_key=self.text_key)
+
+    def upsert_embeddings(self, ids, embeddings, documents, namespace=None):
+        """Write precomputed embeddings to the vector store"""
+        if self.vector_backend == "local":
+            self.vector_store.upsert_embeddings(ids, embeddings, documents, namespace=namespace)
+            return
+        # Pinecone keeps page content under the store's text key and rejects null metadata
+        vectors = []
+        for id, values, doc in zip(ids, embeddings, documents):
+            metadata = {key: value for key, value in doc.metadata.items() if value is not None}
+            metadata[self.text_key] = doc.page_content
+            if hasattr(values, "tolist"):  # A row of a NumPy matrix, e.g. restored from a snapshot
+                values = values.tolist()
+            vectors.append({"id": id, "values": values, "metadata": metadata})
+        self.index.upsert(vectors=vectors, namespace=namespace)
+
+    def fetch_documents(self, ids, namespace=None):
+        """Stored documents by id, with their text and metadata but not their vectors"""
+        return self.fetch_embeddings(ids, namespace)[0]
+
+    def fetch_embeddings(self, ids, namespace=None):
+        """Stored documents by id and their vectors, as (documents, vectors) with one vector per document"""
+        if self.vector_backend == "local":
+            return self.vector_store.get_embeddings_by_ids(list(ids), namespace=namespace)
+        from langchain_core.documents import Document
+        response = self.index.fetch(ids=list(ids), namespace=namespace)
+        documents, vectors = [], []
+        for id, vector in response.vectors.items():
+            metadata = dict(vector.metadata or {})
+            documents.append(Document(id=id, page_content=metadata.pop(self.text_key, ""), metadata=metadata))
+            vectors.append(vector.values)
+        return documents, vectors
+
+    def update_metadata(self, updates, namespace=None, max_workers=16):
+        """Set metadata fields (id -> fields) of stored documents, keeping their vectors and other fields.
+
+        Pinecone takes one update request per vector, so for many documents it is
+        cheaper to fetch them with ``fetch_embeddings`` and upsert them back in batches.
+        """
+        if self.vector_backend == "local":
+            self.vector_store.update_metadata(updates, namespace=namespace)
+            return
+        # Pinecone updates one vector per request, so they are sent concurrently
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = [executor.submit(self.index.update, id=id, set_metadata=fields, namespace=namespace)
+                       for id, fields in updates.items()]
+            for future in futures:
+                future.result()
@@ -0,0 +1,224 @@
+import logging
+import re
+from dataclasses import dataclass
+from typing import Callable, List, Optional, Sequence, Tuple
+
+from langchain_core.documents import Document
+
+_WORD = re.compile(r"\w+")
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count for Llama-style tokenizers (about four characters per token)"""
+    return (len(text) + 3) // 4
+
+
+def _terms(text: str) -> frozenset:
+    return frozenset(_WORD.findall(text.lower()))
+
+
+def _transaction_key(doc: Document) -> Optional[tuple]:
+    """Identity of the stored transaction a document comes from, None for other documents"""
+    if doc.metadata.get('type') != 'transaction':
+        return None
+    transaction_id = doc.metadata.get('transaction_id') or doc.id
+    # Chunks of a split transaction share its id but not their content
+    return (transaction_id, doc.page_content) if transaction_id else None
+
+
+def _jaccard(a: frozenset, b: frozenset) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+@dataclass
+class PackedContext:
+    context: str
+    chat_history: str
+    tokens: int
+    tokens_saved: int
+    documents_used: int
+    documents_dropped: int
+    documents_summarized: int = 0  # Exact matches left out but counted in the overflow line
+
+
+class ContextPacker:
+    """Assemble prompt context within a token budget.
+
+    Retrieved transactions are deduplicated by transaction id, since recurring
+    charges and repeated purchases read alike but are distinct rows, and other
+    documents by word overlap. Per-user ``transaction_summary`` documents are
+    taken first and the raw rows of summarized users demoted, and the rest are
+    chosen by maximal marginal relevance (retrieval score against word overlap
+    with what is already selected) until the budget is spent. Chat history is
+    compacted to the most recent turns plus the older turns that share the
+    most words with the question.
+    """
+
+    def __init__(self, max_context_tokens: int = 1500, max_history_tokens: int = 300,
+                 mmr_lambda: float = 0.7, duplicate_threshold: float = 0.9,
+                 summarized_row_penalty: float = 0.5, recent_turns: int = 2,
+                 count_tokens: Callable[[str], int] = estimate_tokens):
+        self.max_context_tokens = max_context_tokens
+        self.max_history_tokens = max_history_tokens
+        self.mmr_lambda = mmr_lambda
+        self.duplicate_threshold = duplicate_threshold
+        self.summarized_row_penalty = summarized_row_penalty
+        self.recent_turns = recent_turns
+        self.count_tokens = count_tokens
+
+    @staticmethod
+    def format_document(doc: Document) -> str:
+        return f"Document from {doc.metadata.get('namespace', 'unknown')}: {doc.page_content}"
+
+    def pack(self, question: str, results: Sequence[Tuple[Document, float]],
+             chat_history: Sequence[Tuple[str, str]], exact: bool = False) -> PackedContext:
+        """Fit results and history into the budgets.
+
+        ``exact`` results are every transaction matching the question's filters:
+        they keep their order (newest first) instead of being chosen by MMR, and
+        the ones that do not fit are counted and totalled in a final line so
+        the answer can still account for them.
+        """
+        lines = [self.format_document(doc) for doc, _ in results]
+        full_history = self.format_history(chat_history)
+        full_tokens = sum(self.count_tokens(line) for line in lines) + self.count_tokens(full_history)
+
+        overflow = None
+        if exact:
+            selected, omitted = self._select_in_order(results, lines)
+            overflow = self.describe_omitted([results[i][0] for i in omitted])
+        else:
+            selected, omitted = self._select(results, lines), []
+        context = "\n".join([lines[i] for i in selected] + ([overflow] if overflow else []))
+        history = self.compact_history(question, chat_history)
+        tokens = self.count_tokens(context) + self.count_tokens(history)
+
+        packed = PackedContext(
+            context=context,
+            chat_history=history,
+            tokens=tokens,
+            tokens_saved=max(full_tokens - tokens, 0),
+            documents_used=len(selected),
+            documents_dropped=len(results) - len(selected),
+            documents_summarized=len(omitted),
+        )
+        logging.info(
+            f"Packed context: {packed.tokens} tokens, {packed.tokens_saved} saved, "
+            f"{packed.documents_used} documents used, {packed.documents_dropped} dropped"
+            + (f" ({packed.documents_summarized} summarized)" if omitted else "")
+        )
+        return packed
+
+    def _select_in_order(self, results: Sequence[Tuple[Document, float]],
+                         lines: List[str]) -> Tuple[List[int], List[int]]:
+        """Leading results that fit the budget along with the overflow line, and the omitted rest"""
+        keys = [_transaction_key(doc) for doc, _ in results]
+        seen = set()
+        unique = []
+        for i, key in enumerate(keys):
+            if key is None or key not in seen:
+                seen.add(key)
+                unique.append(i)
+
+        selected: List[int] = []
+        budget = self.max_context_tokens
+        for i in unique:
+            cost = self.count_tokens(lines[i] + "\n")  # Counting the separator keeps the joined context in budget
+            if cost > budget:
+                break
+            selected.append(i)
+            budget -= cost
+        # Give back rows until the line describing the omitted ones fits as well
+        while len(selected) < len(unique):
+            omitted = unique[len(selected):]
+            overflow = self.describe_omitted([results[i][0] for i in omitted])
+            if self.count_tokens(overflow) <= budget or not selected:
+                break
+            budget += self.count_tokens(lines[selected.pop()] + "\n")
+        return selected, unique[len(selected):]
+
+    @staticmethod
+    def describe_omitted(docs: Sequence[Document]) -> Optional[str]:
+        """One line counting and totalling matching transactions left out of the context"""
+        if not docs:
+            return None
+        debits = [float(doc.metadata.get('amount') or 0) for doc in docs]
+        credits = [-amount for amount in debits if amount < 0]
+        debits = [amount for amount in debits if amount >= 0]
+        dates = sorted(doc.metadata['date'] for doc in docs if doc.metadata.get('date'))
+        period = f" dated {dates[0]} to {dates[-1]}" if dates else ""
+        return (
+            f"{len(docs)} more matching transactions{period} are not listed above: "
+            f"{len(debits)} debits totalling ${sum(debits):,.2f} and "
+            f"{len(credits)} credits totalling ${sum(credits):,.2f}."
+        )
+
+    def _select(self, results: Sequence[Tuple[Document, float]], lines: List[str]) -> List[int]:
+        terms = [_terms(doc.page_content) for doc, _ in results]
+        keys = [_transaction_key(doc) for doc, _ in results]
+        costs = [self.count_tokens(line) for line in lines]
+        top_score = max((score for _, score in results), default=0.0) or 1.0
+
+        # Users that have a summary document in the results
+        summarized = {
+            doc.metadata.get('username') for doc, _ in results
+            if doc.metadata.get('type') == 'transaction_summary'
+        }
+
+        relevance = []
+        for doc, score in results:
+            value = max(score, 0.0) / top_score
+            if doc.metadata.get('type') == 'transaction_summary':
+                value += 1.0  # Always ahead of any raw row
+            elif doc.metadata.get('username') in summarized:
+                value *= self.summarized_row_penalty
+            relevance.append(value)
+
+        selected: List[int] = []
+        seen = set()  # Transactions already selected
+        budget = self.max_context_tokens
+        candidates = set(range(len(results)))
+        overlap = [0.0] * len(results)  # Highest word overlap with any selected document
+        while candidates and budget > 0:
+            best = max(candidates, key=lambda i: self.mmr_lambda * relevance[i] - (1 - self.mmr_lambda) * overlap[i])
+            candidates.discard(best)
+            if keys[best] is not None:
+                duplicate = keys[best] in seen
+            else:
+                duplicate = overlap[best] >= self.duplicate_threshold
+            if duplicate or costs[best] > budget:
+                continue
+            if keys[best] is not None:
+                seen.add(keys[best])
+            selected.append(best)
+            budget -= costs[best]
+            for i in candidates:
+                overlap[i] = max(overlap[i], _jaccard(terms[i], terms[best]))
+        return selected
+
+    @staticmethod
+    def format_history(chat_history: Sequence[Tuple[str, str]]) -> str:
+        return "\n".join(f"Human: {q}\nAssistant: {a}" for q, a in chat_history)
+
+    def compact_history(self, question: str, chat_history: Sequence[Tuple[str, str]],
+                        max_tokens: Optional[int] = None) -> str:
+        """Most recent turns plus the most relevant older ones that fit the history budget"""
+        budget = self.max_history_tokens if max_tokens is None else max_tokens
+        turns = list(chat_history)
+        costs = [self.count_tokens(self.format_history([turn])) for turn in turns]
+        recent = list(range(len(turns) - 1, max(len(turns) - 1 - self.recent_turns, -1), -1))
+        question_terms = _terms(question)
+        older = sorted(
+            range(len(turns) - len(recent)),
+            key=lambda i: _jaccard(question_terms, _terms(f"{turns[i][0]} {turns[i][1]}")),
+            reverse=True
+        )
+
+        kept = []
+        for i in recent + older:
+            if costs[i] <= budget:
+                kept.append(i)
+                budget -= costs[i]
+        return self.format_history([turns[i] for i in sorted(kept)])
@@ -0,0 +1,131 @@
+import hashlib
+import logging
+import sqlite3
+import threading
+from array import array
+from typing import Dict, List
+
+from langchain_core.embeddings import Embeddings
+
+_MAX_PARAMS = 500  # Stay well below SQLite's bound parameter limit
+
+
+def content_hash(text: str) -> bytes:
+    return hashlib.sha256(text.encode('utf-8')).digest()
+
+
+class EmbeddingCache:
+    """Persistent embedding cache keyed by (model name, hash of page content).
+
+    Vectors are stored as packed float32 blobs in a local SQLite file. Once the
+    cache holds more than ``max_entries`` vectors, the least recently used ones
+    are evicted.
+    """
+
+    def __init__(self, path: str = "embedding_cache.sqlite", max_entries: int = 1_000_000):
+        self.path = path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "model TEXT NOT NULL, hash BLOB NOT NULL, vector BLOB NOT NULL, last_used INTEGER NOT NULL, "
+            "PRIMARY KEY (model, hash)) WITHOUT ROWID"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)")
+        self._conn.commit()
+        self._count, clock = self._conn.execute("SELECT COUNT(*), MAX(last_used) FROM embeddings").fetchone()
+        self._clock = clock or 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    def get_many(self, model: str, hashes: List[bytes]) -> Dict[bytes, List[float]]:
+        """Return cached vectors for the given hashes and mark them as recently used"""
+        found = {}
+        with self._lock:
+            self._clock += 1
+            for start in range(0, len(hashes), _MAX_PARAMS):
+                chunk = hashes[start:start + _MAX_PARAMS]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT hash, vector FROM embeddings WHERE model = ? AND hash IN ({placeholders})",
+                    [model, *chunk]
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = array('f', blob).tolist()
+                if rows:
+                    self._conn.executemany(
+                        "UPDATE embeddings SET last_used = ? WHERE model = ? AND hash = ?",
+                        [(self._clock, model, key) for key, _ in rows]
+                    )
+            self._conn.commit()
+        return found
+
+    def put_many(self, model: str, items: Dict[bytes, List[float]]):
+        """Store vectors and evict the least recently used entries beyond the size cap"""
+        if not items:
+            return
+        with self._lock:
+            self._clock += 1
+            before = self._conn.total_changes
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO embeddings (model, hash, vector, last_used) VALUES (?, ?, ?, ?)",
+                [(model, key, array('f', vector).tobytes(), self._clock) for key, vector in items.items()]
+            )
+            self._count += self._conn.total_changes - before
+            if self._count > self.max_entries:
+                self._evict(self._count - self.max_entries)
+            self._conn.commit()
+
+    def _evict(self, count: int):
+        self._conn.execute(
+            "DELETE FROM embeddings WHERE (model, hash) IN "
+            "(SELECT model, hash FROM embeddings ORDER BY last_used LIMIT ?)",
+            (count,)
+        )
+        self._count -= count
+        logging.info(f"Evicted {count} embeddings from cache")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class CachedEmbeddings(Embeddings):
+    """Embeddings wrapper that only runs the model for document texts not already cached"""
+
+    def __init__(self, embeddings: Embeddings, cache: EmbeddingCache, model_name: str):
+        self.embeddings = embeddings
+        self.cache = cache
+        self.model_name = model_name
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        hashes = [content_hash(text) for text in texts]
+        cached = self.cache.get_many(self.model_name, list(set(hashes)))
+
+        # Embed each distinct missing text once, even if it repeats within the batch
+        missing = {}
+        for key, text in zip(hashes, texts):
+            if key not in cached and key not in missing:
+                missing[key] = text
+        if missing:
+            vectors = self.embeddings.embed_documents(list(missing.values()))
+            computed = dict(zip(missing.keys(), vectors))
+            self.cache.put_many(self.model_name, computed)
+            cached.update(computed)
+
+        self.misses += len(missing)
+        self.hits += len(texts) - len(missing)
+        return [cached[key] for key in hashes]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embeddings.embed_query(text)
@@ -0,0 +1,112 @@
+import logging
+import math
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+_model: Optional[Embeddings] = None  # The model loaded once in each worker process
+
+
+def available_cpus() -> int:
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def default_workers() -> int:
+    """Worker processes for this machine; two cores each so every worker still batches efficiently"""
+    return available_cpus() // 2
+
+
+def _init_worker(factory: Callable[[], Embeddings], threads: int):
+    global _model
+    # Each worker gets its share of the cores instead of every one claiming all of them
+    os.environ["OMP_NUM_THREADS"] = str(threads)
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+    _model = factory()
+
+
+def _encode(texts: List[str]) -> np.ndarray:
+    return np.asarray(_model.embed_documents(texts), dtype=np.float32)
+
+
+class PooledEmbeddings(Embeddings):
+    """Encodes documents on a pool of worker processes that each load the model once.
+
+    Texts are sorted by length and cut into shards of similar length, so the
+    batches inside each worker carry little padding. Shards are dispatched
+    longest first and the vectors are put back in input order. Small inputs
+    and queries are encoded in-process by ``local``, which never starts the pool.
+    """
+
+    def __init__(self, factory: Callable[[], Embeddings], workers: Optional[int] = None,
+                 batch_size: int = 32, local: Optional[Callable[[], Embeddings]] = None,
+                 min_shard: int = 8):
+        self.factory = factory  # Must be picklable, e.g. a functools.partial of the model class
+        self.workers = max(1, workers or default_workers())
+        self.threads_per_worker = max(1, available_cpus() // self.workers)
+        self.batch_size = batch_size
+        self.min_shard = min_shard
+        self._local_factory = local or factory
+        self._local: Optional[Embeddings] = None
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    @property
+    def local(self) -> Embeddings:
+        with self._lock:
+            if self._local is None:
+                self._local = self._local_factory()
+        return self._local
+
+    @property
+    def pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                logging.info(f"Starting {self.workers} embedding workers with {self.threads_per_worker} threads each")
+                # Spawned, not forked: forking a process with a loaded model or
+                # running threads can deadlock the workers
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker,
+                    initargs=(self.factory, self.threads_per_worker)
+                )
+        return self._pool
+
+    def shards(self, texts: List[str]) -> List[List[int]]:
+        """Indices of the texts grouped into shards of similar length, longest first"""
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]), reverse=True)
+        # Enough shards to occupy every worker, but no more than a few batches each
+        size = min(self.batch_size * 4, max(self.min_shard, math.ceil(len(texts) / self.workers)))
+        return [order[start:start + size] for start in range(0, len(order), size)]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if self.workers <= 1 or len(texts) < self.min_shard * 2:
+            return self.local.embed_documents(texts)
+        shards = self.shards(texts)
+        futures = [self.pool.submit(_encode, [texts[i] for i in shard]) for shard in shards]
+        vectors = [None] * len(texts)
+        for shard, future in zip(shards, futures):
+            for i, vector in zip(shard, future.result()):
+                vectors[i] = vector
+        return np.stack(vectors).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.local.embed_query(text)
+
+    def close(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(cancel_futures=True)
+                self._pool = None
@@ -0,0 +1,162 @@
+from typing import Dict, Iterable, List, Optional
+
+from langchain_core.documents import Document
+
+from query_filters import NO_DATE, to_day
+
+_TRANSACTION_KEYS = ('amount', 'transaction_id', 'user_id')
+
+# Version of the stored metadata schema. Sources stored with an older version
+# are migrated in place by ``MQR.migrate_source_metadata``.
+# 1: numeric amount, abs_amount, date_days and month on transactions
+# 2: stored hashes cover the canonical metadata (``mqr._canonical_metadata``)
+METADATA_VERSION = 2
+
+
+def typed_fields(metadata: dict) -> dict:
+    """Numeric fields for range filters derived from a transaction's amount and date.
+
+    ``date_days`` counts days since 1970-01-01 and ``abs_amount`` is the amount
+    without its sign. Returns an empty dict for other document types.
+    """
+    if metadata.get('type') != 'transaction':
+        return {}
+    fields = {}
+    try:
+        amount = float(metadata.get('amount') or 0)
+        fields['amount'] = amount
+        fields['abs_amount'] = abs(amount)
+    except (TypeError, ValueError):
+        pass
+    day = to_day(metadata.get('date') or '')
+    if day != NO_DATE:
+        fields['date_days'] = day
+        fields['month'] = int(metadata['date'][5:7])
+    return fields
+
+
+class Record:
+    """Lightweight stand-in for a langchain ``Document`` during ingestion.
+
+    Ingestion only reads and sets ``id``, ``page_content`` and ``metadata``,
+    and the vector store upserts read nothing else, so records are handed to
+    the store as-is. Building a validated Document per row costs more than
+    formatting the row; ``to_document`` converts where a real one is needed.
+    """
+
+    __slots__ = ("id", "page_content", "metadata")
+
+    def __init__(self, page_content: str, metadata: dict, id: Optional[str] = None):
+        self.id = id
+        self.page_content = page_content
+        self.metadata = metadata
+
+    def to_document(self) -> Document:
+        return Document(id=self.id, page_content=self.page_content, metadata=self.metadata)
+
+
+class RecordFormatter:
+    """Formats batches of raw user and transaction records into ``Record`` objects.
+
+    Each record is read once: content and metadata are built together, amounts
+    stay floats and category labels and day numbers are computed once per
+    distinct category and date.
+    Records that match neither schema are kept as their string form.
+    """
+
+    def __init__(self, username: Optional[str] = None):
+        self.username = username  # Configured username, overriding resolved ones
+        self._categories: Dict[str, str] = {}
+        self._days: Dict[str, int] = {}
+
+    def format_batch(self, items: Iterable, usernames: Optional[Dict[str, str]] = None) -> List[Record]:
+        """Format records; ``usernames`` maps user ids to usernames resolved for this batch"""
+        usernames = usernames or {}
+        records = []
+        append = records.append
+        for item in items:
+            if not isinstance(item, dict):
+                append(Record(str(item), {"type": "unknown", "data_type": "unknown"}))
+            elif 'username' in item:
+                append(self._user(item))
+            elif any(key in item for key in _TRANSACTION_KEYS):
+                append(self._transaction(item, usernames))
+            else:
+                append(Record(str(item), {"type": "unknown", "data_type": "unknown"}))
+        return records
+
+    @staticmethod
+    def _user(item: dict) -> Record:
+        user_id = item.get('id', '')
+        return Record(
+            f"User {item['username']} with ID {user_id}",
+            {
+                "type": "user",
+                "data_type": "user",
+                "user_id": str(user_id),
+                "username": item['username'].lower(),
+                "doc_id": f"user-{user_id}",
+            }
+        )
+
+    def _transaction(self, item: dict, usernames: Dict[str, str]) -> Record:
+        user_id = str(item.get('user_id', ''))
+        # The configured username, or the one resolved for the transaction's user id
+        username = self.username or usernames.get(user_id)
+        transaction_id = str(item.get('id', ''))
+        amount = float(item.get('amount') or 0)
+        category = item.get('category') or ''
+        merchant = item.get('name', '')
+        date = (item.get('date') or '').partition('T')[0]
+        transaction_type = "credit" if amount < 0 else "debit"
+
+        label = self._categories.get(category)
+        if label is None:
+            label = self._categories[category] = category.replace('_', ' ').title()
+        day = self._days.get(date)
+        if day is None:
+            day = self._days[date] = to_day(date)
+
+        metadata = {
+            "type": "transaction",
+            "data_type": "transaction",
+            "user_id": user_id,
+            "username": username,
+            "transaction_id": transaction_id,
+            "category": category,
+            "amount": amount,
+            "date": date,
+            "merchant": merchant,
+            "transaction_type": transaction_type,
+            "abs_amount": abs(amount),
+        }
+        if day != NO_DATE:
+            metadata["date_days"] = day
+            metadata["month"] = int(date[5:7])
+        if transaction_id:
+            metadata["doc_id"] = f"transaction-{transaction_id}"
+
+        content = (
+            f"A {transaction_type} transaction of ${abs(amount)} "
+            f"by {username or 'user ' + user_id} "
+            f"at {merchant} on {date} "
+            f"in the {label} category."
+        )
+        return Record(content, metadata)
+
+
+def split_long(documents: Iterable, splitter, chunk_size: int) -> list:
+    """Split only the documents longer than ``chunk_size``.
+
+    A document that fits in one chunk comes out of the splitter unchanged, so
+    it is passed through without the splitter's per-document overhead.
+    """
+    result = []
+    for doc in documents:
+        content = doc.page_content
+        if content and len(content) <= chunk_size and content == content.strip():
+            result.append(doc)
+        else:
+            source = doc.to_document() if isinstance(doc, Record) else doc
+            result.extend(splitter.split_documents([source]))
+    return result
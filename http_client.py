@@ -0,0 +1,196 @@
+import logging
+import random
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, Iterator, Optional
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+RETRY_STATUSES = frozenset([429, 500, 502, 503, 504])
+
+
+class NotModified(Exception):
+    """The server answered 304: the resource is unchanged since the stored validators"""
+
+
+class HTTPClient:
+    """Shared HTTP client for all source fetching.
+
+    One pooled ``requests.Session`` keeps connections alive across pages and
+    sources and negotiates gzip. Connection errors, timeouts and 429/5xx
+    responses are retried up to ``max_retries`` times with full-jitter
+    exponential backoff (honouring Retry-After). At most ``per_host_limit``
+    requests wait on one host at a time; a slot is freed once response headers
+    arrive, so a caller reading a long body can still make further requests
+    to the same host.
+    """
+
+    def __init__(self, pool_size: int = 16, per_host_limit: int = 4, max_retries: int = 3,
+                 backoff: float = 0.5, max_backoff: float = 30.0, timeout: tuple = (10, 60)):
+        self.per_host_limit = per_host_limit
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers["Accept-Encoding"] = "gzip, deflate"
+        self._hosts: Dict[str, threading.BoundedSemaphore] = {}
+        self._lock = threading.Lock()
+
+    def _host_slot(self, url: str) -> threading.BoundedSemaphore:
+        host = urlsplit(url).netloc
+        with self._lock:
+            slot = self._hosts.get(host)
+            if slot is None:
+                slot = self._hosts[host] = threading.BoundedSemaphore(self.per_host_limit)
+        return slot
+
+    def _delay(self, attempt: int, response: Optional[requests.Response]) -> float:
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        if retry_after and retry_after.isdigit():
+            return min(float(retry_after), self.max_backoff)
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+    @contextmanager
+    def stream(self, url: str, params: Optional[dict] = None, headers: Optional[dict] = None,
+               validators: Optional[dict] = None) -> Iterator[requests.Response]:
+        """Open a streamed GET, retrying until the response headers are good.
+
+        With ``validators`` ({"etag", "last_modified"}) the request is
+        conditional and NotModified is raised on 304. The host slot is only
+        held until the headers arrive: consumers of a streamed body often make
+        other requests to the same host, and holding the slot across the body
+        would let them deadlock each other.
+        """
+        headers = dict(headers or {})
+        if validators:
+            if validators.get("etag"):
+                headers["If-None-Match"] = validators["etag"]
+            if validators.get("last_modified"):
+                headers["If-Modified-Since"] = validators["last_modified"]
+
+        with self._host_slot(url):
+            attempt = 0
+            while True:
+                response = None
+                try:
+                    response = self.session.get(url, params=params, headers=headers, stream=True, timeout=self.timeout)
+                    if response.status_code not in RETRY_STATUSES:
+                        break
+                    error = f"HTTP {response.status_code}"
+                except (requests.ConnectionError, requests.Timeout) as e:
+                    error = str(e)
+                if attempt >= self.max_retries:
+                    if response is None:
+                        raise requests.ConnectionError(f"Giving up on {url}: {error}")
+                    break
+                delay = self._delay(attempt, response)
+                if response is not None:
+                    response.close()
+                attempt += 1
+                logging.warning(f"Request to {url} failed ({error}), retrying in {delay:.1f}s ({attempt}/{self.max_retries})")
+                time.sleep(delay)
+
+        with response:
+            if response.status_code == 304:
+                raise NotModified(url)
+            response.raise_for_status()
+            yield response
+
+    def get_json(self, url: str, params: Optional[dict] = None, headers: Optional[dict] = None):
+        with self.stream(url, params=params, headers=headers) as response:
+            return response.json()
+
+
+def response_validators(response: requests.Response) -> dict:
+    """ETag and Last-Modified of a response, for the next conditional request"""
+    return {
+        "etag": response.headers.get("ETag"),
+        "last_modified": response.headers.get("Last-Modified"),
+    }
+
+
+class UsernameResolver:
+    """Memoized user id -> username lookups against one API's users endpoint.
+
+    The first lookup fetches the whole ``/users`` listing in one request, so
+    resolving the user ids of a batch of transactions costs at most one
+    request instead of one per id. Ids missing from the listing are looked
+    up individually and remembered. A failed listing or lookup is not
+    retried for ``retry_after`` seconds, so an outage costs one failed
+    request per id rather than N+1 requests per batch, and is still
+    recovered from later.
+    """
+
+    _instances: Dict[str, "UsernameResolver"] = {}
+    _instances_lock = threading.Lock()
+
+    def __init__(self, base_url: str, client: Optional[HTTPClient] = None, retry_after: float = 300.0):
+        self.base_url = base_url.rstrip("/")
+        self.client = client or default_client
+        self.retry_after = retry_after
+        self._usernames: Dict[str, str] = {}
+        self._listed = False
+        self._list_retry_at = 0.0  # Monotonic time after which a failed listing is requested again
+        self._failed: Dict[str, float] = {}  # User id -> when its failed lookup may be retried
+        self._lock = threading.Lock()
+
+    @classmethod
+    def for_base_url(cls, base_url: str) -> "UsernameResolver":
+        with cls._instances_lock:
+            resolver = cls._instances.get(base_url)
+            if resolver is None:
+                resolver = cls._instances[base_url] = cls(base_url)
+        return resolver
+
+    def resolve_many(self, user_ids: Iterable[str]) -> Dict[str, str]:
+        wanted = {str(user_id) for user_id in user_ids if user_id not in (None, "")}
+        with self._lock:
+            now = time.monotonic()
+            missing = wanted - self._usernames.keys()
+            if missing and not self._listed and now >= self._list_retry_at:
+                self._load_listing()
+                missing = wanted - self._usernames.keys()
+            for user_id in missing:
+                if self._failed.get(user_id, 0.0) > now:
+                    continue
+                username = self._fetch_one(user_id)
+                if username is None:
+                    self._failed[user_id] = time.monotonic() + self.retry_after
+                else:
+                    self._failed.pop(user_id, None)
+                    self._usernames[user_id] = username
+            return {user_id: self._usernames[user_id] for user_id in wanted if user_id in self._usernames}
+
+    def resolve(self, user_id: str) -> str:
+        return self.resolve_many([user_id]).get(str(user_id), '')
+
+    def _load_listing(self):
+        try:
+            data = self.client.get_json(f"{self.base_url}/users")
+            if isinstance(data, dict):
+                data = data.get("data") or data.get("users") or []
+            for user in data:
+                if isinstance(user, dict) and "id" in user and user.get("username"):
+                    self._usernames[str(user["id"])] = user["username"]
+            self._listed = True
+        except Exception as e:
+            self._list_retry_at = time.monotonic() + self.retry_after
+            logging.error(f"Error listing users from {self.base_url}, retrying in {self.retry_after:.0f}s: {str(e)}")
+
+    def _fetch_one(self, user_id: str) -> Optional[str]:
+        """Username of one user, or None if the request failed"""
+        try:
+            return self.client.get_json(f"{self.base_url}/users/{user_id}").get("username", '')
+        except Exception as e:
+            logging.error(f"Error fetching username for user_id {user_id}: {str(e)}")
+            return None
+
+
+default_client = HTTPClient()
@@ -0,0 +1,231 @@
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from itertools import batched
+from typing import Callable, Iterable, Optional
+
+from langchain_core.documents import Document
+
+
+@dataclass
+class IngestStats:
+    documents: int = 0
+    batches: int = 0
+    failed_batches: int = 0
+    failed_documents: int = 0
+    retries: int = 0
+    elapsed: float = 0.0
+    cancelled: bool = False
+
+    @property
+    def docs_per_sec(self) -> float:
+        return self.documents / self.elapsed if self.elapsed else 0.0
+
+
+@dataclass
+class IngestProgress:
+    """Live counters of a running ingestion, also used to cancel it between batches"""
+    fetched: int = 0
+    embedded: int = 0
+    upserted: int = 0
+    deleted: int = 0
+    cancel_event: threading.Event = field(default_factory=threading.Event)
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self.cancel_event.is_set()
+
+    def snapshot(self) -> dict:
+        return {"fetched": self.fetched, "embedded": self.embedded, "upserted": self.upserted,
+                "deleted": self.deleted}
+
+
+class BulkOperation:
+    """Apply an operation to documents by id in fixed-size batches, several batches at a time.
+
+    Each batch is retried with backoff; a batch that still fails is reported
+    in the stats and its ids are left out of the result, so the caller keeps
+    them and can retry later.
+    """
+
+    action = "operation"
+
+    def __init__(self, apply: Callable[..., None], batch_size: int = 1000,
+                 max_in_flight: int = 4, max_retries: int = 3, retry_backoff: float = 1.0):
+        self.apply = apply  # Called as apply(ids, namespace, *arguments of the batch)
+        self.batch_size = batch_size
+        self.max_in_flight = max_in_flight
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+
+    def run(self, ids: Iterable[str], namespace: str, progress: Optional[IngestProgress] = None,
+            on_commit: Optional[Callable[[list[str]], None]] = None) -> tuple[list[str], IngestStats]:
+        """Apply the operation to the ids and return those it succeeded for.
+
+        on_commit is called with the ids of each completed batch. Setting
+        ``progress.cancel_event`` stops after the batches in flight.
+        """
+        return self._run(ids, namespace, lambda batch, stats, progress: (batch, ()), progress, on_commit)
+
+    def _run(self, items: Iterable, namespace: str,
+             prepare: Callable[[list, IngestStats, IngestProgress], Optional[tuple[list[str], tuple]]],
+             progress: Optional[IngestProgress],
+             on_commit: Optional[Callable[[list[str]], None]]) -> tuple[list[str], IngestStats]:
+        """Batch the items, turn each batch into ids and apply arguments with ``prepare`` and apply them.
+
+        ``prepare`` runs on the calling thread, overlapping the batches in
+        flight, and returns None for a batch it could not prepare.
+        """
+        stats = IngestStats()
+        progress = progress or IngestProgress()
+        completed = []
+        start = time.perf_counter()
+
+        with ThreadPoolExecutor(max_workers=self.max_in_flight) as executor:
+            in_flight = set()
+            for batch in batched(items, self.batch_size):
+                if progress.cancelled:
+                    stats.cancelled = True
+                    break
+                prepared = prepare(list(batch), stats, progress)
+                if prepared is None:
+                    continue
+                ids, arguments = prepared
+                # Bound the number of batches waiting on the network
+                while len(in_flight) >= self.max_in_flight:
+                    done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    self._collect(done, completed, stats, progress, on_commit)
+                in_flight.add(executor.submit(self._apply_with_retry, ids, namespace, arguments))
+                stats.batches += 1
+
+            self._collect(wait(in_flight).done, completed, stats, progress, on_commit)
+
+        stats.elapsed = time.perf_counter() - start
+        logging.info(
+            f"{self._describe(stats, namespace)} in {stats.elapsed:.2f}s "
+            f"({stats.docs_per_sec:.1f} docs/sec, {stats.batches} batches, "
+            f"{stats.failed_batches} failed, {stats.retries} retries)"
+        )
+        return completed, stats
+
+    def _describe(self, stats: IngestStats, namespace: str) -> str:
+        return f"Applied {self.action} to {stats.documents} documents in {namespace}"
+
+    def _apply_with_retry(self, ids, namespace, arguments):
+        attempt = 0
+        while True:
+            try:
+                self.apply(ids, namespace, *arguments)
+                return ids, attempt, None
+            except Exception as e:
+                if attempt >= self.max_retries:
+                    return ids, attempt, e
+                attempt += 1
+                logging.warning(f"{self.action.title()} of {len(ids)} documents failed, retrying ({attempt}/{self.max_retries}): {str(e)}")
+                time.sleep(self.retry_backoff * 2 ** (attempt - 1))
+
+    def _count(self, progress: IngestProgress, count: int):
+        pass
+
+    def _collect(self, done, completed: list, stats: IngestStats, progress: IngestProgress,
+                 on_commit: Optional[Callable[[list[str]], None]]):
+        for future in done:
+            ids, retries, error = future.result()
+            stats.retries += retries
+            if error is None:
+                completed.extend(ids)
+                stats.documents += len(ids)
+                self._count(progress, len(ids))
+                if on_commit:
+                    on_commit(ids)
+            else:
+                logging.error(f"Giving up on {self.action} of a batch of {len(ids)} documents: {str(error)}")
+                stats.failed_batches += 1
+                stats.failed_documents += len(ids)
+
+
+class IngestPipeline(BulkOperation):
+    """Embed and upsert documents in fixed-size batches.
+
+    Embedding runs on the calling thread while previous batches are upserted by
+    a small pool, so the two stages overlap. A batch that still fails after its
+    retries is reported in the stats instead of aborting the whole run.
+    """
+
+    action = "upsert"
+
+    def __init__(self, embed_documents: Callable[[list[str]], list[list[float]]],
+                 upsert: Callable[[list[str], list[list[float]], list[Document], str], None],
+                 batch_size: int = 100, max_in_flight: int = 4, max_retries: int = 3,
+                 retry_backoff: float = 1.0):
+        super().__init__(self._upsert, batch_size=batch_size, max_in_flight=max_in_flight,
+                         max_retries=max_retries, retry_backoff=retry_backoff)
+        self.embed_documents = embed_documents
+        self.upsert = upsert
+
+    def run(self, documents: Iterable[Document], namespace: str,
+            id_fn: Optional[Callable[[Document], str]] = None,
+            progress: Optional[IngestProgress] = None,
+            on_commit: Optional[Callable[[list[str]], None]] = None) -> tuple[list[str], IngestStats]:
+        """Ingest all documents and return the ids that were committed.
+
+        on_commit is called with the ids of each batch as soon as it is stored,
+        so callers can checkpoint. Setting ``progress.cancel_event`` stops the
+        run after the batches already in flight.
+        """
+        def embed(batch: list, stats: IngestStats, progress: IngestProgress):
+            ids = [id_fn(doc) if id_fn else str(uuid.uuid4()) for doc in batch]
+            try:
+                embeddings = self.embed_documents([doc.page_content for doc in batch])
+            except Exception as e:
+                logging.error(f"Error embedding batch {stats.batches}: {str(e)}")
+                stats.batches += 1
+                stats.failed_batches += 1
+                stats.failed_documents += len(batch)
+                return None
+            progress.embedded += len(batch)
+            return ids, (embeddings, batch)
+
+        return self._run(documents, namespace, embed, progress, on_commit)
+
+    def _upsert(self, ids, namespace, embeddings, documents):
+        self.upsert(ids, embeddings, documents, namespace)
+
+    def _describe(self, stats: IngestStats, namespace: str) -> str:
+        return f"Ingested {stats.documents} documents into {namespace}"
+
+    def _count(self, progress: IngestProgress, count: int):
+        progress.upserted += count
+
+
+class BulkDeleter(BulkOperation):
+    """Delete documents by id; deleted batches count towards ``progress.deleted``"""
+
+    action = "delete"
+
+    def _count(self, progress: IngestProgress, count: int):
+        progress.deleted += count
+
+
+class BulkUpdater(BulkOperation):
+    """Update stored documents by id, e.g. to migrate their metadata; batches count towards ``progress.upserted``"""
+
+    action = "update"
+
+    def _count(self, progress: IngestProgress, count: int):
+        progress.upserted += count
+
+
+class BulkUpserter(BulkOperation):
+    """Upsert documents by id whose vectors already exist, e.g. restored from a snapshot"""
+
+    action = "upsert"
+
+    def _count(self, progress: IngestProgress, count: int):
+        progress.upserted += count
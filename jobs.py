@@ -0,0 +1,257 @@
+import json
+import logging
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Dict, List, Optional
+
+from ingest import IngestProgress
+
+JOB_KINDS = ("add", "refresh", "remove", "migrate")
+_ACTIVE = ("queued", "running")
+_COLUMNS = "id, kind, source_id, config, priority, status, attempts, progress, error, created_at, started_at, finished_at"
+
+
+class JobQueue:
+    """Persistent queue of add, refresh, remove and migrate jobs run by a pool of worker threads.
+
+    Jobs are kept in SQLite, so jobs that were queued or running when the
+    process died are picked up again on ``start``. Because every committed
+    batch is recorded as it lands, an interrupted add or refresh resumes as a
+    refresh that only fetches and compares, skipping what is already stored.
+    Higher priorities run first and each source runs at most
+    ``per_source_limit`` jobs at a time. Sources can also be scheduled for
+    periodic refreshes.
+    """
+
+    def __init__(self, mqr, path: str = "jobs.sqlite", workers: int = 2, per_source_limit: int = 1,
+                 max_attempts: int = 3, poll_interval: float = 1.0):
+        self.mqr = mqr
+        self.path = path
+        self.workers = workers
+        self.per_source_limit = per_source_limit
+        self.max_attempts = max_attempts
+        self.poll_interval = poll_interval
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._running: Dict[str, IngestProgress] = {}  # Job id -> live progress
+        self._running_sources: Dict[str, int] = {}
+        self._threads: List[threading.Thread] = []
+        self._stopping = False
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id TEXT PRIMARY KEY, kind TEXT NOT NULL, source_id TEXT NOT NULL, config TEXT, "
+            "priority INTEGER NOT NULL DEFAULT 0, status TEXT NOT NULL, attempts INTEGER NOT NULL DEFAULT 0, "
+            "progress TEXT, error TEXT, created_at REAL NOT NULL, started_at REAL, finished_at REAL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_queued ON jobs (status, priority, created_at)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS schedules (source_id TEXT PRIMARY KEY, interval REAL NOT NULL, "
+            "next_run REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def start(self):
+        """Requeue jobs interrupted by a crash and start the workers and scheduler"""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = 'failed', error = 'Gave up after repeated interruptions', finished_at = ? "
+                "WHERE status = 'running' AND attempts >= ?",
+                (time.time(), self.max_attempts)
+            )
+            resumed = self._conn.execute("UPDATE jobs SET status = 'queued' WHERE status = 'running'").rowcount
+            self._conn.commit()
+        if resumed:
+            logging.info(f"Resuming {resumed} interrupted jobs")
+        for i in range(self.workers):
+            self._start_thread(self._work, f"job-worker-{i}")
+        self._start_thread(self._schedule_loop, "job-scheduler")
+
+    def _start_thread(self, target, name: str):
+        thread = threading.Thread(target=target, name=name, daemon=True)
+        thread.start()
+        self._threads.append(thread)
+
+    def stop(self, timeout: Optional[float] = None):
+        """Stop taking new jobs; running jobs are cancelled and resumed on the next start"""
+        with self._wakeup:
+            self._stopping = True
+            for progress in self._running.values():
+                progress.cancel()
+            self._wakeup.notify_all()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def submit(self, kind: str, source_id: str, config: Optional[dict] = None, priority: int = 0) -> str:
+        """Queue a job and return its id; an identical queued job is reused"""
+        if kind not in JOB_KINDS:
+            raise ValueError(f"Unknown job kind {kind}")
+        with self._wakeup:
+            if kind != "add":
+                row = self._conn.execute(
+                    "SELECT id FROM jobs WHERE kind = ? AND source_id = ? AND status = 'queued'",
+                    (kind, source_id)
+                ).fetchone()
+                if row:
+                    return row[0]
+            job_id = uuid.uuid4().hex[:12]
+            self._conn.execute(
+                "INSERT INTO jobs (id, kind, source_id, config, priority, status, created_at) "
+                "VALUES (?, ?, ?, ?, ?, 'queued', ?)",
+                (job_id, kind, source_id, json.dumps(config) if config is not None else None, priority, time.time())
+            )
+            self._conn.commit()
+            self._wakeup.notify()
+        logging.info(f"Queued {kind} job {job_id} for {source_id}")
+        return job_id
+
+    def cancel(self, job_id: str) -> bool:
+        """Cancel a queued job, or stop a running one after its in-flight batches"""
+        with self._lock:
+            progress = self._running.get(job_id)
+            if progress is not None:
+                progress.cancel()
+                return True
+            cancelled = self._conn.execute(
+                "UPDATE jobs SET status = 'cancelled', finished_at = ? WHERE id = ? AND status = 'queued'",
+                (time.time(), job_id)
+            ).rowcount
+            self._conn.commit()
+        return bool(cancelled)
+
+    def status(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            row = self._conn.execute(f"SELECT {_COLUMNS} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._job(row) if row else None
+
+    def list_jobs(self, limit: int = 20) -> List[dict]:
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {_COLUMNS} FROM jobs ORDER BY created_at DESC LIMIT ?", (limit,)
+            ).fetchall()
+        return [self._job(row) for row in rows]
+
+    def _job(self, row) -> dict:
+        job = dict(zip([column.strip() for column in _COLUMNS.split(",")], row))
+        job.pop("config")
+        live = self._running.get(job["id"])
+        job["progress"] = live.snapshot() if live else json.loads(job["progress"] or "{}")
+        return job
+
+    def schedule_refresh(self, source_id: str, interval: float):
+        """Refresh a source every ``interval`` seconds"""
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO schedules (source_id, interval, next_run) VALUES (?, ?, ?) "
+                "ON CONFLICT (source_id) DO UPDATE SET interval = excluded.interval, next_run = excluded.next_run",
+                (source_id, interval, time.time() + interval)
+            )
+            self._conn.commit()
+
+    def unschedule(self, source_id: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM schedules WHERE source_id = ?", (source_id,))
+            self._conn.commit()
+
+    def schedules(self) -> Dict[str, dict]:
+        with self._lock:
+            rows = self._conn.execute("SELECT source_id, interval, next_run FROM schedules").fetchall()
+        return {source_id: {"interval": interval, "next_run": next_run} for source_id, interval, next_run in rows}
+
+    def _schedule_loop(self):
+        while not self._stopping:
+            now = time.time()
+            try:
+                with self._lock:
+                    due = self._conn.execute(
+                        "SELECT source_id, interval FROM schedules WHERE next_run <= ?", (now,)
+                    ).fetchall()
+                    self._conn.executemany(
+                        "UPDATE schedules SET next_run = ? WHERE source_id = ?",
+                        [(now + interval, source_id) for source_id, interval in due]
+                    )
+                    # Persist live progress so status survives a crash
+                    self._conn.executemany(
+                        "UPDATE jobs SET progress = ? WHERE id = ?",
+                        [(json.dumps(progress.snapshot()), job_id) for job_id, progress in self._running.items()]
+                    )
+                    self._conn.commit()
+                for source_id, _ in due:
+                    self.submit("refresh", source_id)
+            except Exception as e:
+                logging.error(f"Error in job scheduler: {str(e)}")
+            time.sleep(self.poll_interval)
+
+    def _claim(self) -> Optional[tuple]:
+        """Mark the highest priority runnable job as running (called with the lock held)"""
+        busy = [source_id for source_id, count in self._running_sources.items() if count >= self.per_source_limit]
+        placeholders = ",".join("?" * len(busy))
+        row = self._conn.execute(
+            "SELECT id, kind, source_id, config, attempts FROM jobs WHERE status = 'queued' "
+            f"AND source_id NOT IN ({placeholders}) ORDER BY priority DESC, created_at LIMIT 1",
+            busy
+        ).fetchone()
+        if row is None:
+            return None
+        self._conn.execute(
+            "UPDATE jobs SET status = 'running', attempts = attempts + 1, started_at = ? WHERE id = ?",
+            (time.time(), row[0])
+        )
+        self._conn.commit()
+        self._running[row[0]] = IngestProgress()
+        self._running_sources[row[2]] = self._running_sources.get(row[2], 0) + 1
+        return row
+
+    def _work(self):
+        while True:
+            with self._wakeup:
+                job = None
+                while not self._stopping and (job := self._claim()) is None:
+                    self._wakeup.wait(self.poll_interval)
+                if self._stopping:
+                    return
+                progress = self._running[job[0]]
+            self._run(*job, progress)
+
+    def _run(self, job_id: str, kind: str, source_id: str, config: Optional[str], attempts: int,
+             progress: IngestProgress):
+        logging.info(f"Running {kind} job {job_id} for {source_id}")
+        error = None
+        try:
+            if kind == "add" and attempts > 0 and source_id in self.mqr.source_manager.sources:
+                # Resumed after an interruption: the config is saved and the committed
+                # batches recorded, so a refresh picks up where the add stopped
+                ok = self.mqr.refresh_api_source(source_id, progress=progress)
+            elif kind == "add":
+                ok = self.mqr.add_api_source(source_id, json.loads(config), progress=progress)
+            elif kind == "refresh":
+                ok = self.mqr.refresh_api_source(source_id, progress=progress)
+            elif kind == "migrate":
+                ok = self.mqr.migrate_source_metadata(source_id, progress=progress)
+            else:
+                self.unschedule(source_id)
+                ok = self.mqr.remove_api_source(source_id, progress=progress)
+            if progress.cancelled:
+                status = "queued" if self._stopping else "cancelled"
+            else:
+                status = "done" if ok else "failed"
+                if not ok:
+                    error = "See logs for details"
+        except Exception as e:
+            logging.error(f"Error running {kind} job {job_id}: {str(e)}")
+            status, error = "failed", str(e)
+
+        with self._wakeup:
+            self._running.pop(job_id, None)
+            self._running_sources[source_id] -= 1
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, progress = ?, finished_at = ? WHERE id = ?",
+                (status, error, json.dumps(progress.snapshot()),
+                 None if status == "queued" else time.time(), job_id)
+            )
+            self._conn.commit()
+            self._wakeup.notify_all()
+        logging.info(f"Job {job_id} {status}")
@@ -0,0 +1,167 @@
+import codecs
+import json
+from typing import Any, Iterable, Iterator, Optional, Union
+
+_WHITESPACE = ' \t\n\r'
+_DELIMITERS = _WHITESPACE + ',]'
+_TRIM_THRESHOLD = 1 << 16
+
+
+class JSONArrayStream:
+    """Incrementally parse the items of a JSON array from a stream of chunks.
+
+    The array is either the top-level value or the value of ``data_key`` in the
+    top-level object. Items are yielded as soon as they are complete, so memory
+    stays bounded by the largest single item rather than the whole payload.
+
+    Once iteration has finished, ``envelope`` holds the rest of the response body
+    with the array replaced by ``None``, so pagination fields such as a next
+    cursor can still be read.
+    """
+
+    def __init__(self, chunks: Iterable[Union[bytes, str]], data_key: Optional[str] = None):
+        self._chunks = iter(chunks)
+        self._decoder = codecs.getincrementaldecoder('utf-8')()
+        self._json = json.JSONDecoder()
+        self._buffer = ''
+        self._pos = 0
+        self._exhausted = False
+        self.data_key = data_key
+        self.envelope: Any = None
+
+    def _read(self) -> bool:
+        """Append the next non-empty chunk to the buffer, returns False at end of stream"""
+        if self._exhausted:
+            return False
+        for chunk in self._chunks:
+            if isinstance(chunk, bytes):
+                chunk = self._decoder.decode(chunk)
+            if chunk:
+                self._buffer += chunk
+                return True
+        self._buffer += self._decoder.decode(b'', final=True)
+        self._exhausted = True
+        return False
+
+    def _read_all(self):
+        while self._read():
+            pass
+
+    def _skip_whitespace(self) -> Optional[str]:
+        """Advance past whitespace and return the next character, or None at end of stream"""
+        while True:
+            while self._pos < len(self._buffer) and self._buffer[self._pos] in _WHITESPACE:
+                self._pos += 1
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+            if not self._read():
+                return None
+
+    def _find_array(self) -> bool:
+        """Position the buffer just after the opening bracket of the target array"""
+        first = self._skip_whitespace()
+        if self.data_key is None:
+            if first == '[':
+                self._pos += 1
+                return True
+            return False
+        if first != '{':
+            return False
+
+        # Scan the top-level object for "data_key": [ without decoding the values
+        depth = 0
+        in_string = escape = expect_key = False
+        key_start = None
+        last_key = value_key = None
+        i = self._pos
+        while True:
+            if i >= len(self._buffer):
+                if not self._read():
+                    return False
+                continue
+            c = self._buffer[i]
+            if in_string:
+                if escape:
+                    escape = False
+                elif c == '\\':
+                    escape = True
+                elif c == '"':
+                    in_string = False
+                    if key_start is not None:
+                        last_key = json.loads(self._buffer[key_start:i + 1])
+                        key_start = None
+                i += 1
+                continue
+            if depth == 1 and value_key is not None and c not in _WHITESPACE:
+                if value_key == self.data_key:
+                    if c != '[':
+                        return False
+                    self._prefix = self._buffer[:i]
+                    self._pos = i + 1
+                    return True
+                value_key = None
+            if c == '"':
+                in_string = True
+                if depth == 1 and expect_key:
+                    key_start = i
+                    expect_key = False
+            elif c in '{[':
+                depth += 1
+                if depth == 1:
+                    expect_key = True
+            elif c in '}]':
+                depth -= 1
+                if depth == 0:
+                    return False
+            elif depth == 1 and c == ',':
+                expect_key = True
+            elif depth == 1 and c == ':':
+                value_key = last_key
+            i += 1
+
+    def _fallback(self) -> Iterator[Any]:
+        """Decode the whole body at once when it is not a streamable array"""
+        self._read_all()
+        data = json.loads(self._buffer)
+        if self.data_key:
+            self.envelope = data
+            data = data[self.data_key]
+        if isinstance(data, list):
+            yield from data
+        else:
+            yield data
+
+    def __iter__(self) -> Iterator[Any]:
+        self._prefix = ''
+        if not self._find_array():
+            yield from self._fallback()
+            return
+
+        while True:
+            c = self._skip_whitespace()
+            if c is None:
+                raise json.JSONDecodeError("Unterminated array", self._buffer, self._pos)
+            if c == ']':
+                self._pos += 1
+                break
+            if c == ',':
+                self._pos += 1
+                continue
+            try:
+                item, end = self._json.raw_decode(self._buffer, self._pos)
+            except json.JSONDecodeError:
+                if self._read():
+                    continue
+                raise
+            if (end == len(self._buffer) or self._buffer[end] not in _DELIMITERS) and self._read():
+                # A number at the end of the buffer may have been cut mid-token
+                continue
+            self._pos = end
+            if self._pos > _TRIM_THRESHOLD:
+                self._buffer = self._buffer[self._pos:]
+                self._pos = 0
+            yield item
+
+        if self.data_key:
+            self._read_all()
+            self.envelope = json.loads(self._prefix + 'null' + self._buffer[self._pos:])
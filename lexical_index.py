@@ -0,0 +1,193 @@
+import json
+import re
+import sqlite3
+import threading
+from typing import Iterable, List, Optional, Tuple
+
+from langchain_core.documents import Document
+
+from query_filters import NO_DATE, extract_filters, mentions, to_day
+from routing import STOPWORDS
+
+_MAX_PARAMS = 500  # Stay well below SQLite's bound parameter limit
+_WORD = re.compile(r"\w+")
+_QUERY_STOPWORDS = STOPWORDS | frozenset([
+    'a', 'an', 'and', 'at', 'did', 'do', 'does', 'how', 'i', 'is', 'me', 'my', 'on', 'or', 'show', 'to',
+    'was', 'were', 'which', 'with', 'when', 'where', 'buy', 'bought', 'list', 'all', 'transaction', 'spent',
+])
+
+
+class LexicalIndex:
+    """SQLite index of ingested documents for exact-term and BM25 retrieval.
+
+    ``documents`` keeps each document's text and metadata, with merchant,
+    category, day, month and amount of transactions as indexed columns, so
+    questions naming an exact merchant, category or period get every match
+    instead of the nearest neighbours. ``documents_fts`` is an FTS5 index over
+    the text, kept in sync by triggers and ranked with BM25 for hybrid search.
+    """
+
+    def __init__(self, path: str = "lexical.sqlite"):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS documents (
+                id INTEGER PRIMARY KEY, namespace TEXT NOT NULL, doc_id TEXT NOT NULL, source_id TEXT,
+                type TEXT, username TEXT, merchant TEXT, category TEXT, day INTEGER, month INTEGER,
+                amount REAL, content TEXT NOT NULL, metadata TEXT NOT NULL, UNIQUE (namespace, doc_id));
+            CREATE INDEX IF NOT EXISTS documents_source ON documents (namespace, source_id);
+            CREATE INDEX IF NOT EXISTS documents_merchant ON documents (namespace, username, merchant);
+            CREATE INDEX IF NOT EXISTS documents_category ON documents (namespace, username, category);
+            CREATE INDEX IF NOT EXISTS documents_day ON documents (namespace, username, day);
+            CREATE VIRTUAL TABLE IF NOT EXISTS documents_fts USING fts5(
+                content, content='documents', content_rowid='id', tokenize='porter unicode61');
+            CREATE TRIGGER IF NOT EXISTS documents_insert AFTER INSERT ON documents BEGIN
+                INSERT INTO documents_fts (rowid, content) VALUES (new.id, new.content);
+            END;
+            CREATE TRIGGER IF NOT EXISTS documents_delete AFTER DELETE ON documents BEGIN
+                INSERT INTO documents_fts (documents_fts, rowid, content) VALUES ('delete', old.id, old.content);
+            END;
+        """)
+        self._conn.commit()
+
+    def upsert(self, namespace: str, documents: Iterable):
+        """Index documents (anything with id, page_content and metadata), replacing earlier versions"""
+        rows = []
+        for doc in documents:
+            metadata = doc.metadata
+            day = to_day(metadata.get('date') or '')
+            day = None if day == NO_DATE else day
+            amount = metadata.get('amount')
+            rows.append((
+                namespace, doc.id, metadata.get('source_id'), metadata.get('type'),
+                (metadata.get('username') or '').lower() or None,
+                metadata.get('merchant'), metadata.get('category'),
+                day, int(metadata['date'][5:7]) if day is not None else None,
+                float(amount) if amount not in (None, '') else None,
+                doc.page_content, json.dumps(metadata, default=str)
+            ))
+        with self._lock:
+            try:
+                self._conn.executemany(
+                    "DELETE FROM documents WHERE namespace = ? AND doc_id = ?", [row[:2] for row in rows]
+                )
+                self._conn.executemany(
+                    "INSERT INTO documents (namespace, doc_id, source_id, type, username, merchant, category, "
+                    "day, month, amount, content, metadata) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    rows
+                )
+                self._conn.commit()
+            except Exception:
+                self._conn.rollback()
+                raise
+
+    def delete(self, namespace: str, ids: Iterable[str]):
+        ids = list(ids)
+        with self._lock:
+            for start in range(0, len(ids), _MAX_PARAMS):
+                chunk = ids[start:start + _MAX_PARAMS]
+                placeholders = ",".join("?" * len(chunk))
+                self._conn.execute(
+                    f"DELETE FROM documents WHERE namespace = ? AND doc_id IN ({placeholders})", [namespace, *chunk]
+                )
+            self._conn.commit()
+
+    def drop_namespace(self, namespace: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM documents WHERE namespace = ?", (namespace,))
+            self._conn.commit()
+
+    def has_source(self, namespace: str, source_id: str) -> bool:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT 1 FROM documents WHERE namespace = ? AND source_id = ? LIMIT 1", (namespace, source_id)
+            ).fetchone() is not None
+
+    def values(self, namespaces: List[str], username: str, field: str) -> List[str]:
+        """Distinct merchants or categories of a user's transactions"""
+        if field not in ("merchant", "category"):
+            raise ValueError(f"Unknown field {field}")
+        placeholders = ",".join("?" * len(namespaces))
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT DISTINCT {field} FROM documents WHERE namespace IN ({placeholders}) "
+                f"AND username = ? AND {field} IS NOT NULL",
+                [*namespaces, username]
+            ).fetchall()
+        return [row[0] for row in rows if row[0]]
+
+    def parse(self, question: str, namespaces: List[str], username: str) -> dict:
+        """Exact filters named in a question: known merchants and categories of the user, a period and amounts.
+
+        Returns an empty dict when the question names none of them.
+        """
+        question_lower = question.lower()
+        filters = extract_filters(question).bounds()
+        merchants = [value for value in self.values(namespaces, username, "merchant")
+                     if mentions(question_lower, value)]
+        categories = [value for value in self.values(namespaces, username, "category")
+                      if mentions(question_lower, value, plural=True)]
+        if merchants:
+            filters["merchants"] = sorted(merchants)
+        if categories:
+            filters["categories"] = sorted(categories)
+        return filters
+
+    def match(self, namespaces: List[str], username: str, limit: int, **filters) -> List[Tuple[Document, float]]:
+        """Every transaction of a user matching the exact filters, newest first, up to ``limit``"""
+        where, params = self._where(namespaces, username, ["transaction"], **filters)
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT doc_id, content, metadata FROM documents WHERE {where} ORDER BY day DESC LIMIT ?",
+                [*params, limit]
+            ).fetchall()
+        # Gently decreasing scores so newer transactions win ties when packing the context
+        return [(self._document(row), 1.0 - i / (2 * len(rows))) for i, row in enumerate(rows)]
+
+    def search(self, question: str, namespaces: List[str], username: Optional[str] = None,
+               types: Optional[List[str]] = None, k: int = 50, **filters) -> List[Tuple[Document, float]]:
+        """Top k documents for the question's terms by BM25, best first"""
+        terms = [term for term in dict.fromkeys(_WORD.findall(question.lower())) if term not in _QUERY_STOPWORDS]
+        if not terms:
+            return []
+        query = " OR ".join(f'"{term}"' for term in terms)
+        where, params = self._where(namespaces, username, types, **filters)
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT doc_id, documents.content, metadata, bm25(documents_fts) AS rank FROM documents_fts "
+                f"JOIN documents ON documents.id = documents_fts.rowid WHERE documents_fts MATCH ? AND {where} "
+                "ORDER BY rank LIMIT ?",
+                [query, *params, k]
+            ).fetchall()
+        # bm25() is lower for better matches
+        return [(self._document(row), -row[3]) for row in rows]
+
+    @staticmethod
+    def _where(namespaces: List[str], username: Optional[str], types: Optional[List[str]],
+               merchants: Optional[List[str]] = None, categories: Optional[List[str]] = None,
+               start_day: Optional[int] = None, end_day: Optional[int] = None,
+               month_of_year: Optional[int] = None, min_amount: Optional[float] = None,
+               max_amount: Optional[float] = None) -> Tuple[str, list]:
+        clauses = [f"namespace IN ({','.join('?' * len(namespaces))})"]
+        params: list = list(namespaces)
+        for column, values in (("type", types), ("merchant", merchants), ("category", categories)):
+            if values:
+                clauses.append(f"{column} IN ({','.join('?' * len(values))})")
+                params += values
+        for clause, value in (("username = ?", username), ("day >= ?", start_day),
+                              ("day <= ?", end_day), ("month = ?", month_of_year),
+                              ("abs(amount) >= ?", min_amount), ("abs(amount) <= ?", max_amount)):
+            if value is not None:
+                clauses.append(clause)
+                params.append(value)
+        return " AND ".join(clauses), params
+
+    @staticmethod
+    def _document(row) -> Document:
+        return Document(id=row[0], page_content=row[1], metadata=json.loads(row[2]))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,417 @@
+import json
+import logging
+import os
+import shutil
+import threading
+import uuid
+from typing import Any, Callable, Iterable, List, Optional, Tuple
+from urllib.parse import quote
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+_INITIAL_CAPACITY = 1024
+_COMPACT_MIN_DEAD_ROWS = 1024
+
+
+class _Namespace:
+    """Vectors, texts and metadata of a single namespace.
+
+    Vectors live in one contiguous float32 matrix (memory-mapped when the store
+    is persistent) and are L2-normalized on insert, so a dot product is the
+    cosine similarity. Metadata values are indexed in an inverted index of row
+    postings, plus a float column per numeric field for range filters. Deleted
+    or replaced rows are tombstoned and reclaimed by compaction.
+    """
+
+    def __init__(self, path: Optional[str]):
+        self.path = path
+        self._lock = threading.RLock()
+        self._reset()
+        if path:
+            os.makedirs(path, exist_ok=True)
+            self._load()
+
+    def _reset(self):
+        self.dim = None
+        self.size = 0  # Rows used, including tombstoned ones
+        self.capacity = 0
+        self.vectors = None
+        self.alive = np.zeros(0, dtype=bool)
+        self.ids: List[str] = []
+        self.texts: List[str] = []
+        self.metadatas: List[dict] = []
+        self.row_of = {}
+        self.postings = {}  # field -> value -> list of rows
+        self.numeric = {}  # field -> float64 column, NaN where missing
+        self._posting_arrays = {}
+
+    @property
+    def count(self) -> int:
+        return len(self.row_of)
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    def _load(self):
+        info_path = self._file("info.json")
+        if not os.path.exists(info_path):
+            return
+        with open(info_path) as f:
+            self.dim = json.load(f)["dim"]
+        capacity = os.path.getsize(self._file("vectors.f32")) // (self.dim * 4)
+        self._open_vectors(capacity)
+        self.alive = np.zeros(capacity, dtype=bool)
+        if os.path.exists(self._file("rows.jsonl")):
+            with open(self._file("rows.jsonl")) as f:
+                for line in f:
+                    entry = json.loads(line)
+                    if "delete" in entry:
+                        self._delete_rows(entry["delete"])
+                    else:
+                        self._index_row(self.size, entry["id"], entry["text"], entry["metadata"])
+                        self.size += 1
+        logging.info(f"Loaded {self.count} vectors from {self.path}")
+
+    def _open_vectors(self, capacity: int):
+        path = self._file("vectors.f32")
+        with open(path, "ab") as f:
+            f.truncate(capacity * self.dim * 4)
+        self.vectors = np.memmap(path, dtype=np.float32, mode="r+", shape=(capacity, self.dim))
+        self.capacity = capacity
+
+    def _reserve(self, n: int):
+        """Grow the matrix and columns so n more rows fit"""
+        if self.size + n <= self.capacity:
+            return
+        capacity = max(self.capacity * 2, self.size + n, _INITIAL_CAPACITY)
+        if self.path:
+            if self.vectors is not None:
+                self.vectors.flush()
+                self.vectors = None
+            self._open_vectors(capacity)
+        else:
+            vectors = np.zeros((capacity, self.dim), dtype=np.float32)
+            if self.vectors is not None:
+                vectors[:self.size] = self.vectors[:self.size]
+            self.vectors = vectors
+            self.capacity = capacity
+        self.alive = np.concatenate([self.alive, np.zeros(capacity - len(self.alive), dtype=bool)])
+        for field, column in self.numeric.items():
+            self.numeric[field] = np.concatenate([column, np.full(capacity - len(column), np.nan)])
+
+    def _index_row(self, row: int, id: str, text: str, metadata: dict):
+        old = self.row_of.get(id)
+        if old is not None:
+            self.alive[old] = False
+        self.row_of[id] = row
+        self.ids.append(id)
+        self.texts.append(text)
+        self.metadatas.append(metadata)
+        self.alive[row] = True
+        for field, value in metadata.items():
+            for item in (value if isinstance(value, list) else [value]):
+                if item is not None and not isinstance(item, dict):
+                    self.postings.setdefault(field, {}).setdefault(item, []).append(row)
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                column = self.numeric.get(field)
+                if column is None:
+                    column = self.numeric[field] = np.full(self.capacity, np.nan)
+                column[row] = value
+
+    def add(self, ids: List[str], vectors, texts: List[str], metadatas: List[dict]):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if len(ids) == 0:
+            return
+        with self._lock:
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+                if self.path:
+                    with open(self._file("info.json"), "w") as f:
+                        json.dump({"dim": self.dim}, f)
+            norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+            norms[norms == 0] = 1
+            self._reserve(len(ids))
+            start = self.size
+            self.vectors[start:start + len(ids)] = vectors / norms
+            for offset, (id, text, metadata) in enumerate(zip(ids, texts, metadatas)):
+                self._index_row(start + offset, id, text, dict(metadata))
+            self.size += len(ids)
+            if self.path:
+                self.vectors.flush()
+                with open(self._file("rows.jsonl"), "a") as f:
+                    for id, text, metadata in zip(ids, texts, metadatas):
+                        f.write(json.dumps({"id": id, "text": text, "metadata": metadata}) + "\n")
+            self._maybe_compact()
+
+    def get(self, ids: Iterable[str]) -> Tuple[List[Document], np.ndarray]:
+        """Stored documents and their (normalized) vectors, skipping unknown ids"""
+        with self._lock:
+            rows = [self.row_of[id] for id in ids if id in self.row_of]
+            documents = [Document(id=self.ids[row], page_content=self.texts[row],
+                                  metadata=dict(self.metadatas[row])) for row in rows]
+            vectors = np.array(self.vectors[rows]) if rows else np.zeros((0, self.dim or 0), np.float32)
+            return documents, vectors
+
+    def update_metadata(self, updates: dict):
+        """Merge fields into the metadata of stored documents, keeping their vectors.
+
+        Updated rows are appended as new versions, like any upsert, so the
+        inverted index and numeric columns pick up the new values.
+        """
+        with self._lock:
+            rows = [(id, self.row_of[id]) for id in updates if id in self.row_of]
+            if not rows:
+                return
+            self.add(
+                [id for id, _ in rows],
+                np.array(self.vectors[[row for _, row in rows]]),
+                [self.texts[row] for _, row in rows],
+                [{**self.metadatas[row], **updates[id]} for id, row in rows]
+            )
+
+    def _delete_rows(self, ids: Iterable[str]):
+        for id in ids:
+            row = self.row_of.pop(id, None)
+            if row is not None:
+                self.alive[row] = False
+
+    def delete(self, ids: List[str]):
+        with self._lock:
+            self._delete_rows(ids)
+            if self.path:
+                with open(self._file("rows.jsonl"), "a") as f:
+                    f.write(json.dumps({"delete": list(ids)}) + "\n")
+            self._maybe_compact()
+
+    def _maybe_compact(self):
+        dead = self.size - self.count
+        if dead > _COMPACT_MIN_DEAD_ROWS and dead > self.count:
+            self.compact()
+
+    def compact(self):
+        """Rewrite the namespace without tombstoned rows"""
+        with self._lock:
+            rows = np.flatnonzero(self.alive[:self.size])
+            vectors = np.array(self.vectors[rows]) if len(rows) else np.zeros((0, self.dim or 0), np.float32)
+            ids = [self.ids[row] for row in rows]
+            texts = [self.texts[row] for row in rows]
+            metadatas = [self.metadatas[row] for row in rows]
+            if self.path:
+                # Build the compacted copy next to the original, then swap directories
+                self.vectors = None
+                compacted = _Namespace(f"{self.path}.compact")
+                compacted.add(ids, vectors, texts, metadatas)
+                compacted.vectors = None
+                os.replace(self.path, f"{self.path}.old")
+                os.replace(compacted.path, self.path)
+                shutil.rmtree(f"{self.path}.old")
+                self._reset()
+                self._load()
+            else:
+                dim = self.dim
+                self._reset()
+                self.dim = dim
+                self.add(ids, vectors, texts, metadatas)
+            logging.info(f"Compacted namespace to {self.count} vectors")
+
+    def _posting_array(self, field: str, value: Any) -> np.ndarray:
+        rows = self.postings.get(field, {}).get(value)
+        if not rows:
+            return np.zeros(0, dtype=np.int64)
+        cached = self._posting_arrays.get((field, value))
+        if cached is None or len(cached) != len(rows):
+            cached = self._posting_arrays[(field, value)] = np.asarray(rows, dtype=np.int64)
+        return cached
+
+    def _values_mask(self, field: str, values: Iterable[Any]) -> np.ndarray:
+        mask = np.zeros(self.size, dtype=bool)
+        for value in values:
+            mask[self._posting_array(field, value)] = True
+        return mask
+
+    def _field_mask(self, field: str, condition: Any) -> np.ndarray:
+        if not isinstance(condition, dict):
+            condition = {"$eq": condition}
+        mask = np.ones(self.size, dtype=bool)
+        for op, value in condition.items():
+            if op == "$eq":
+                mask &= self._values_mask(field, [value])
+            elif op == "$ne":
+                mask &= ~self._values_mask(field, [value])
+            elif op == "$in":
+                mask &= self._values_mask(field, value)
+            elif op == "$nin":
+                mask &= ~self._values_mask(field, value)
+            elif op in ("$gt", "$gte", "$lt", "$lte"):
+                column = self.numeric.get(field)
+                if column is None:
+                    return np.zeros(self.size, dtype=bool)
+                column = column[:self.size]
+                with np.errstate(invalid="ignore"):
+                    if op == "$gt":
+                        mask &= column > value
+                    elif op == "$gte":
+                        mask &= column >= value
+                    elif op == "$lt":
+                        mask &= column < value
+                    else:
+                        mask &= column <= value
+            else:
+                raise ValueError(f"Unsupported filter operator {op}")
+        return mask
+
+    def filter_mask(self, filter: Optional[dict]) -> np.ndarray:
+        """Boolean mask over rows of live documents matching a Pinecone-style filter"""
+        mask = self.alive[:self.size].copy()
+        for key, condition in (filter or {}).items():
+            if key == "$and":
+                for clause in condition:
+                    mask &= self.filter_mask(clause)
+            elif key == "$or":
+                any_mask = np.zeros(self.size, dtype=bool)
+                for clause in condition:
+                    any_mask |= self.filter_mask(clause)
+                mask &= any_mask
+            else:
+                mask &= self._field_mask(key, condition)
+        return mask
+
+    def search(self, query: List[float], k: int, filter: Optional[dict]) -> List[Tuple[Document, float]]:
+        with self._lock:
+            if not self.count or k <= 0:
+                return []
+            rows = np.flatnonzero(self.filter_mask(filter))
+            if len(rows) == 0:
+                return []
+            query = np.asarray(query, dtype=np.float32)
+            norm = np.linalg.norm(query)
+            if norm:
+                query = query / norm
+            # Score only the candidates when the filter is selective, otherwise one full pass
+            if len(rows) * 4 < self.size:
+                scores = self.vectors[rows] @ query
+            else:
+                scores = (self.vectors[:self.size] @ query)[rows]
+            k = min(k, len(rows))
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            return [
+                (Document(id=self.ids[rows[i]], page_content=self.texts[rows[i]],
+                          metadata=dict(self.metadatas[rows[i]])), float(scores[i]))
+                for i in top
+            ]
+
+
+class LocalVectorStore(VectorStore):
+    """In-process vector store with namespaces, answering queries with NumPy.
+
+    Supports the subset of the Pinecone store API that MQR uses:
+    ``add_documents``/``delete``/``similarity_search`` with ``namespace`` and a
+    metadata ``filter``, plus fetching and updating documents by id. When ``path`` is None everything is kept in memory.
+    """
+
+    def __init__(self, embedding: Embeddings, path: Optional[str] = "local_vector_store"):
+        self._embedding = embedding
+        self.path = path
+        self._namespaces = {}
+        self._lock = threading.Lock()
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self._embedding
+
+    def _namespace(self, namespace: Optional[str], create: bool = False) -> Optional[_Namespace]:
+        name = namespace or ""
+        with self._lock:
+            ns = self._namespaces.get(name)
+            if ns is None:
+                path = os.path.join(self.path, quote(name or "_default", safe="")) if self.path else None
+                if not create and (path is None or not os.path.exists(path)):
+                    return None
+                ns = self._namespaces[name] = _Namespace(path)
+            return ns
+
+    def add_texts(self, texts: Iterable[str], metadatas: Optional[List[dict]] = None, *,
+                  ids: Optional[List[str]] = None, namespace: Optional[str] = None, **kwargs: Any) -> List[str]:
+        texts = list(texts)
+        ids = list(ids) if ids else [str(uuid.uuid4()) for _ in texts]
+        vectors = self._embedding.embed_documents(texts)
+        self._namespace(namespace, create=True).add(ids, vectors, texts, metadatas or [{} for _ in texts])
+        return ids
+
+    def upsert_embeddings(self, ids: List[str], embeddings: List[List[float]], documents: List[Document],
+                          namespace: Optional[str] = None):
+        """Store precomputed embeddings without calling the embedding model"""
+        self._namespace(namespace, create=True).add(
+            ids, embeddings, [doc.page_content for doc in documents], [doc.metadata for doc in documents]
+        )
+
+    def get_by_ids(self, ids: List[str], namespace: Optional[str] = None) -> List[Document]:
+        return self.get_embeddings_by_ids(ids, namespace)[0]
+
+    def get_embeddings_by_ids(self, ids: List[str], namespace: Optional[str] = None) -> Tuple[List[Document], np.ndarray]:
+        """Documents by id together with their stored vectors"""
+        ns = self._namespace(namespace)
+        return ns.get(ids) if ns else ([], np.zeros((0, 0), np.float32))
+
+    def update_metadata(self, updates: dict, namespace: Optional[str] = None):
+        """Merge fields into stored documents' metadata (id -> fields) without re-embedding them"""
+        ns = self._namespace(namespace)
+        if ns:
+            ns.update_metadata(updates)
+
+    def delete(self, ids: Optional[List[str]] = None, namespace: Optional[str] = None,
+               delete_all: Optional[bool] = None, **kwargs: Any) -> None:
+        ns = self._namespace(namespace)
+        if ns is None:
+            return
+        if delete_all:
+            with self._lock:
+                self._namespaces.pop(namespace or "", None)
+            if ns.path:
+                ns.vectors = None
+                shutil.rmtree(ns.path, ignore_errors=True)
+        elif ids:
+            ns.delete(ids)
+
+    def count(self, namespace: Optional[str] = None, filter: Optional[dict] = None) -> int:
+        """Number of live documents in a namespace matching the filter"""
+        ns = self._namespace(namespace)
+        if ns is None:
+            return 0
+        with ns._lock:
+            return int(ns.filter_mask(filter).sum())
+
+    def similarity_search_by_vector_with_score(self, embedding: List[float], k: int = 4,
+                                               filter: Optional[dict] = None,
+                                               namespace: Optional[str] = None,
+                                               **kwargs: Any) -> List[Tuple[Document, float]]:
+        ns = self._namespace(namespace)
+        return ns.search(embedding, k, filter) if ns else []
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4, filter: Optional[dict] = None,
+                                    namespace: Optional[str] = None, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_by_vector_with_score(embedding, k, filter, namespace)]
+
+    def similarity_search_with_score(self, query: str, k: int = 4, filter: Optional[dict] = None,
+                                     namespace: Optional[str] = None, **kwargs: Any) -> List[Tuple[Document, float]]:
+        return self.similarity_search_by_vector_with_score(self._embedding.embed_query(query), k, filter, namespace)
+
+    def similarity_search(self, query: str, k: int = 4, filter: Optional[dict] = None,
+                          namespace: Optional[str] = None, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k, filter, namespace)]
+
+    def _select_relevance_score_fn(self) -> Callable[[float], float]:
+        # Cosine similarity in [-1, 1] mapped to [0, 1]
+        return lambda score: (score + 1) / 2
+
+    @classmethod
+    def from_texts(cls, texts: List[str], embedding: Embeddings, metadatas: Optional[List[dict]] = None, *,
+                   ids: Optional[List[str]] = None, namespace: Optional[str] = None,
+                   path: Optional[str] = None, **kwargs: Any) -> "LocalVectorStore":
+        store = cls(embedding=embedding, path=path)
+        store.add_texts(texts, metadatas, ids=ids, namespace=namespace)
+        return store
@@ -1,20 +1,103 @@
-from components import components
-from prompts import QUERY_PROMPT, output_parser, CHAT_PROMPT
-from langchain_community.document_loaders import WebBaseLoader
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain.retrievers.multi_query import MultiQueryRetriever
-from langchain_openai import ChatOpenAI
-from langchain.chains import LLMChain
+from components import components, lazy
+import hashlib
+import json
 import logging
+import os
 import string
-from langchain_community.document_loaders.base import BaseLoader
+import time
+from langchain_core.document_loaders import BaseLoader
 from langchain_core.documents import Document
-import requests
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from datetime import datetime
+from itertools import batched
+from dataclasses import dataclass
+from typing import Iterator, Optional
+from json_stream import JSONArrayStream
+from http_client import NotModified, UsernameResolver, default_client, response_validators
+from formatters import METADATA_VERSION, Record, RecordFormatter, split_long, typed_fields
+from ingest import BulkDeleter, BulkUpdater, BulkUpserter, IngestPipeline, IngestProgress, IngestStats
+from jobs import JobQueue
+from lexical_index import LexicalIndex
+from query_filters import QueryFilters
+from snapshot import SnapshotReader, SnapshotWriter
+from retrieval import reciprocal_rank_fusion, search_namespaces, search_queries
+from analytics import AGGREGATE_PATTERN, TransactionAnalytics, TransactionBatch
+from cache import TTLCache
+from context_packer import ContextPacker
 from source_manager import SourceManager
+from tracing import tracer
+
+def _canonical_metadata(metadata: dict) -> dict:
+    """Metadata in the form any vector store reads it back in.
+
+    Pinecone drops null fields and returns every number as a float, so without
+    this a document fetched back from it never hashes like the formatted original.
+    """
+    metadata = {key: value for key, value in metadata.items() if value is not None}
+    metadata.update(typed_fields(metadata))
+    return {key: int(value) if isinstance(value, float) and value.is_integer() else value
+            for key, value in metadata.items()}
+
+def _document_hash(doc: Document) -> str:
+    """Hash of everything that ends up in the vector store for a document, in canonical form"""
+    payload = json.dumps([doc.page_content, _canonical_metadata(doc.metadata)], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+def _normalize_question(question: str) -> str:
+    """Lowercase a question and drop punctuation and extra whitespace for cache keys"""
+    return " ".join(question.lower().translate(str.maketrans('', '', string.punctuation)).split())
+
+def _metadata_filter(exact: dict, ranges: bool = True) -> dict:
+    """Vector store filter for lexical exact filters.
+    
+    Date and amount ranges are only included when ``ranges`` is set, since they
+    match nothing in documents stored before the typed metadata fields existed.
+    """
+    conditions = {}
+    if exact.get("merchants"):
+        conditions["merchant"] = {"$in": exact["merchants"]}
+    if exact.get("categories"):
+        conditions["category"] = {"$in": exact["categories"]}
+    if ranges:
+        conditions.update(QueryFilters(**{
+            key: value for key, value in exact.items() if key not in ("merchants", "categories")
+        }).vector_filter())
+    return conditions
+
+def _documents_size(results: list[tuple[Document, float]]) -> int:
+    """Approximate memory held by a list of scored documents"""
+    return sum(len(doc.page_content) + 64 * len(doc.metadata) for doc, _ in results) + 64
+
+@dataclass
+class StreamStats:
+    """Latency of one streamed answer, in seconds since the question was received"""
+    prompt_ready: Optional[float] = None
+    first_token: Optional[float] = None
+    total: Optional[float] = None
+    tokens: int = 0
+
+    @property
+    def tokens_per_sec(self) -> float:
+        # Generation rate after the first token, so prompt processing is not counted
+        if self.tokens < 2 or self.total is None or self.first_token is None or self.total <= self.first_token:
+            return 0.0
+        return (self.tokens - 1) / (self.total - self.first_token)
+
+def _lookup(data, path: str):
+    """Resolve a dotted path such as 'meta.next_cursor' in a decoded JSON body"""
+    if not path:
+        return None
+    for key in path.split('.'):
+        if not isinstance(data, dict):
+            return None
+        data = data.get(key)
+    return data
 
 class APILoader(BaseLoader):
     def __init__(self, endpoint, params=None, headers=None, data_key=None, data_type=None, 
-                 base_url=None, username=None, user_id=None):
+                 base_url=None, username=None, user_id=None, pagination=None, chunk_size=65536,
+                 validators=None, client=None):
         self.endpoint = endpoint
         self.params = params or {}
         self.headers = headers or {}
@@ -23,208 +106,687 @@ class APILoader(BaseLoader):
         self.base_url = base_url
         self.username = username
         self.user_id = user_id
+        self.pagination = pagination
+        self.chunk_size = chunk_size
+        self.validators = validators  # ETag/Last-Modified of the previous fetch, for a conditional request
+        self.response_validators = None  # Validators of this fetch, unpaginated endpoints only
+        self.client = client or default_client
+        self.formatter = RecordFormatter(username)
     
     def load(self) -> list[Document]:
-        response = requests.get(self.endpoint, params=self.params, headers=self.headers)
-        response.raise_for_status()
-        
-        data = response.json()
-        if self.data_key:
-            data = data[self.data_key]
-            
-        if isinstance(data, list):
-            documents = []
-            for item in data:
-                content, metadata = self._format_content(item)
-                documents.append(Document(page_content=content, metadata=metadata))
-            logging.info(f"Created {len(documents)} {self.data_type} documents")
-            return documents
-        else:
-            content, metadata = self._format_content(data)
-            return [Document(page_content=content, metadata=metadata)]
-    
-    def _format_content(self, item):
-        """Format content based on data type and structure"""
-        if isinstance(item, dict):
-            if 'username' in item:
-                # User record formatting remains the same
-                metadata = {
-                    "type": "user",
-                    "data_type": "user",
-                    "user_id": str(item.get('id', '')),
-                    "username": item['username'].lower(),
-                }
-                content = f"User {item['username']} with ID {item.get('id', '')}"
-                
-            elif any(key in item for key in ['amount', 'transaction_id', 'user_id']):
-                # Use the configured username instead of fetching it
-                metadata = {
-                    "type": "transaction",
-                    "data_type": "transaction",
-                    "user_id": str(item.get('user_id', '')),
-                    "username": self.username,  # Use configured username
-                    "transaction_id": str(item.get('id', '')),
-                    "category": item.get('category', ''),
-                    "amount": str(item.get('amount', 0)),
-                    "date": item.get('date', '').split('T')[0],
-                    "merchant": item.get('name', ''),
-                    "transaction_type": "credit" if item.get('amount', 0) < 0 else "debit"
-                }
-                
-                content = (
-                    f"A {metadata['transaction_type']} transaction of ${abs(float(metadata['amount']))} "
-                    f"by {self.username if self.username else f'user {metadata["user_id"]}'} "
-                    f"at {metadata['merchant']} on {metadata['date']} "
-                    f"in the {metadata['category'].replace('_', ' ').title()} category."
-                )
-        else:
-            metadata = {"type": "unknown", "data_type": "unknown"}
-            content = str(item)
+        return list(self.lazy_load())
+
+    def lazy_load(self) -> Iterator[Document]:
+        """Yield documents one at a time while the response is still downloading"""
+        for record in self.iter_records():
+            yield record.to_document()
+
+    def iter_records(self) -> Iterator[Record]:
+        """Yield compact records one at a time while the response is still downloading.
         
-        return content, metadata
+        Raises NotModified before yielding anything if the endpoint answers a
+        conditional request with 304.
+        """
+        count = 0
+        formatting = 0.0
+        for items in batched(self._iter_items(), 256):
+            start = time.perf_counter()
+            records = self.formatter.format_batch(items, self._resolve_usernames(items))
+            formatting += time.perf_counter() - start
+            count += len(records)
+            yield from records
+        tracer.record("ingest.format", formatting, documents=count)
+        tracer.count("ingest.documents", count)
+        logging.info(f"Created {count} {self.data_type} documents")
+
+    def _iter_items(self) -> Iterator:
+        """Iterate over raw records across all pages of the endpoint"""
+        pagination = self.pagination
+        if not pagination:
+            yield from self._fetch_page(self.params)
+            return
+
+        position = pagination.start
+        if position is None:
+            position = 0 if pagination.type == 'offset' else 1
+        cursor = None
+        pages = 0
+        while True:
+            params = dict(self.params)
+            if pagination.size_param:
+                params[pagination.size_param] = pagination.page_size
+            if pagination.type == 'cursor':
+                if cursor is not None:
+                    params[pagination.cursor_param] = cursor
+            else:
+                params[pagination.page_param] = position
+
+            stream = self._fetch_page(params)
+            count = 0
+            for item in stream:
+                count += 1
+                yield item
+            pages += 1
+            logging.debug(f"Fetched page {pages} with {count} records from {self.endpoint}")
 
+            if count == 0 or (pagination.max_pages and pages >= pagination.max_pages):
+                break
+            if pagination.type == 'cursor':
+                cursor = _lookup(stream.envelope, pagination.cursor_key)
+                if not cursor:
+                    break
+            else:
+                # A short page means the server has run out of records
+                if pagination.size_param and count < pagination.page_size:
+                    break
+                position += count if pagination.type == 'offset' else 1
+
+    def _fetch_page(self, params: dict) -> JSONArrayStream:
+        """Stream one response body, parsing the data array incrementally"""
+        return JSONArrayStream(self._iter_chunks(params), self.data_key)
+
+    def _iter_chunks(self, params: dict) -> Iterator[bytes]:
+        # Only an unpaginated fetch is a single resource a validator can describe
+        validators = self.validators if not self.pagination else None
+        with ExitStack() as stack:
+            with tracer.span("ingest.connect"):
+                response = stack.enter_context(
+                    self.client.stream(self.endpoint, params=params, headers=self.headers, validators=validators)
+                )
+            if not self.pagination:
+                self.response_validators = response_validators(response)
+            # Only time spent waiting on the network counts, not the consumer's processing
+            chunks = response.iter_content(chunk_size=self.chunk_size)
+            waiting, size = 0.0, 0
+            while True:
+                start = time.perf_counter()
+                chunk = next(chunks, None)
+                waiting += time.perf_counter() - start
+                if chunk is None:
+                    break
+                size += len(chunk)
+                yield chunk
+            tracer.record("ingest.fetch", waiting, bytes=size)
+            tracer.count("ingest.bytes", size)
+    
+    def _resolve_usernames(self, items) -> dict:
+        """Usernames for the user ids of a batch of transactions, when no username is configured"""
+        if self.username or not self.base_url:
+            return {}
+        user_ids = [item['user_id'] for item in items if isinstance(item, dict)
+                    and 'user_id' in item and 'username' not in item]
+        if not user_ids:
+            return {}
+        return UsernameResolver.for_base_url(self.base_url).resolve_many(user_ids)
+    
     def _get_username_for_user_id(self, user_id: str) -> str:
         """Helper method to get username for a given user_id"""
-        try:
-            # Assuming you have access to the users data
-            # This could be from a cache, database, or API call
-            response = requests.get(f"{self.base_url}/users/{user_id}")
-            if response.status_code == 200:
-                user_data = response.json()
-                return user_data.get('username', '')
-        except Exception as e:
-            logging.error(f"Error fetching username for user_id {user_id}: {str(e)}")
-        return ''
+        return UsernameResolver.for_base_url(self.base_url).resolve(user_id)
 
 class MQR(components):
     def __init__(self):
         logging.basicConfig(level=logging.INFO)  # Set logging level at initialization
         super().__init__()
-        self.llm_chain = QUERY_PROMPT | self.llm | output_parser
-        self.chat_chain = CHAT_PROMPT | self.llm
         self.chat_history = []
         self.source_manager = SourceManager()
-        self.text_splitter = RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=0)
         self.data_types = set()  # Track available types of financial data
+        self.ingest_batch_size = 256  # Documents held in memory at once during ingestion
+        self.upsert_batch_size = 100  # Documents embedded and upserted together
+        self.chunk_size = 500  # Characters per chunk; shorter documents are never split
+        self.max_in_flight_upserts = 4
+        self.upsert_retries = 3
+        self.delete_batch_size = 1000
+        self.analytics = TransactionAnalytics()  # Columnar transaction store for exact aggregates
+        self.lexical_index = LexicalIndex()  # Exact merchant/category/date lookups and BM25 over ingested text
+        self.exact_match_limit = 200  # Exact merchant/category matches answered directly; more are narrowed with vector search
+        self.search_k = 50  # Documents per search; a date/amount filtered set this small is returned whole
+        self.namespace_versions = {}  # Bumped on every change so cached results are never stale
+        self.retrieval_cache = TTLCache(max_entries=256, ttl=600, max_bytes=64 * 1024 * 1024,
+                                        sizeof=lambda entry: _documents_size(entry[0]))
+        self.answer_cache = TTLCache(max_entries=1024, ttl=600, max_bytes=8 * 1024 * 1024, sizeof=len)
+        self.search_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="search")
+        self.search_timeout = 10.0  # Seconds a single namespace search may take
+        self.search_deadline = 20.0  # Seconds to wait for all namespace searches
+        self.context_packer = ContextPacker()  # Token budget for prompt context and chat history
+        self.last_stream_stats = None  # StreamStats of the most recent generated answer
+        self.multi_query = False  # Opt-in: also search LLM rewrites of the question and fuse the rankings
+        self.max_rewrites = 4
+        self.rewrite_timeout = 10.0  # Seconds to wait for rewrites before using the original results alone
+        self.rewrite_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="rewrite")
+        self.last_retrieval_timings = {}  # Seconds spent per retrieval stage for the most recent search
+    
+    @lazy
+    def llm_chain(self):
+        from prompts import QUERY_PROMPT, output_parser
+        return QUERY_PROMPT | self.llm | output_parser
     
-    def add_api_source(self, source_id: str, config: dict) -> bool:
+    @lazy
+    def chat_chain(self):
+        from prompts import CHAT_PROMPT
+        return CHAT_PROMPT | self.llm
+    
+    @lazy
+    def text_splitter(self):
+        from langchain_text_splitters import RecursiveCharacterTextSplitter
+        return RecursiveCharacterTextSplitter(chunk_size=self.chunk_size, chunk_overlap=0)
+    
+    def add_api_source(self, source_id: str, config: dict, progress: Optional[IngestProgress] = None) -> bool:
         """Add a new API source and load its data"""
         try:
             source = self.source_manager.add_source(source_id, config)
-            endpoint_parts = str(source.endpoint).split('/')
-            base_url = f"{endpoint_parts[0]}//{endpoint_parts[2]}"
+            return self._sync_source(source_id, source, stored_hashes={}, progress=progress)
+        except Exception as e:
+            logging.error(f"Error adding source {source_id}: {str(e)}")
+            return False
+    
+    def refresh_api_source(self, source_id: str, progress: Optional[IngestProgress] = None) -> bool:
+        """Re-fetch an API source and apply only new, changed and vanished documents"""
+        try:
+            source = self.source_manager.sources.get(source_id)
+            if not source:
+                logging.warning(f"Source {source_id} not found")
+                return False
+            if source.metadata_version < METADATA_VERSION:
+                # Otherwise the new fields change every hash and the sync rewrites every document
+                self.migrate_source_metadata(source_id, progress=progress)
+            stored_hashes = self.source_manager.get_document_hashes(source_id)
+            return self._sync_source(source_id, source, stored_hashes=stored_hashes, progress=progress)
+        except Exception as e:
+            logging.error(f"Error refreshing source {source_id}: {str(e)}")
+            return False
+    
+    def outdated_sources(self) -> list[str]:
+        """Ids of sources whose stored documents predate the current metadata schema"""
+        return [source_id for source_id, source in self.source_manager.sources.items()
+                if source.metadata_version < METADATA_VERSION]
+    
+    def migrate_source_metadata(self, source_id: str, progress: Optional[IngestProgress] = None) -> bool:
+        """Add the typed metadata fields of the current schema to a source's stored documents.
+        
+        Documents are fetched from the vector store by id together with their
+        vectors and upserted back with the new fields, one request per batch in
+        concurrent batches, so nothing is re-fetched from the API or
+        re-embedded. Their stored hashes are recomputed in canonical form, so
+        the next refresh sees them as unchanged.
+        """
+        try:
+            source = self.source_manager.sources.get(source_id)
+            if not source:
+                logging.warning(f"Source {source_id} not found")
+                return False
+            if source.metadata_version >= METADATA_VERSION:
+                return True
             
-            loader = APILoader(
-                endpoint=str(source.endpoint),
-                params=source.params,
-                headers=source.headers,
-                data_key=source.data_key,
-                data_type=config.get('data_type', 'general'),
-                base_url=base_url,
-                username=config.get('username'),
-                user_id=config.get('user_id')
-            )
-            documents = loader.load()
-            self.data_types.add(config.get('data_type', 'general'))
+            hashes = {}
+            def migrate(batch, namespace):
+                # Upserting whole batches back costs one request per batch, where
+                # Pinecone's metadata update would cost one request per vector
+                documents, vectors = self.fetch_embeddings(batch, namespace)
+                changed = []
+                for doc, values in zip(documents, vectors):
+                    fields = typed_fields(doc.metadata)
+                    # Documents already carrying the fields only need their hashes updated
+                    if any(doc.metadata.get(key) != value for key, value in fields.items()):
+                        doc.metadata.update(fields)
+                        changed.append((doc, values))
+                if changed:
+                    self.upsert_embeddings([doc.id for doc, _ in changed], [values for _, values in changed],
+                                           [doc for doc, _ in changed], namespace)
+                self.lexical_index.upsert(namespace, documents)
+                hashes.update((doc.id, _document_hash(doc)) for doc in documents)
             
-            # Use different chunking strategies based on data type
-            if config.get('data_type') == 'transactions':
-                # For transactions, keep them as individual documents but add a summary document
-                transactions_by_user = {}
-                for doc in documents:
-                    username = doc.metadata.get('username')
-                    if username:
-                        if username not in transactions_by_user:
-                            transactions_by_user[username] = []
-                        transactions_by_user[username].append(doc)
-                
-                # Create summary documents for each user
-                summary_docs = []
-                for username, user_docs in transactions_by_user.items():
-                    total_debit = sum(float(d.metadata['amount']) for d in user_docs if d.metadata['transaction_type'] == 'debit')
-                    total_credit = sum(float(d.metadata['amount']) for d in user_docs if d.metadata['transaction_type'] == 'credit')
-                    
-                    summary_content = (
-                        f"Transaction summary for {username}: "
-                        f"Total of {len(user_docs)} transactions. "
-                        f"Total debits: ${total_debit:.2f}. "
-                        f"Total credits: ${total_credit:.2f}. "
-                        f"Net change: ${(total_debit + total_credit):.2f}"
+            updater = BulkUpdater(
+                migrate,
+                batch_size=self.upsert_batch_size,
+                max_in_flight=self.max_in_flight_upserts,
+                max_retries=self.upsert_retries
+            )
+            ids = list(self.source_manager.get_document_hashes(source_id))
+            with tracer.span("ingest.migrate", source=source_id, documents=len(ids)):
+                _, stats = updater.run(
+                    ids, source.namespace, progress=progress,
+                    on_commit=lambda batch: self.source_manager.update_documents(
+                        source_id, {id: hashes.pop(id) for id in batch if id in hashes}
                     )
-                    
-                    summary_docs.append(Document(
-                        page_content=summary_content,
-                        metadata={
-                            'type': 'transaction_summary',
-                            'data_type': 'transaction_summary',
-                            'username': username,
-                            'source_id': source_id,
-                            'namespace': source.namespace
-                        }
-                    ))
-                
-                documents.extend(summary_docs)
-            else:
-                # Use regular text splitting for other document types
-                documents = self.text_splitter.split_documents(documents)
-            
-            # Split documents before adding to vector store
-            split_docs = self.text_splitter.split_documents(documents)
-            
-            # Add source_id and namespace to metadata for each document
-            for doc in split_docs:
-                doc.metadata['source_id'] = source_id
-                doc.metadata['data_type'] = config.get('data_type', 'general')
-                doc.metadata['namespace'] = source.namespace
-                # Ensure username is never null in metadata
-                if 'username' in doc.metadata and doc.metadata['username'] is None:
-                    doc.metadata['username'] = config.get('username', 'unknown')
-            
-            # Add documents to vector store with custom namespace
-            try:
-                ids = self.vector_store.add_documents(
-                    documents=split_docs,
-                    namespace=source.namespace
                 )
-                # Store document IDs in source config
-                source.document_ids = ids
-                self.source_manager._save_sources()
-                return True
-            except Exception as e:
-                logging.error(f"Error adding documents to vector store: {str(e)}")
+            self._bump_namespace_version(source.namespace)
+            if stats.cancelled or stats.failed_batches:
+                logging.error(f"Migration of {source_id} incomplete: {stats.failed_documents} documents failed")
                 return False
-            
+            self.source_manager.set_metadata_version(source_id, METADATA_VERSION)
+            logging.info(f"Migrated metadata of {stats.documents} documents of {source_id} to version {METADATA_VERSION}")
+            return True
         except Exception as e:
-            logging.error(f"Error adding source {source_id}: {str(e)}")
+            logging.error(f"Error migrating source {source_id}: {str(e)}")
+            return False
+    
+    def _make_loader(self, source, validators: Optional[dict] = None) -> APILoader:
+        endpoint_parts = str(source.endpoint).split('/')
+        base_url = f"{endpoint_parts[0]}//{endpoint_parts[2]}"
+        
+        return APILoader(
+            endpoint=str(source.endpoint),
+            params=source.params,
+            headers=source.headers,
+            data_key=source.data_key,
+            data_type=source.data_type,
+            base_url=base_url,
+            username=source.username,
+            user_id=source.user_id,
+            pagination=source.pagination,
+            validators=validators
+        )
+    
+    def _sync_source(self, source_id: str, source, stored_hashes: dict,
+                     progress: Optional[IngestProgress] = None) -> bool:
+        """Upsert documents whose content hash differs from stored_hashes and delete vanished ones.
+        
+        Each committed batch is recorded right away, so an interrupted sync can be
+        resumed by a refresh that skips everything already stored.
+        """
+        progress = progress or IngestProgress()
+        # Only a refresh can be answered with 304; an add always needs the full body
+        validators = self.source_manager.get_validators(source_id) if stored_hashes else None
+        loader = self._make_loader(source, validators)
+        self.data_types.add(source.data_type)
+        
+        fresh_hashes = {}
+        transactions = TransactionBatch()
+        # Sources stored before the lexical index existed get their unchanged documents indexed too
+        backfill = bool(stored_hashes) and not self.lexical_index.has_source(source.namespace, source_id)
+        def changed_documents():
+            unchanged = []
+            for doc in self._prepare_documents(source_id, source, loader.iter_records(), transactions):
+                digest = _document_hash(doc)
+                fresh_hashes[doc.id] = digest
+                progress.fetched += 1
+                if stored_hashes.get(doc.id) != digest:
+                    yield doc
+                elif backfill:
+                    unchanged.append(doc)
+                    if len(unchanged) >= self.ingest_batch_size:
+                        self.lexical_index.upsert(source.namespace, unchanged)
+                        unchanged = []
+            if unchanged:
+                self.lexical_index.upsert(source.namespace, unchanged)
+        
+        def embed(texts):
+            with tracer.span("ingest.embed", documents=len(texts)):
+                return self.cached_embeddings.embed_documents(texts)
+        
+        def upsert(ids, embeddings, documents, namespace):
+            with tracer.span("ingest.upsert", documents=len(ids)):
+                self.upsert_embeddings(ids, embeddings, documents, namespace)
+                self.lexical_index.upsert(namespace, documents)
+        
+        pipeline = IngestPipeline(
+            embed,
+            upsert,
+            batch_size=self.upsert_batch_size,
+            max_in_flight=self.max_in_flight_upserts,
+            max_retries=self.upsert_retries
+        )
+        hits, misses = self.cached_embeddings.hits, self.cached_embeddings.misses
+        try:
+            with tracer.span("ingest.sync", source=source_id):
+                committed, stats = pipeline.run(
+                    changed_documents(),
+                    namespace=source.namespace,
+                    id_fn=lambda doc: doc.id,
+                    progress=progress,
+                    on_commit=lambda ids: self.source_manager.update_documents(
+                        source_id, {id: fresh_hashes[id] for id in ids}
+                    )
+                )
+        except NotModified:
+            tracer.count("ingest.not_modified")
+            logging.info(f"Source {source_id} unchanged (304), skipping sync")
+            return True
+        tracer.count("ingest.upserted", len(committed))
+        hits = self.cached_embeddings.hits - hits
+        misses = self.cached_embeddings.misses - misses
+        if hits + misses:
+            logging.info(f"Embedding cache: {hits} hits, {misses} misses ({hits / (hits + misses):.1%} hit rate)")
+        
+        self._bump_namespace_version(source.namespace)
+        if stats.cancelled:
+            # The fetch is incomplete, so nothing can be treated as vanished yet
+            logging.warning(f"Sync of {source_id} cancelled after {len(committed)} documents")
+            return False
+        # Every fetched document is now stored as the current formatter writes it, except
+        # failed ones, whose old hashes make the next refresh rewrite them anyway
+        self.source_manager.set_metadata_version(source_id, METADATA_VERSION)
+        
+        if source.data_type == 'transactions':
+            self.analytics.replace_source(source.namespace, source_id, transactions)
+        
+        # Ids stored previously (including legacy random ids) that the fresh fetch no longer produced.
+        # Committed batches were recorded as they landed, and each deleted batch is
+        # forgotten as it goes; documents whose update or delete failed keep their
+        # old record and are retried on the next refresh.
+        vanished = [id for id in stored_hashes if id not in fresh_hashes]
+        deleted, delete_stats = self._delete_documents(source_id, vanished, source.namespace) if vanished else ([], IngestStats())
+        
+        logging.info(
+            f"Synced {source_id}: {len(committed)} upserted, {len(deleted)} deleted, "
+            f"{len(fresh_hashes) - len(committed) - stats.failed_documents} unchanged"
+        )
+        if stats.failed_batches or delete_stats.failed_batches:
+            if stats.failed_batches:
+                logging.error(f"{stats.failed_documents} documents from {source_id} could not be added to the vector store")
+            if delete_stats.failed_batches:
+                logging.error(f"{delete_stats.failed_documents} vanished documents of {source_id} could not be deleted")
+            # Without the validators the next refresh fetches everything and retries the failures
+            self.source_manager.set_validators(source_id, None)
             return False
+        self.source_manager.set_validators(source_id, loader.response_validators)
+        return True
+    
+    def _prepare_documents(self, source_id: str, source, documents: Iterator[Record],
+                           transactions: TransactionBatch) -> Iterator[Record]:
+        """Split and tag loaded documents in bounded batches, followed by per-user summaries.
+        
+        Transaction rows are also collected into the columnar batch for analytics.
+        """
+        is_transactions = source.data_type == 'transactions'
+        
+        # Running per-user totals so summaries don't need every transaction in memory
+        totals_by_user = {}
+        for batch in batched(documents, self.ingest_batch_size):
+            if is_transactions:
+                # Accumulate the summary while the transactions pass through
+                for doc in batch:
+                    username = doc.metadata.get('username')
+                    transactions.add(doc.metadata, username or source.username or 'unknown', source_id)
+                    if username:
+                        totals = totals_by_user.setdefault(username, [0, 0.0, 0.0])
+                        totals[0] += 1
+                        if doc.metadata['transaction_type'] == 'debit':
+                            totals[1] += doc.metadata['amount']
+                        elif doc.metadata['transaction_type'] == 'credit':
+                            totals[2] += doc.metadata['amount']
+            
+            yield from self._tag_documents(source_id, source, batch)
+        
+        # Create summary documents for each user. Unchanged summaries hash the same,
+        # so a refresh only re-embeds them for users whose transactions changed.
+        summary_docs = []
+        for username, (count, total_debit, total_credit) in totals_by_user.items():
+            summary_content = (
+                f"Transaction summary for {username}: "
+                f"Total of {count} transactions. "
+                f"Total debits: ${total_debit:.2f}. "
+                f"Total credits: ${total_credit:.2f}. "
+                f"Net change: ${(total_debit + total_credit):.2f}"
+            )
+            
+            summary_docs.append(Record(
+                summary_content,
+                metadata={
+                    'type': 'transaction_summary',
+                    'data_type': 'transaction_summary',
+                    'username': username,
+                    'source_id': source_id,
+                    'namespace': source.namespace,
+                    'doc_id': f"summary-{username}"
+                }
+            ))
+        
+        yield from self._tag_documents(source_id, source, summary_docs)
+    
+    def _tag_documents(self, source_id: str, source, documents) -> list:
+        """Split documents longer than a chunk, add source metadata and assign stable ids"""
+        with tracer.span("ingest.split", documents=len(documents)):
+            split_docs = split_long(documents, self.text_splitter, self.chunk_size)
+        
+        # Add source_id and namespace to metadata for each document
+        chunks = {}
+        for doc in split_docs:
+            doc.metadata['source_id'] = source_id
+            doc.metadata['data_type'] = source.data_type
+            doc.metadata['namespace'] = source.namespace
+            # Ensure username is never null in metadata
+            if 'username' in doc.metadata and doc.metadata['username'] is None:
+                doc.metadata['username'] = source.username or 'unknown'
+            
+            # Ids are prefixed with the source so sources can share a namespace
+            doc_id = doc.metadata.get('doc_id') or hashlib.sha256(doc.page_content.encode('utf-8')).hexdigest()[:32]
+            chunk = chunks[doc_id] = chunks.get(doc_id, -1) + 1
+            doc.id = f"{source_id}:{doc_id}" if chunk == 0 else f"{source_id}:{doc_id}#{chunk}"
+        return split_docs
     
-    def remove_api_source(self, source_id: str):
-        """Remove an API source and its documents from the vector store"""
+    def remove_api_source(self, source_id: str, progress: Optional[IngestProgress] = None) -> bool:
+        """Remove an API source and its documents from the vector store.
+        
+        The whole namespace is wiped only when no other source stores documents
+        in it; otherwise exactly this source's documents are deleted by id. If
+        some of them cannot be deleted the source is kept, with only the
+        remaining ids, so the removal can be retried.
+        """
         try:
             source = self.source_manager.sources.get(source_id)
-            if source:
-                # Delete entire namespace from Pinecone
+            if not source:
+                logging.warning(f"Source {source_id} not found")
+                print(f"Source {source_id} not found")
+                return False
+            
+            start = time.perf_counter()
+            others = [id for id in self.source_manager.namespace_sources(source.namespace) if id != source_id]
+            if not others:
+                # Last reference: dropping the namespace is one call regardless of its size
                 try:
                     logging.info(f"Deleting namespace {source.namespace} from vector store")
-                    self.vector_store.delete(
-                        namespace=source.namespace,
-                        delete_all=True
-                    )
+                    with tracer.span("remove.namespace", source=source_id):
+                        self.vector_store.delete(namespace=source.namespace, delete_all=True)
                 except Exception as e:
                     # Log the error but continue with source removal
                     logging.warning(f"Could not delete namespace {source.namespace}: {str(e)}")
                     logging.warning("Continuing with source removal...")
-                
-                # Remove the source completely
-                logging.info(f"Removing source {source_id}")
-                self.source_manager.remove_source(source_id)
-                print(f"Source {source_id} removed successfully")
+                self.lexical_index.drop_namespace(source.namespace)
             else:
-                logging.warning(f"Source {source_id} not found")
-                print(f"Source {source_id} not found")
+                logging.info(f"Namespace {source.namespace} is shared with {', '.join(others)}, deleting only {source_id}'s documents")
+                ids = list(self.source_manager.get_document_hashes(source_id))
+                with tracer.span("remove.documents", source=source_id, documents=len(ids)):
+                    _, stats = self._delete_documents(source_id, ids, source.namespace, progress)
+                if stats.cancelled or stats.failed_batches:
+                    self._bump_namespace_version(source.namespace)
+                    logging.error(f"Kept source {source_id}: {stats.failed_documents} documents could not be deleted")
+                    print(f"Error removing source {source_id}")
+                    return False
+            
+            self.analytics.remove_source(source.namespace, source_id)
+            self._bump_namespace_version(source.namespace)
+            
+            # Remove the source completely
+            logging.info(f"Removing source {source_id}")
+            self.source_manager.remove_source(source_id)
+            logging.info(f"Removed {source_id} in {time.perf_counter() - start:.2f}s")
+            print(f"Source {source_id} removed successfully")
+            return True
         except Exception as e:
             logging.error(f"Error removing source {source_id}: {str(e)}")
             print(f"Error removing source {source_id}")
+            return False
+    
+    def _delete_documents(self, source_id: str, ids: list[str], namespace: str,
+                          progress: Optional[IngestProgress] = None):
+        """Delete documents by id in concurrent batches, forgetting each batch once it is gone"""
+        def delete(batch, namespace):
+            self.vector_store.delete(ids=batch, namespace=namespace)
+            self.lexical_index.delete(namespace, batch)
+        
+        deleter = BulkDeleter(
+            delete,
+            batch_size=self.delete_batch_size,
+            max_in_flight=self.max_in_flight_upserts,
+            max_retries=self.upsert_retries
+        )
+        return deleter.run(
+            ids, namespace, progress=progress,
+            on_commit=lambda batch: self.source_manager.update_documents(source_id, {}, removed=batch)
+        )
+
+    def export_namespace(self, namespace: str, path: str, dtype: str = "float32", chunk_rows: int = 10000,
+                         progress: Optional[IngestProgress] = None) -> bool:
+        """Write a namespace's vectors, documents and source configs to a snapshot file.
+        
+        Documents are read back from the vector store by id in concurrent batches
+        and written in chunks of ``chunk_rows``, so memory stays bounded. With
+        dtype "float16" the vectors take half the space. The snapshot also keeps
+        each document's content hash, so restored sources refresh incrementally.
+        """
+        writer = None
+        try:
+            source_ids = self.source_manager.namespace_sources(namespace)
+            if not source_ids:
+                logging.warning(f"No sources store documents in namespace {namespace}")
+                return False
+            progress = progress or IngestProgress()
+            start = time.perf_counter()
+            hashes = {}
+            for source_id in source_ids:
+                hashes.update(self.source_manager.get_document_hashes(source_id))
+            header = {
+                "namespace": namespace,
+                "embedding_model": self.embedding_model,
+                "created_at": datetime.now().isoformat(),
+                "sources": {
+                    source_id: self.source_manager._config_data(self.source_manager.sources[source_id])
+                    for source_id in source_ids
+                },
+            }
+            
+            with ThreadPoolExecutor(max_workers=self.max_in_flight_upserts) as executor:
+                for chunk in batched(hashes, chunk_rows):
+                    records, vectors = [], []
+                    fetches = executor.map(lambda ids: self.fetch_embeddings(ids, namespace),
+                                           batched(chunk, self.upsert_batch_size))
+                    for documents, embeddings in fetches:
+                        for doc, vector in zip(documents, embeddings):
+                            records.append({"id": doc.id, "text": doc.page_content, "metadata": doc.metadata,
+                                            "hash": hashes.get(doc.id)})
+                            vectors.append(vector)
+                    if progress.cancelled:
+                        raise InterruptedError("Export cancelled")
+                    if not records:
+                        continue
+                    if writer is None:
+                        writer = SnapshotWriter(path, dim=len(vectors[0]), dtype=dtype, header=header)
+                    writer.write_chunk(records, vectors)
+                    progress.fetched += len(records)
+            writer = writer or SnapshotWriter(path, dim=0, dtype=dtype, header=header)
+            writer.close()
+            
+            if writer.count < len(hashes):
+                logging.warning(f"{len(hashes) - writer.count} recorded documents of {namespace} were not in the vector store")
+            logging.info(
+                f"Exported {writer.count} documents of {namespace} to {path} in {time.perf_counter() - start:.2f}s "
+                f"({os.path.getsize(path) / 1024 / 1024:.1f} MiB)"
+            )
+            return True
+        except Exception as e:
+            if writer is not None:
+                writer.abort()
+            logging.error(f"Error exporting namespace {namespace}: {str(e)}")
+            return False
+    
+    def import_namespace(self, path: str, namespace: Optional[str] = None,
+                         progress: Optional[IngestProgress] = None, verify: bool = True) -> bool:
+        """Restore a snapshot written by ``export_namespace`` without calling the APIs or the embedding model.
+        
+        The snapshot's sources are added with the document hashes they had, and its
+        vectors are upserted as stored in concurrent batches, so a restore is bound
+        by upsert bandwidth. ``namespace`` restores into a different namespace. The
+        whole file is checked against its checksums first unless ``verify`` is off.
+        """
+        reader = None
+        try:
+            reader = SnapshotReader(path)
+            header = reader.header
+            if header.get("embedding_model") != self.embedding_model:
+                logging.error(f"Snapshot {path} was embedded with {header.get('embedding_model')}, not {self.embedding_model}")
+                return False
+            existing = [source_id for source_id in header["sources"] if source_id in self.source_manager.sources]
+            if existing:
+                logging.error(f"Sources {', '.join(existing)} already exist; remove them before importing {path}")
+                return False
+            if verify and not reader.verify():
+                return False
+            
+            progress = progress or IngestProgress()
+            start = time.perf_counter()
+            target = namespace or header["namespace"]
+            renamed = target != header["namespace"]
+            sources = {
+                source_id: self.source_manager.add_source(source_id, {**config, "namespace": target})
+                for source_id, config in header["sources"].items()
+            }
+            transactions = {source_id: TransactionBatch() for source_id, source in sources.items()
+                            if source.data_type == 'transactions'}
+            pending = {}  # Rows read from the snapshot and not yet committed
+            
+            def rows():
+                for records, vectors in reader:
+                    for record, vector in zip(records, vectors):
+                        metadata = record["metadata"]
+                        if renamed and "namespace" in metadata:
+                            metadata["namespace"] = target
+                        doc = Record(record["text"], metadata, record["id"])
+                        # Hashes cover the metadata, so a renamed namespace needs fresh ones. The
+                        # canonical form makes them match the hashes a refresh computes, though the
+                        # snapshot's numbers came back from the vector store as floats without nulls
+                        digest = None if renamed else record.get("hash")
+                        pending[doc.id] = (doc, vector, digest or _document_hash(doc))
+                        source_id = metadata.get("source_id")
+                        if source_id in transactions and metadata.get("type") == "transaction":
+                            username = metadata.get("username") or sources[source_id].username or 'unknown'
+                            transactions[source_id].add(metadata, username, source_id)
+                        progress.fetched += 1
+                        yield doc.id
+            
+            def upsert(ids, namespace):
+                entries = [pending[id] for id in ids]
+                documents = [doc for doc, _, _ in entries]
+                with tracer.span("ingest.upsert", documents=len(ids)):
+                    self.upsert_embeddings(ids, [vector for _, vector, _ in entries], documents, namespace)
+                    self.lexical_index.upsert(namespace, documents)
+            
+            def commit(ids):
+                committed = {}
+                for id in ids:
+                    doc, _, digest = pending.pop(id)
+                    committed.setdefault(doc.metadata.get("source_id"), {})[id] = digest
+                for source_id, hashes in committed.items():
+                    if source_id in sources:
+                        self.source_manager.update_documents(source_id, hashes)
+            
+            upserter = BulkUpserter(
+                upsert,
+                batch_size=self.upsert_batch_size,
+                max_in_flight=self.max_in_flight_upserts,
+                max_retries=self.upsert_retries
+            )
+            with tracer.span("ingest.import", namespace=target, documents=len(reader)):
+                committed, stats = upserter.run(rows(), target, progress=progress, on_commit=commit)
+            self._bump_namespace_version(target)
+            if stats.cancelled or stats.failed_batches:
+                # The sources are kept with what landed; a refresh fetches the rest from the APIs
+                logging.error(f"Import of {path} incomplete: {len(committed)} of {len(reader)} documents restored")
+                return False
+            for source_id, batch in transactions.items():
+                self.analytics.replace_source(target, source_id, batch)
+            elapsed = time.perf_counter() - start
+            logging.info(
+                f"Imported {len(committed)} documents and {len(sources)} sources into {target} in {elapsed:.2f}s "
+                f"({len(committed) / elapsed if elapsed else 0.0:.1f} docs/sec)"
+            )
+            return True
+        except Exception as e:
+            logging.error(f"Error importing snapshot {path}: {str(e)}")
+            return False
+        finally:
+            if reader is not None:
+                reader.close()
 
     def get_retriever(self, namespaces=None):
         """Get retriever with optional namespace filtering"""
@@ -254,82 +816,304 @@ class MQR(components):
             logging.error(f"Error creating retriever: {str(e)}")
             raise
 
-    def chat(self, question: str) -> str:
+    def chat(self, question: str, chat_history: Optional[list] = None) -> str:
+        return "".join(self.chat_stream(question, chat_history))
+
+    def chat_stream(self, question: str, chat_history: Optional[list] = None) -> Iterator[str]:
+        """Answer a question, yielding the answer text as the model generates it.
+        
+        chat_history is a list of (question, answer) turns and defaults to the
+        instance's own history, so a server can keep one history per session.
+        """
+        history = self.chat_history if chat_history is None else chat_history
+        stats = StreamStats()
+        started = time.perf_counter()
+        tracer.count("chat.requests")
         try:
-            # Extract username and determine if it's a user query
-            username = None
-            question_lower = question.lower()
-            is_user_query = any(keyword in question_lower for keyword in ['users', 'user', 'who'])
-            
-            if not is_user_query:
-                # Only try to extract username if it's not a user query
-                words = question_lower.translate(str.maketrans('', '', string.punctuation)).split()
-                for word in words:
-                    if word not in ['transactions', 'for', 'any', 'the', 'what', 'are', 'there', 'summary', 
-                                  'categories', 'can', 'you', 'see', 'of', 'in', 'by', 'from']:
-                        for source in self.source_manager.get_active_sources().values():
-                            if source.username and word == source.username.lower():
-                                username = source.username
-                                break
-                    if username:
-                        break
+            with tracer.span("chat.route"):
+                # Extract username and determine if it's a user query
+                username = None
+                question_lower = question.lower()
+                is_user_query = any(keyword in question_lower for keyword in ['users', 'user', 'who'])
+                
+                if not is_user_query:
+                    # Only try to extract username if it's not a user query
+                    username = self.source_manager.routing.find_username(question)
 
-            relevant_namespaces = self._get_relevant_namespaces(question, username)
+                relevant_namespaces = self._get_relevant_namespaces(question, username)
             if not relevant_namespaces:
-                return "I couldn't find any data for that user. Please verify the username and try again."
+                yield "I couldn't find any data for that user. Please verify the username and try again."
+                return
             
-            logging.info(f"Searching in namespaces: {relevant_namespaces}")
-            
-            all_results = []
-            for namespace in relevant_namespaces:
-                try:
-                    # Set filter conditions based on query type
-                    if is_user_query:
-                        filter_conditions = {"type": "user"}
-                    else:
-                        filter_conditions = {
-                            "type": "transaction",
-                            "username": username.lower() if username else None
-                        }
-                    
-                    logging.info(f"Searching namespace {namespace} with filters: {filter_conditions}")
-                    
-                    results = self.vector_store.similarity_search(
-                        question,
-                        k=50,
-                        namespace=namespace,
-                        filter=filter_conditions
-                    )
-                    
-                    logging.info(f"Found {len(results)} documents in {namespace}")
-                    all_results.extend(results)
-                    
-                except Exception as e:
-                    logging.error(f"Error searching namespace {namespace}: {str(e)}")
-                    continue
+            chat_history = "\n".join([f"Human: {q}\nAssistant: {a}" for q, a in history])
+            # Keyed on namespace versions, so any change to a source invalidates its answers
+            answer_key = (
+                _normalize_question(question),
+                self._namespace_versions_key(relevant_namespaces),
+                username.lower() if username else None,
+                is_user_query,
+                chat_history
+            )
+            answer = self.answer_cache.get(answer_key)
+            if answer is not None:
+                logging.info("Answer served from cache")
+                tracer.count("chat.cached_answers")
+                yield answer
+                return
             
-            if not all_results:
-                return "I couldn't find any relevant information in the database. Please verify the data has been properly loaded."
+            # Aggregate questions are answered from exact columnar totals instead of raw documents
+            context = None
+            if username and AGGREGATE_PATTERN.search(question_lower):
+                with tracer.span("chat.analytics"):
+                    context = self.analytics.describe(relevant_namespaces, username.lower(), question)
             
-            # Format context from retrieved documents
-            context = "\n".join(f"Document from {doc.metadata.get('namespace', 'unknown')}: {doc.page_content}" 
-                              for doc in all_results)
+            if context is not None:
+                prompt_history = self.context_packer.compact_history(question, history)
+            else:
+                with tracer.span("chat.retrieve"):
+                    results, exact = self._retrieve(question, username, is_user_query, relevant_namespaces)
+                if not results:
+                    yield "I couldn't find any relevant information in the database. Please verify the data has been properly loaded."
+                    return
+                # Fit documents and history into the token budget
+                with tracer.span("chat.pack"):
+                    packed = self.context_packer.pack(question, results, history, exact=exact)
+                context, prompt_history = packed.context, packed.chat_history
+                tracer.count("chat.context_tokens", packed.tokens)
+                tracer.count("chat.context_tokens_saved", packed.tokens_saved)
+                tracer.count("chat.context_summarized", packed.documents_summarized)
             
             logging.info(f"Total context length: {len(context)}")
-            logging.info(f"Context preview: {context[:200]}")
+            logging.debug(f"Context preview: {context[:200]}")
             
-            response = self.chat_chain.invoke({
+            stats.prompt_ready = time.perf_counter() - started
+            parts = []
+            for chunk in self.chat_chain.stream({
                 "context": context,
                 "question": question,
-                "chat_history": "\n".join([f"Human: {q}\nAssistant: {a}" 
-                                         for q, a in self.chat_history])
-            })
+                "chat_history": prompt_history
+            }):
+                text = chunk.content if hasattr(chunk, 'content') else str(chunk)
+                if not text:
+                    continue
+                if not parts:
+                    stats.first_token = time.perf_counter() - started
+                parts.append(text)
+                stats.tokens += 1
+                yield text
             
-            return response.content if hasattr(response, 'content') else str(response)
+            stats.total = time.perf_counter() - started
+            self.last_stream_stats = stats
+            if stats.first_token is not None:
+                tracer.record("chat.first_token", stats.first_token)
+                tracer.record("chat.generate", stats.total - stats.prompt_ready)
+            tracer.record("chat.total", stats.total)
+            tracer.count("chat.tokens", stats.tokens)
+            if not parts:
+                # Nothing to show or cache; a retry should ask the model again
+                logging.warning(f"The model returned no tokens (prompt ready after {stats.prompt_ready:.3f}s, "
+                                f"{stats.total:.3f}s total)")
+                return
+            logging.info(
+                f"Streamed {stats.tokens} tokens: first token after {stats.first_token:.3f}s "
+                f"(prompt ready after {stats.prompt_ready:.3f}s), "
+                f"{stats.tokens_per_sec:.1f} tokens/sec, {stats.total:.3f}s total"
+            )
+            self.answer_cache.put(answer_key, "".join(parts))
             
         except Exception as e:
             logging.error(f"Error in chat: {str(e)}")
-            return "I encountered an error while processing your question. Please try again."
+            yield "I encountered an error while processing your question. Please try again."
+
+    def _retrieve(self, question: str, username, is_user_query: bool,
+                  relevant_namespaces: list[str]) -> tuple[list[tuple[Document, float]], bool]:
+        """Retrieve (document, score) pairs for a question: exact lexical matches, else hybrid search.
+        
+        Also returns whether the results are the complete set of exact matches.
+        """
+        logging.info(f"Searching in namespaces: {relevant_namespaces}")
+        
+        # Set filter conditions based on query type
+        if is_user_query:
+            filter_conditions = {"type": "user"}
+        else:
+            # Summaries are included so the context packer can use them in place of raw rows
+            filter_conditions = {
+                "type": {"$in": ["transaction", "transaction_summary"]},
+                "username": username.lower() if username else None
+            }
+        
+        logging.debug(f"Searching with filters: {filter_conditions}")
+        
+        multi_query = self.multi_query and self._needs_rewrites(question, username, is_user_query)
+        retrieval_key = (
+            _normalize_question(question),
+            self._namespace_versions_key(relevant_namespaces),
+            json.dumps(filter_conditions, sort_keys=True),
+            multi_query
+        )
+        cached = self.retrieval_cache.get(retrieval_key)
+        if cached is not None:
+            return cached
+        timings = {}
+        started = time.perf_counter()
+        results = None
+        narrow = {}
+        complete = False
+        if username and not is_user_query:
+            # Questions naming a known merchant or category, a period or amounts get every exact match
+            exact = self.lexical_index.parse(question, relevant_namespaces, username.lower())
+            if exact:
+                # A date or amount range alone says less about what is asked, so only
+                # a set that fits in one search is returned whole; larger ones are ranked
+                named = exact.get("merchants") or exact.get("categories")
+                limit = self.exact_match_limit if named else self.search_k
+                results = self.lexical_index.match(relevant_namespaces, username.lower(),
+                                                   limit=limit + 1, **exact)
+                timings["lexical"] = time.perf_counter() - started
+                if len(results) > limit:
+                    # Too many to use them all: restrict both searches to the exact filters
+                    narrow = exact
+                    typed = not set(relevant_namespaces) & self._outdated_namespaces()
+                    filter_conditions = {**filter_conditions, **_metadata_filter(exact, ranges=typed)}
+                    results = None
+                elif results:
+                    logging.info(f"Answering from {len(results)} exact matches for {exact}")
+                    complete = True
+                    tracer.count("retrieve.exact_answers")
+                else:
+                    results = None
+        
+        if results is None:
+            results = self._hybrid_search(question, username, is_user_query, relevant_namespaces,
+                                          filter_conditions, narrow, multi_query, timings)
+        
+        timings["total"] = time.perf_counter() - started
+        self.last_retrieval_timings = timings
+        for stage, seconds in timings.items():
+            tracer.record(f"retrieve.{stage}", seconds)
+        logging.debug("Retrieval timings: " + ", ".join(f"{stage} {seconds:.3f}s" for stage, seconds in timings.items()))
+        self.retrieval_cache.put(retrieval_key, (results, complete))
+        return results, complete
+
+    def _hybrid_search(self, question: str, username, is_user_query: bool, relevant_namespaces: list[str],
+                       filter_conditions: dict, narrow: dict, multi_query: bool,
+                       timings: dict) -> list[tuple[Document, float]]:
+        """Vector search (with optional multi-query rewrites) fused with BM25 over the lexical index"""
+        # The LLM writes the rewrites while the original question is being searched
+        rewrites = self.rewrite_executor.submit(self._rewrite_question, question) if multi_query else None
+        
+        # Embed the question once and search every namespace concurrently
+        stage = time.perf_counter()
+        query_embedding = self.embeddings.embed_query(question)
+        timings["embed"] = time.perf_counter() - stage
+        stage = time.perf_counter()
+        results = search_namespaces(
+            self.vector_store,
+            query_embedding,
+            relevant_namespaces,
+            k=self.search_k,
+            filter=filter_conditions,
+            executor=self.search_executor,
+            search_timeout=self.search_timeout,
+            deadline=self.search_deadline
+        )
+        timings["search"] = time.perf_counter() - stage
+        
+        if rewrites is not None:
+            results = self._multi_query_search(
+                question, results, rewrites, relevant_namespaces, filter_conditions, timings
+            )
+        
+        # Exact terms the embedding ranks poorly still surface through BM25
+        stage = time.perf_counter()
+        lexical = self.lexical_index.search(
+            question,
+            relevant_namespaces,
+            username=username.lower() if username else None,
+            types=["user"] if is_user_query else ["transaction", "transaction_summary"],
+            k=self.search_k,
+            **narrow
+        )
+        if lexical:
+            results = reciprocal_rank_fusion([results, lexical])
+        timings["bm25"] = time.perf_counter() - stage
+        return results
+
+    def _needs_rewrites(self, question: str, username, is_user_query: bool) -> bool:
+        """Whether multi-query rewriting can improve recall for a question"""
+        # User listings and a named user's summary are already routed exactly
+        if is_user_query:
+            return False
+        if username and 'summary' in question.lower():
+            return False
+        return True
+
+    def _rewrite_question(self, question: str) -> list[str]:
+        rewrites = self.llm_chain.invoke({"question": question})
+        seen = {_normalize_question(question)}
+        unique = []
+        for rewrite in rewrites:
+            rewrite = rewrite.strip()
+            if rewrite and _normalize_question(rewrite) not in seen:
+                seen.add(_normalize_question(rewrite))
+                unique.append(rewrite)
+        return unique[:self.max_rewrites]
+
+    def _multi_query_search(self, question: str, results: list, rewrites, relevant_namespaces: list[str],
+                            filter_conditions: dict, timings: dict) -> list[tuple[Document, float]]:
+        """Fuse the original ranking with rankings for the LLM's rewrites of the question"""
+        stage = time.perf_counter()
+        try:
+            variants = rewrites.result(timeout=self.rewrite_timeout)
+        except Exception as e:
+            # Fall back to the original question's results rather than delaying the answer
+            logging.error(f"Error rewriting question: {str(e)}")
+            rewrites.cancel()
+            variants = []
+        timings["rewrite_wait"] = time.perf_counter() - stage
+        if not variants:
+            return results
+        logging.info(f"Question rewrites: {variants}")
+        
+        # All rewrites are embedded in one batch and searched together
+        stage = time.perf_counter()
+        embeddings = self.embeddings.embed_documents(variants)
+        timings["rewrite_embed"] = time.perf_counter() - stage
+        stage = time.perf_counter()
+        rankings = search_queries(
+            self.vector_store,
+            embeddings,
+            relevant_namespaces,
+            k=self.search_k,
+            filter=filter_conditions,
+            executor=self.search_executor,
+            search_timeout=self.search_timeout,
+            deadline=self.search_deadline
+        )
+        timings["rewrite_search"] = time.perf_counter() - stage
+        stage = time.perf_counter()
+        fused = reciprocal_rank_fusion([results] + rankings)
+        timings["fuse"] = time.perf_counter() - stage
+        return fused
+
+    def _outdated_namespaces(self) -> set:
+        """Namespaces holding documents without the typed metadata fields range filters need"""
+        return {self.source_manager.sources[source_id].namespace for source_id in self.outdated_sources()}
+
+    def _namespace_versions_key(self, namespaces: list[str]) -> tuple:
+        return tuple((namespace, self.namespace_versions.get(namespace, 0)) for namespace in sorted(namespaces))
+
+    def _bump_namespace_version(self, namespace: str):
+        """Invalidate cached retrievals and answers that involve a namespace"""
+        self.namespace_versions[namespace] = self.namespace_versions.get(namespace, 0) + 1
+
+    def cache_stats(self) -> dict:
+        """Hit/miss counters of the retrieval and answer caches"""
+        return {
+            "retrieval": self.retrieval_cache.stats(),
+            "answers": self.answer_cache.stats()
+        }
 
     def logging(self):
         logging.basicConfig()
@@ -345,7 +1129,7 @@ class MQR(components):
 
     def _get_relevant_namespaces(self, question: str, username: str = None) -> list[str]:
         """Determine which namespaces are most relevant to the question"""
-        sources = self.source_manager.get_active_sources()
+        routing = self.source_manager.routing
         question_lower = question.lower()
         relevant_namespaces = []
         
@@ -355,29 +1139,33 @@ class MQR(components):
         
         if is_user_query:
             # For user queries, include the users namespace
-            for source in sources.values():
-                if source.data_type == 'users' or source.namespace == 'users':
-                    relevant_namespaces.append(source.namespace)
+            relevant_namespaces = routing.namespaces_for_data_type('users')
+            if 'users' in routing.namespace_sources and 'users' not in relevant_namespaces:
+                relevant_namespaces.append('users')
         elif username:
             # For user-specific transaction queries
-            for source in sources.values():
-                if source.username and source.username.lower() == username.lower():
-                    relevant_namespaces.append(source.namespace)
+            relevant_namespaces = routing.namespaces_for_user(username)
         
         logging.info(f"Selected namespaces for query: {relevant_namespaces}")
         return relevant_namespaces
 
 def main():
     mqr = MQR()
+    jobs = JobQueue(mqr)  # Sources are added, refreshed and removed in the background
+    jobs.start()
+    for source_id in mqr.outdated_sources():
+        jobs.submit("migrate", source_id)
     mode = "command"  # Start in command mode
     
     print("\nWelcome! Type 'help' for available commands.")
     
     while True:
         if mode == "command":
-            command = input("\nEnter command (chat/add/remove/list/help/exit): ").strip().lower()
+            command = input("\nEnter command (chat/add/refresh/remove/list/jobs/cancel/schedule/export/import/multiquery/stats/help/exit): ").strip().lower()
             
             if command == 'exit':
+                jobs.stop(timeout=30)
+                tracer.export()
                 print("Goodbye!")
                 break
                 
@@ -385,8 +1173,16 @@ def main():
                 print("\nAvailable commands:")
                 print("- chat: Switch to chat mode")
                 print("- add: Add a new API source")
+                print("- refresh: Sync an API source, updating only changed documents")
                 print("- remove: Remove an API source")
                 print("- list: List active sources")
+                print("- jobs: Show recent background jobs and their progress")
+                print("- cancel: Cancel a background job")
+                print("- schedule: Refresh a source periodically")
+                print("- export: Write a namespace's vectors, documents and sources to a snapshot file")
+                print("- import: Restore a snapshot without re-fetching or re-embedding")
+                print("- multiquery: Toggle searching LLM rewrites of each question")
+                print("- stats: Show per-stage latencies and counters")
                 print("- help: Show this help message")
                 print("- exit: Exit the program")
                 
@@ -404,6 +1200,7 @@ def main():
                 data_type = input("Enter data type (or press enter for general): ").strip() or "general"
                 username = input("Enter username (optional): ").strip() or None
                 user_id = input("Enter user ID (optional): ").strip() or None
+                pagination = input("Enter pagination type (page/offset/cursor, press enter for none): ").strip() or None
                 
                 if not endpoint:
                     print("Error: API endpoint cannot be empty")
@@ -417,18 +1214,88 @@ def main():
                     "data_key": data_key,
                     "data_type": data_type,
                     "username": username,
-                    "user_id": user_id
+                    "user_id": user_id,
+                    "pagination": {"type": pagination} if pagination else None
                 }
                 
-                if mqr.add_api_source(source_id, config):
-                    print(f"Source {source_id} added successfully!")
-                else:
-                    print(f"Failed to add source {source_id}")
+                job_id = jobs.submit("add", source_id, config)
+                print(f"Adding source {source_id} in the background (job {job_id}). Use 'jobs' to follow progress.")
+                    
+            elif command == 'refresh':
+                source_id = input("Enter source ID to refresh: ").strip()
+                job_id = jobs.submit("refresh", source_id)
+                print(f"Refreshing source {source_id} in the background (job {job_id})")
                     
             elif command == 'remove':
                 source_id = input("Enter source ID to remove: ").strip()
-                mqr.remove_api_source(source_id)
-                print(f"Source {source_id} removed")
+                job_id = jobs.submit("remove", source_id, priority=1)
+                print(f"Removing source {source_id} in the background (job {job_id})")
+                
+            elif command == 'jobs':
+                recent = jobs.list_jobs()
+                print("\nRecent jobs:")
+                if not recent:
+                    print("No jobs")
+                for job in recent:
+                    progress = job['progress']
+                    print(f"- {job['id']}: {job['kind']} {job['source_id']} [{job['status']}] "
+                          f"fetched {progress.get('fetched', 0)}, embedded {progress.get('embedded', 0)}, "
+                          f"upserted {progress.get('upserted', 0)}"
+                          + (f" - {job['error']}" if job['error'] else ""))
+                for source_id, schedule in jobs.schedules().items():
+                    print(f"- {source_id} refreshes every {schedule['interval'] / 60:g} minutes")
+                
+            elif command == 'cancel':
+                job_id = input("Enter job ID to cancel: ").strip()
+                if jobs.cancel(job_id):
+                    print(f"Job {job_id} cancelled")
+                else:
+                    print(f"Job {job_id} is not queued or running")
+                
+            elif command == 'schedule':
+                source_id = input("Enter source ID to refresh periodically: ").strip()
+                minutes = input("Refresh every how many minutes (0 to stop)? ").strip()
+                try:
+                    minutes = float(minutes)
+                except ValueError:
+                    print("Error: enter a number of minutes")
+                    continue
+                if minutes > 0:
+                    jobs.schedule_refresh(source_id, minutes * 60)
+                    print(f"Source {source_id} will be refreshed every {minutes:g} minutes")
+                else:
+                    jobs.unschedule(source_id)
+                    print(f"Scheduled refreshes of {source_id} stopped")
+                
+            elif command == 'export':
+                namespace = input("Enter namespace to export: ").strip()
+                path = input("Enter snapshot path (press enter for <namespace>.fsnap): ").strip() or f"{namespace}.fsnap"
+                half = input("Store vectors as float16 to halve the size? (y/N): ").strip().lower() == 'y'
+                if mqr.export_namespace(namespace, path, dtype="float16" if half else "float32"):
+                    print(f"Namespace {namespace} exported to {path}")
+                else:
+                    print(f"Error exporting namespace {namespace}")
+                
+            elif command == 'import':
+                path = input("Enter snapshot path: ").strip()
+                namespace = input("Enter namespace to restore into (press enter for the snapshot's own): ").strip() or None
+                if mqr.import_namespace(path, namespace):
+                    print(f"Snapshot {path} imported")
+                else:
+                    print(f"Error importing snapshot {path}")
+                
+            elif command == 'multiquery':
+                mqr.multi_query = not mqr.multi_query
+                print(f"Multi-query retrieval {'enabled' if mqr.multi_query else 'disabled'}")
+                
+            elif command == 'stats':
+                print("\n" + tracer.format_stats())
+                for name, cache_stats in mqr.cache_stats().items():
+                    print(f"{name} cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses, "
+                          f"{cache_stats['entries']} entries")
+                if tracer.trace_path:
+                    tracer.export()
+                    print(f"Trace written to {tracer.trace_path}")
                 
             elif command == 'list':
                 sources = mqr.source_manager.get_active_sources()
@@ -445,7 +1312,10 @@ def main():
                 mode = "command"
                 continue
             
-            print("\nAnswer:", mqr.chat(question))
+            print("\nAnswer: ", end="", flush=True)
+            for token in mqr.chat_stream(question):
+                print(token, end="", flush=True)
+            print()
 
 if __name__ == "__main__":
     main()
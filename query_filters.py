@@ -0,0 +1,297 @@
+import calendar
+import re
+from dataclasses import dataclass
+from datetime import date, timedelta
+from typing import Optional, Tuple
+
+import numpy as np
+
+_EPOCH = date(1970, 1, 1).toordinal()
+NO_DATE = np.iinfo(np.int32).min
+
+_MONTHS = {name.lower(): number for number, name in enumerate(calendar.month_name) if name}
+_MONTHS.update({name.lower(): number for number, name in enumerate(calendar.month_abbr) if name})
+_MONTH_NAMES = "|".join(sorted(_MONTHS, key=len, reverse=True))
+_MONTH_PATTERN = re.compile(r"\b(" + _MONTH_NAMES + r")\b(?:\s+(\d{4}))?")
+_YEAR_PATTERN = re.compile(r"\b(?:in|during|for)\s+(\d{4})\b")
+
+_ORDINALS = {"first": 1, "1st": 1, "second": 2, "2nd": 2, "third": 3, "3rd": 3, "fourth": 4, "4th": 4}
+_QUARTER_PATTERN = re.compile(
+    r"\b(?:q([1-4])|(" + "|".join(_ORDINALS) + r")\s+quarter)(?:\s+(?:of\s+)?(\d{4}))?\b"
+)
+_ISO_DATE = r"(\d{4}-\d{2}-\d{2})"
+_ISO_RANGE_PATTERN = re.compile(r"\b(?:between|from)\s+" + _ISO_DATE + r"\s+(?:and|to|until)\s+" + _ISO_DATE)
+_YEAR_RANGE_PATTERN = re.compile(r"\b(?:between|from)\s+((?:19|20)\d\d)\s+(?:and|to|until)\s+((?:19|20)\d\d)\b")
+_ISO_BOUND_PATTERN = re.compile(r"\b(since|after|from|before|until|on)\s+" + _ISO_DATE)
+_RELATIVE_MONTH_PATTERN = re.compile(r"\b(last|this)\s+(" + _MONTH_NAMES + r")\b")
+_RELATIVE_PATTERN = re.compile(r"\b(today|yesterday|(?:last|this|previous|current)\s+(week|month|quarter|year))\b")
+_TRAILING_PATTERN = re.compile(r"\b(?:last|past|previous)\s+(\d+)\s+(day|week|month|year)s?\b")
+
+# A number is an amount when it has a currency marker, or at least is not a year or a count of something else.
+# A "k" or "m" suffix ("$2k", "1.5m") multiplies it; any other letter right after a bare number rejects it.
+_NUMBER = r"(\d[\d,]*(?:\.\d+)?(?:[km](?![a-z]))?)"
+_AMOUNT = (r"(?:\$\s*" + _NUMBER + r"|" + _NUMBER + r"(?:\s*(?:dollars|usd|bucks)\b|"
+           r"(?!\d|[\d,.]*(?:[a-z]|\s*(?:%|(?:percent|days?|weeks?|months?|years?|times|transactions?|purchases?|items?)\b)))))")
+_SUFFIXES = {"k": 1_000, "m": 1_000_000}
+_BETWEEN_PATTERN = re.compile(r"\bbetween\s+" + _AMOUNT + r"\s+and\s+" + _AMOUNT)
+_MIN_AMOUNT_PATTERN = re.compile(r"(?:\b(?:over|above|more than|greater than|at least|exceeding|larger than)|>=?)\s*" + _AMOUNT)
+_MAX_AMOUNT_PATTERN = re.compile(r"(?:\b(?:under|below|less than|at most|up to|smaller than|cheaper than)|<=?)\s*" + _AMOUNT)
+
+
+def to_day(value: str) -> int:
+    """Days since 1970-01-01 for a YYYY-MM-DD date, or NO_DATE"""
+    try:
+        return date.fromisoformat(value[:10]).toordinal() - _EPOCH
+    except (TypeError, ValueError):
+        return NO_DATE
+
+
+def from_day(day: int) -> str:
+    return date.fromordinal(int(day) + _EPOCH).isoformat()
+
+
+def _day(value: date) -> int:
+    return value.toordinal() - _EPOCH
+
+
+def find_month(question_lower: str) -> Optional[re.Match]:
+    """First month mention in a question, with an optional year in group 2"""
+    for match in _MONTH_PATTERN.finditer(question_lower):
+        # "may" is only a month when it follows a preposition or precedes a year
+        if match.group(1) == 'may' and not match.group(2) and not re.search(
+                r"\b(in|during|for|of|since|until)\s+$", question_lower[:match.start()]):
+            continue
+        return match
+    return None
+
+
+def mentions(question_lower: str, value: str, plural: bool = False) -> bool:
+    """Whether a question names a merchant or category as whole words.
+
+    "food" is named in "food costs" but not in "seafood". With ``plural`` a
+    trailing "s" is accepted too, e.g. "restaurants" for "restaurant".
+    """
+    name = re.escape(value.replace('_', ' ').lower())
+    return re.search(rf"(?<!\w){name}{'s?' if plural else ''}(?!\w)", question_lower) is not None
+
+
+def find_period(question_lower: str) -> Tuple[dict, str]:
+    """Date filters (start_day/end_day or month_of_year) for the period a question names, and its label"""
+    month = find_month(question_lower)
+    year = _YEAR_PATTERN.search(question_lower)
+    if month and month.group(2):
+        number, year_value = _MONTHS[month.group(1)], int(month.group(2))
+        last = calendar.monthrange(year_value, number)[1]
+        return {
+            "start_day": to_day(f"{year_value}-{number:02d}-01"),
+            "end_day": to_day(f"{year_value}-{number:02d}-{last:02d}"),
+        }, f"{calendar.month_name[number]} {year_value}"
+    if month:
+        number = _MONTHS[month.group(1)]
+        return {"month_of_year": number}, f"{calendar.month_name[number]} (any year)"
+    if year:
+        return {
+            "start_day": to_day(f"{year.group(1)}-01-01"),
+            "end_day": to_day(f"{year.group(1)}-12-31"),
+        }, year.group(1)
+    return {}, "all dates"
+
+
+@dataclass
+class QueryFilters:
+    """Date range and amount bounds a question asks about.
+
+    Days count from 1970-01-01 like the ``date_days`` metadata field, and
+    amounts bound the absolute transaction amount, so "over $100" matches
+    debits and credits alike.
+    """
+    start_day: Optional[int] = None
+    end_day: Optional[int] = None
+    month_of_year: Optional[int] = None  # A month named without a year, e.g. "in March"
+    min_amount: Optional[float] = None
+    max_amount: Optional[float] = None
+    period: str = "all dates"
+
+    def __bool__(self) -> bool:
+        return bool(self.bounds())
+
+    def bounds(self) -> dict:
+        """The set bounds as keyword filters for the lexical index and analytics"""
+        return {
+            name: value for name, value in (
+                ("start_day", self.start_day), ("end_day", self.end_day), ("month_of_year", self.month_of_year),
+                ("min_amount", self.min_amount), ("max_amount", self.max_amount)
+            ) if value is not None
+        }
+
+    def vector_filter(self) -> dict:
+        """Pinecone-style clauses on the numeric ``date_days``, ``month`` and ``abs_amount`` metadata"""
+        conditions = {}
+        for field, low, high in (("date_days", self.start_day, self.end_day),
+                                 ("abs_amount", self.min_amount, self.max_amount)):
+            clause = {op: value for op, value in (("$gte", low), ("$lte", high)) if value is not None}
+            if clause:
+                conditions[field] = clause
+        if self.month_of_year is not None:
+            conditions["month"] = {"$eq": self.month_of_year}
+        return conditions
+
+    def describe_amount(self) -> Optional[str]:
+        if self.min_amount is not None and self.max_amount is not None:
+            return f"{_dollars(self.min_amount)} to {_dollars(self.max_amount)}"
+        if self.min_amount is not None:
+            return f"at least {_dollars(self.min_amount)}"
+        if self.max_amount is not None:
+            return f"at most {_dollars(self.max_amount)}"
+        return None
+
+
+def _dollars(value: float) -> str:
+    """A dollar amount such as $1,500 or $12.5, without the exponent ``:g`` gives millions"""
+    return "$" + f"{value:,.2f}".rstrip("0").rstrip(".")
+
+
+def _month_range(year: int, month: int) -> Tuple[date, date]:
+    return date(year, month, 1), date(year, month, calendar.monthrange(year, month)[1])
+
+
+def _quarter_range(year: int, quarter: int) -> Tuple[date, date]:
+    return date(year, 3 * quarter - 2, 1), _month_range(year, 3 * quarter)[1]
+
+
+def _shift_months(value: date, months: int) -> date:
+    month = value.year * 12 + value.month - 1 + months
+    year, month = divmod(month, 12)
+    return date(year, month + 1, min(value.day, calendar.monthrange(year, month + 1)[1]))
+
+
+def _range_label(start: date, end: date) -> str:
+    return f"{start.isoformat()} to {end.isoformat()}"
+
+
+def _relative_period(question_lower: str, today: date) -> Optional[Tuple[date, date, str]]:
+    """Start, end and label of a period named relative to today, or of a quarter, year range or ISO date range"""
+    match = _ISO_RANGE_PATTERN.search(question_lower)
+    if match:
+        start, end = sorted(date.fromisoformat(value) for value in match.groups())
+        return start, end, _range_label(start, end)
+
+    match = _YEAR_RANGE_PATTERN.search(question_lower)
+    if match:
+        first, last = sorted(int(value) for value in match.groups())
+        return date(first, 1, 1), date(last, 12, 31), f"{first} to {last}"
+
+    match = _QUARTER_PATTERN.search(question_lower)
+    if match:
+        quarter = int(match.group(1)) if match.group(1) else _ORDINALS[match.group(2)]
+        current = (today.month - 1) // 3 + 1
+        # Without a year, the most recent such quarter
+        year = int(match.group(3)) if match.group(3) else today.year - (quarter > current)
+        start, end = _quarter_range(year, quarter)
+        return start, end, f"Q{quarter} {year}"
+
+    match = _RELATIVE_MONTH_PATTERN.search(question_lower)
+    if match:
+        month = _MONTHS[match.group(2)]
+        # "last March" is the most recent March before the current month
+        year = today.year if match.group(1) == "this" or month < today.month else today.year - 1
+        start, end = _month_range(year, month)
+        return start, end, f"{calendar.month_name[month]} {year}"
+
+    match = _TRAILING_PATTERN.search(question_lower)
+    if match:
+        count, unit = int(match.group(1)), match.group(2)
+        if unit in ("day", "week"):
+            start = today - timedelta(days=count * (7 if unit == "week" else 1))
+        else:
+            start = _shift_months(today, -count * (12 if unit == "year" else 1))
+        return start, today, f"last {count} {unit}{'s' if count != 1 else ''} ({_range_label(start, today)})"
+
+    match = _RELATIVE_PATTERN.search(question_lower)
+    if match:
+        phrase, unit = match.group(1), match.group(2)
+        previous = phrase.startswith(("last", "previous"))
+        if phrase == "today":
+            return today, today, "today"
+        if phrase == "yesterday":
+            yesterday = today - timedelta(days=1)
+            return yesterday, yesterday, "yesterday"
+        if unit == "week":
+            start = today - timedelta(days=today.weekday() + (7 if previous else 0))
+            end = start + timedelta(days=6)
+        elif unit == "month":
+            first = _shift_months(today.replace(day=1), -1 if previous else 0)
+            start, end = _month_range(first.year, first.month)
+        elif unit == "quarter":
+            quarter = (today.month - 1) // 3 + (0 if previous else 1)
+            year = today.year - (quarter == 0)
+            start, end = _quarter_range(year, quarter or 4)
+        else:
+            year = today.year - previous
+            start, end = date(year, 1, 1), date(year, 12, 31)
+        if not previous:
+            end = min(end, today)
+        return start, end, f"{phrase} ({_range_label(start, end)})"
+
+    match = _ISO_BOUND_PATTERN.search(question_lower)
+    if match:
+        word, value = match.group(1), date.fromisoformat(match.group(2))
+        if word == "on":
+            return value, value, value.isoformat()
+        if word in ("since", "after", "from"):
+            return value + timedelta(days=word == "after"), today, f"since {value.isoformat()}"
+        return date.min, value - timedelta(days=word == "before"), f"until {value.isoformat()}"
+    return None
+
+
+def _amount(match: re.Match, first_group: int) -> float:
+    value = (match.group(first_group) or match.group(first_group + 1)).replace(",", "")
+    if value[-1] in _SUFFIXES:
+        return float(value[:-1]) * _SUFFIXES[value[-1]]
+    return float(value)
+
+
+def _is_year(match: re.Match, first_group: int) -> bool:
+    """Bare four digit numbers such as "after 2023" are years, not amounts"""
+    return match.group(first_group) is None and re.fullmatch(r"(19|20)\d\d", match.group(first_group + 1)) is not None
+
+
+def extract_filters(question: str, today: Optional[date] = None) -> QueryFilters:
+    """Date range and amount thresholds named in a question.
+
+    Understands ISO date ranges, year ranges ("between 2020 and 2023"),
+    quarters ("Q2 2024", "second quarter"), periods relative to today
+    ("last month", "past 30 days", "last March") and the absolute periods
+    of ``find_period``, plus amounts such as "over $100", "under 20
+    dollars", "over $2k" and "between $50 and $200".
+    """
+    question_lower = question.lower()
+    today = today or date.today()
+    filters = QueryFilters()
+
+    try:
+        period = _relative_period(question_lower, today)
+    except ValueError:  # An impossible date such as 2024-02-31
+        period = None
+    if period:
+        start, end, filters.period = period
+        if start != date.min:
+            filters.start_day = _day(start)
+        filters.end_day = _day(end)
+    else:
+        bounds, filters.period = find_period(question_lower)
+        filters.start_day = bounds.get("start_day")
+        filters.end_day = bounds.get("end_day")
+        filters.month_of_year = bounds.get("month_of_year")
+
+    between = _BETWEEN_PATTERN.search(question_lower)
+    if between and not (_is_year(between, 1) or _is_year(between, 3)):
+        low, high = sorted((_amount(between, 1), _amount(between, 3)))
+        filters.min_amount, filters.max_amount = low, high
+    else:
+        for pattern, name in ((_MIN_AMOUNT_PATTERN, "min_amount"), (_MAX_AMOUNT_PATTERN, "max_amount")):
+            for match in pattern.finditer(question_lower):
+                if not _is_year(match, 1):
+                    setattr(filters, name, _amount(match, 1))
+                    break
+    return filters
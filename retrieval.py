@@ -0,0 +1,89 @@
+import logging
+import time
+from concurrent.futures import FIRST_COMPLETED, Executor, wait
+from typing import List, Optional, Tuple
+
+from langchain_core.documents import Document
+
+
+def document_key(doc: Document):
+    """Identity used to deduplicate results across namespaces and queries"""
+    return doc.id or (doc.metadata.get('namespace'), doc.page_content)
+
+
+def search_namespaces(vector_store, embedding: List[float], namespaces: List[str], k: int,
+                      filter: Optional[dict], executor: Executor, search_timeout: float = 10.0,
+                      deadline: float = 20.0) -> List[Tuple[Document, float]]:
+    """Run one vector search per namespace concurrently with a precomputed query embedding.
+
+    A search is abandoned once it has been running for ``search_timeout``
+    seconds, and nothing is waited for past ``deadline`` seconds overall.
+    Results are deduplicated by document id, keeping the best score, and
+    returned best first.
+    """
+    return search_queries(vector_store, [embedding], namespaces, k, filter, executor,
+                          search_timeout=search_timeout, deadline=deadline)[0]
+
+
+def search_queries(vector_store, embeddings: List[List[float]], namespaces: List[str], k: int,
+                   filter: Optional[dict], executor: Executor, search_timeout: float = 10.0,
+                   deadline: float = 20.0) -> List[List[Tuple[Document, float]]]:
+    """Search every namespace with every query embedding, all concurrently.
+
+    Returns one ranking per embedding, built as in ``search_namespaces``.
+    """
+    started = {}
+
+    def search(task):
+        started[task] = time.monotonic()
+        embedding, namespace = embeddings[task[0]], task[1]
+        return vector_store.similarity_search_by_vector_with_score(
+            embedding, k=k, filter=filter, namespace=namespace
+        )
+
+    start = time.monotonic()
+    tasks = [(query, namespace) for query in range(len(embeddings)) for namespace in namespaces]
+    pending = {executor.submit(search, task): task for task in tasks}
+    best = [{} for _ in embeddings]
+    while pending:
+        now = time.monotonic()
+        for future, task in list(pending.items()):
+            if not future.done() and task in started and now - started[task] >= search_timeout:
+                logging.warning(f"Search in namespace {task[1]} timed out after {search_timeout}s")
+                del pending[future]
+        if not pending or now >= start + deadline:
+            break
+
+        expiries = [started[task] + search_timeout for task in pending.values() if task in started]
+        wake_at = min(expiries + [start + deadline])
+        done, _ = wait(pending, timeout=wake_at - now, return_when=FIRST_COMPLETED)
+        for future in done:
+            query, namespace = pending.pop(future)
+            try:
+                results = future.result()
+            except Exception as e:
+                logging.error(f"Error searching namespace {namespace}: {str(e)}")
+                continue
+            logging.debug(f"Found {len(results)} documents in {namespace}")
+            for doc, score in results:
+                key = document_key(doc)
+                if key not in best[query] or score > best[query][key][1]:
+                    best[query][key] = (doc, score)
+
+    for future, task in pending.items():
+        future.cancel()
+        logging.warning(f"Search in namespace {task[1]} missed the {deadline}s deadline")
+
+    return [sorted(found.values(), key=lambda result: result[1], reverse=True) for found in best]
+
+
+def reciprocal_rank_fusion(rankings: List[List[Tuple[Document, float]]],
+                           k: int = 60) -> List[Tuple[Document, float]]:
+    """Fuse several rankings into one, scoring each document by sum(1 / (k + rank))"""
+    fused = {}
+    for ranking in rankings:
+        for rank, (doc, _) in enumerate(ranking, 1):
+            key = document_key(doc)
+            previous = fused.get(key, (doc, 0.0))
+            fused[key] = (previous[0], previous[1] + 1.0 / (k + rank))
+    return sorted(fused.values(), key=lambda result: result[1], reverse=True)
@@ -0,0 +1,116 @@
+import string
+from collections import deque
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+_PUNCTUATION = str.maketrans(string.punctuation, ' ' * len(string.punctuation))
+
+# Words that never identify a user, even if someone picked them as a username
+STOPWORDS = frozenset([
+    'transactions', 'for', 'any', 'the', 'what', 'are', 'there', 'summary',
+    'categories', 'can', 'you', 'see', 'of', 'in', 'by', 'from'
+])
+
+
+def normalize(text: str) -> str:
+    """Lowercase text with punctuation turned into single spaces"""
+    return " ".join(text.lower().translate(_PUNCTUATION).split())
+
+
+class _Automaton:
+    """Aho-Corasick automaton reporting every pattern occurrence in one pass"""
+
+    def __init__(self, patterns: Dict[str, str]):
+        self.goto: List[Dict[str, int]] = [{}]
+        self.fail: List[int] = [0]
+        self.out: List[List[Tuple[int, str]]] = [[]]
+        for pattern, value in patterns.items():
+            node = 0
+            for char in pattern:
+                child = self.goto[node].get(char)
+                if child is None:
+                    child = self.goto[node][char] = len(self.goto)
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.out.append([])
+                node = child
+            self.out[node].append((len(pattern), value))
+
+        queue = deque(self.goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self.goto[node].items():
+                queue.append(child)
+                state = self.fail[node]
+                while state and char not in self.goto[state]:
+                    state = self.fail[state]
+                self.fail[child] = self.goto[state].get(char, 0)
+                self.out[child] = self.out[child] + self.out[self.fail[child]]
+
+    def search(self, text: str) -> Iterator[Tuple[int, int, str]]:
+        node = 0
+        for end, char in enumerate(text, 1):
+            while node and char not in self.goto[node]:
+                node = self.fail[node]
+            node = self.goto[node].get(char, 0)
+            for length, value in self.out[node]:
+                yield end - length, end, value
+
+
+class RoutingIndex:
+    """Routing tables for chat questions, rebuilt whenever the active sources change.
+
+    Maps lowercase usernames and aliases to the namespaces of their sources and
+    data types to namespaces. Names, including multi-word names, are found in
+    a question with a single automaton pass, so routing cost does not depend
+    on the number of sources.
+    """
+
+    def __init__(self):
+        self.user_namespaces: Dict[str, List[str]] = {}
+        self.data_type_namespaces: Dict[str, List[str]] = {}
+        self.namespace_sources: Dict[str, List[str]] = {}
+        self._names: Dict[str, str] = {}  # Normalized name or alias -> username
+        self._automaton: Optional[_Automaton] = None
+
+    def rebuild(self, sources: Iterable[Tuple[str, object]]):
+        """Rebuild the tables from (source_id, APISourceConfig) pairs of active sources"""
+        user_namespaces, data_type_namespaces, namespace_sources, names = {}, {}, {}, {}
+        for source_id, source in sources:
+            data_type_namespaces.setdefault(source.data_type, [])
+            if source.namespace not in data_type_namespaces[source.data_type]:
+                data_type_namespaces[source.data_type].append(source.namespace)
+            namespace_sources.setdefault(source.namespace, []).append(source_id)
+            if source.username:
+                username = source.username.lower()
+                namespaces = user_namespaces.setdefault(username, [])
+                if source.namespace not in namespaces:
+                    namespaces.append(source.namespace)
+                for name in [source.username, *(source.aliases or [])]:
+                    name = normalize(name)
+                    if name and name not in STOPWORDS:
+                        names.setdefault(name, source.username)
+        self.user_namespaces = user_namespaces
+        self.data_type_namespaces = data_type_namespaces
+        self.namespace_sources = namespace_sources
+        self._names = names
+        self._automaton = None
+
+    def find_username(self, question: str) -> Optional[str]:
+        """Username of the first (longest) name or alias mentioned in the question"""
+        if self._automaton is None:
+            self._automaton = _Automaton(self._names)
+        text = normalize(question)
+        best = None
+        for start, end, username in self._automaton.search(text):
+            # Only whole words count as a mention
+            if (start > 0 and text[start - 1] != ' ') or (end < len(text) and text[end] != ' '):
+                continue
+            if best is None or start < best[0] or (start == best[0] and end > best[1]):
+                best = (start, end, username)
+        return best[2] if best else None
+
+    def namespaces_for_user(self, username: str) -> List[str]:
+        return list(self.user_namespaces.get(username.lower(), []))
+
+    def namespaces_for_data_type(self, data_type: str) -> List[str]:
+        return list(self.data_type_namespaces.get(data_type, []))
@@ -0,0 +1,337 @@
+"""JSON HTTP server that lets many users share one MQR instance.
+
+    python server.py --port 8080 [--preload]
+
+Endpoints:
+    POST   /chat              {"question": ..., "session_id": ..., "stream": false}
+    GET    /sources           list active sources
+    POST   /sources           {"source_id": ..., "config": {...}}, queues an add job
+    POST   /sources/<id>/refresh
+    DELETE /sources/<id>      queues a remove job
+    GET    /jobs              recent jobs with progress
+    GET    /jobs/<id>         one job
+    DELETE /jobs/<id>         cancel a job
+    GET    /stats             per-stage latencies and counters
+
+With "stream": true the answer is sent as chunked text/plain while it is
+generated; the session id is returned in the X-Session-Id header.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Optional
+
+from cache import TTLCache
+from jobs import JobQueue
+from mqr import MQR
+from tracing import tracer
+
+_REASONS = {200: "OK", 202: "Accepted", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+            413: "Payload Too Large", 500: "Internal Server Error", 503: "Service Unavailable"}
+
+
+class Overloaded(Exception):
+    pass
+
+
+class Limiter:
+    """Bounded concurrency with a bounded wait queue.
+
+    At most ``limit`` callers hold a slot; up to ``max_waiting`` more may wait
+    for one, and anyone beyond that is rejected straight away so load is shed
+    instead of piling up.
+    """
+
+    def __init__(self, limit: int, max_waiting: int):
+        self._semaphore = asyncio.Semaphore(limit)
+        self.max_waiting = max_waiting
+        self.waiting = 0
+
+    async def __aenter__(self):
+        if self._semaphore.locked() and self.waiting >= self.max_waiting:
+            raise Overloaded()
+        self.waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        return self
+
+    async def __aexit__(self, *exc):
+        self._semaphore.release()
+
+
+class HTTPError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+class MQRServer:
+    """Serves chat and source management for many sessions from one MQR.
+
+    The embedding model, vector store and LLM clients are built once and
+    shared. Each session keeps its own chat history in an LRU+TTL store.
+    Chat requests (embedding plus LLM) run on worker threads behind a
+    ``Limiter``; adding, refreshing and removing sources are queued as
+    background jobs whose status clients poll.
+    """
+
+    def __init__(self, mqr: MQR, jobs: JobQueue, max_chats: int = 8, max_waiting: int = 64,
+                 max_sessions: int = 1000, session_ttl: float = 3600.0, max_turns: int = 20,
+                 max_body: int = 1024 * 1024, stream_buffer: int = 64):
+        self.mqr = mqr
+        self.jobs = jobs
+        self.chat_limiter = Limiter(max_chats, max_waiting)
+        self.executor = ThreadPoolExecutor(max_workers=max_chats + 2, thread_name_prefix="server")
+        self.sessions = TTLCache(max_entries=max_sessions, ttl=session_ttl, max_bytes=256 * 1024 * 1024,
+                                 sizeof=lambda turns: sum(len(q) + len(a) for q, a in turns) + 64)
+        self.max_turns = max_turns
+        self.max_body = max_body
+        self.stream_buffer = stream_buffer  # Tokens generated ahead of a streaming client
+
+    async def serve(self, host: str, port: int):
+        server = await asyncio.start_server(self._handle_connection, host, port)
+        logging.info(f"Serving on http://{host}:{port}")
+        async with server:
+            await server.serve_forever()
+
+    async def _run(self, function, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, function, *args)
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            keep_alive = True
+            while keep_alive:
+                request = await self._read_request(reader)
+                if request is None:
+                    break
+                method, path, headers, body = request
+                keep_alive = headers.get("connection", "").lower() != "close"
+                try:
+                    await self._dispatch(writer, method, path, headers, body)
+                except HTTPError as e:
+                    await self._send_json(writer, e.status, {"error": e.message})
+                except Overloaded:
+                    await self._send_json(writer, 503, {"error": "Server busy, retry shortly"},
+                                          {"Retry-After": "1"})
+                except Exception as e:
+                    logging.error(f"Error handling {method} {path}: {str(e)}")
+                    await self._send_json(writer, 500, {"error": "Internal server error"})
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except HTTPError as e:
+            await self._send_json(writer, e.status, {"error": e.message})
+        finally:
+            writer.close()
+
+    async def _read_request(self, reader: asyncio.StreamReader):
+        line = await reader.readline()
+        if not line:
+            return None
+        try:
+            method, path, _ = line.decode("latin-1").split(" ", 2)
+        except ValueError:
+            raise HTTPError(400, "Malformed request line")
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        length = int(headers.get("content-length", 0) or 0)
+        if length > self.max_body:
+            raise HTTPError(413, "Request body too large")
+        body = await reader.readexactly(length) if length else b""
+        return method.upper(), path.split("?", 1)[0], headers, body
+
+    async def _dispatch(self, writer, method: str, path: str, headers: dict, body: bytes):
+        parts = [part for part in path.split("/") if part]
+        if parts == ["chat"]:
+            self._require(method, "POST")
+            await self._chat(writer, self._json(body), headers)
+        elif parts == ["sources"]:
+            if method == "GET":
+                await self._send_json(writer, 200, await self._run(self._list_sources))
+            else:
+                self._require(method, "POST")
+                request = self._json(body)
+                source_id, config = request.get("source_id"), request.get("config")
+                if not source_id or not isinstance(config, dict):
+                    raise HTTPError(400, "source_id and config are required")
+                job_id = await self._run(self.jobs.submit, "add", source_id, config)
+                await self._send_json(writer, 202, {"source_id": source_id, "job_id": job_id})
+        elif len(parts) == 2 and parts[0] == "sources":
+            self._require(method, "DELETE")
+            job_id = await self._run(self.jobs.submit, "remove", parts[1], None, 1)
+            await self._send_json(writer, 202, {"source_id": parts[1], "job_id": job_id})
+        elif len(parts) == 3 and parts[0] == "sources" and parts[2] == "refresh":
+            self._require(method, "POST")
+            job_id = await self._run(self.jobs.submit, "refresh", parts[1])
+            await self._send_json(writer, 202, {"source_id": parts[1], "job_id": job_id})
+        elif parts == ["jobs"]:
+            self._require(method, "GET")
+            await self._send_json(writer, 200, await self._run(self.jobs.list_jobs, 100))
+        elif len(parts) == 2 and parts[0] == "jobs":
+            if method == "DELETE":
+                cancelled = await self._run(self.jobs.cancel, parts[1])
+                await self._send_json(writer, 200, {"job_id": parts[1], "cancelled": cancelled})
+            else:
+                self._require(method, "GET")
+                job = await self._run(self.jobs.status, parts[1])
+                if job is None:
+                    raise HTTPError(404, "Unknown job")
+                await self._send_json(writer, 200, job)
+        elif parts == ["stats"]:
+            self._require(method, "GET")
+            await self._send_json(writer, 200, {**tracer.stats(), "caches": self.mqr.cache_stats(),
+                                                "sessions": len(self.sessions)})
+        else:
+            raise HTTPError(404, "Not found")
+
+    @staticmethod
+    def _require(method: str, expected: str):
+        if method != expected:
+            raise HTTPError(405, f"Use {expected}")
+
+    @staticmethod
+    def _json(body: bytes) -> dict:
+        try:
+            data = json.loads(body or b"{}")
+        except json.JSONDecodeError:
+            raise HTTPError(400, "Body must be JSON")
+        if not isinstance(data, dict):
+            raise HTTPError(400, "Body must be a JSON object")
+        return data
+
+    def _list_sources(self) -> dict:
+        return {
+            source_id: {
+                "description": source.description,
+                "endpoint": str(source.endpoint),
+                "namespace": source.namespace,
+                "data_type": source.data_type,
+                "username": source.username,
+            }
+            for source_id, source in self.mqr.source_manager.get_active_sources().items()
+        }
+
+    async def _chat(self, writer, request: dict, headers: dict):
+        question = (request.get("question") or "").strip()
+        if not question:
+            raise HTTPError(400, "question is required")
+        session_id = request.get("session_id") or headers.get("x-session-id") or uuid.uuid4().hex
+        history = list(self.sessions.get(session_id) or [])
+
+        async with self.chat_limiter:
+            if request.get("stream"):
+                await self._start_chunked(writer, {"X-Session-Id": session_id})
+                parts = []
+                async for token in self._stream_answer(question, history):
+                    parts.append(token)
+                    await self._send_chunk(writer, token.encode("utf-8"))
+                self._remember(session_id, history, question, "".join(parts))
+                await self._send_chunk(writer, b"")
+            else:
+                answer = await self._run(self.mqr.chat, question, history)
+                self._remember(session_id, history, question, answer)
+                await self._send_json(writer, 200, {"session_id": session_id, "answer": answer},
+                                      {"X-Session-Id": session_id})
+
+    def _remember(self, session_id: str, history: list, question: str, answer: str):
+        self.sessions.put(session_id, (history + [(question, answer)])[-self.max_turns:])
+
+    async def _stream_answer(self, question: str, history: list) -> AsyncIterator[str]:
+        """Run chat_stream on a worker thread and hand its tokens to the event loop.
+
+        The queue is bounded, so a slow client blocks the worker thread once
+        ``stream_buffer`` tokens are waiting instead of buffering the answer.
+        """
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.stream_buffer)
+        stopped = threading.Event()
+
+        def produce():
+            stream = self.mqr.chat_stream(question, history)
+            try:
+                for token in stream:
+                    if stopped.is_set():
+                        break
+                    asyncio.run_coroutine_threadsafe(queue.put(token), loop).result()
+            finally:
+                stream.close()
+                asyncio.run_coroutine_threadsafe(queue.put(None), loop).result()
+
+        producer = loop.run_in_executor(self.executor, produce)
+        try:
+            while (token := await queue.get()) is not None:
+                yield token
+        finally:
+            # Stop generating if the client went away mid-answer, draining
+            # the queue so a producer blocked on a full queue can finish
+            stopped.set()
+            while not producer.done():
+                getter = asyncio.ensure_future(queue.get())
+                await asyncio.wait({producer, getter}, return_when=asyncio.FIRST_COMPLETED)
+                getter.cancel()
+            await producer
+
+    @staticmethod
+    def _head(status: int, headers: dict) -> bytes:
+        lines = [f"HTTP/1.1 {status} {_REASONS.get(status, '')}"]
+        lines += [f"{name}: {value}" for name, value in headers.items()]
+        return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+
+    async def _send_json(self, writer, status: int, payload, headers: Optional[dict] = None):
+        body = json.dumps(payload).encode("utf-8")
+        writer.write(self._head(status, {
+            "Content-Type": "application/json", "Content-Length": len(body), **(headers or {})
+        }) + body)
+        await writer.drain()
+
+    async def _start_chunked(self, writer, headers: dict):
+        writer.write(self._head(200, {
+            "Content-Type": "text/plain; charset=utf-8", "Transfer-Encoding": "chunked", **headers
+        }))
+        await writer.drain()
+
+    @staticmethod
+    async def _send_chunk(writer, data: bytes):
+        writer.write(f"{len(data):x}\r\n".encode("latin-1") + data + b"\r\n")
+        # Waiting for the socket buffer to drain applies backpressure from slow clients
+        await writer.drain()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--max-chats", type=int, default=8, help="chat requests processed at once")
+    parser.add_argument("--max-ingests", type=int, default=2, help="background jobs processed at once")
+    parser.add_argument("--max-waiting", type=int, default=64, help="requests queued before returning 503")
+    parser.add_argument("--preload", action="store_true", help="build the embedding model and LLM client at startup")
+    args = parser.parse_args()
+
+    mqr = MQR()
+    if args.preload:
+        mqr.embeddings, mqr.llm, mqr.vector_store
+    jobs = JobQueue(mqr, workers=args.max_ingests)
+    jobs.start()
+    for source_id in mqr.outdated_sources():
+        jobs.submit("migrate", source_id)  # Stored metadata predating the typed date/amount fields
+    server = MQRServer(mqr, jobs, max_chats=args.max_chats, max_waiting=args.max_waiting)
+    try:
+        asyncio.run(server.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        jobs.stop(timeout=30)
+        tracer.export()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+import json
+import logging
+import os
+import struct
+import zlib
+from typing import Iterator, List, Optional, Tuple
+
+import numpy as np
+
+MAGIC = b"FSNAP001"
+_TRAILER = struct.Struct("<Q8s")  # Footer length, magic
+_ALIGN = 64  # Vector blocks start on cache line boundaries
+DTYPES = ("float32", "float16")
+
+
+class SnapshotError(Exception):
+    """A snapshot file is malformed or fails its checksums"""
+
+
+class SnapshotWriter:
+    """Writes a namespace snapshot: chunks of vectors and records, then a JSON footer.
+
+    Each chunk is a raw little-endian matrix of ``rows x dim`` vectors, aligned
+    so it can be memory-mapped in place, followed by its records (id, text,
+    metadata and content hash) as a zlib-compressed JSON array. The footer lists
+    every chunk's offsets and CRC32 checksums along with the caller's header,
+    and ends with its length and the magic bytes so readers can find it.
+    """
+
+    def __init__(self, path: str, dim: int, dtype: str = "float32", header: Optional[dict] = None):
+        if dtype not in DTYPES:
+            raise ValueError(f"Unsupported snapshot dtype {dtype}")
+        self.path = path
+        self.dim = dim
+        self.dtype = np.dtype(dtype).newbyteorder("<")
+        self.header = header or {}
+        self.chunks: List[dict] = []
+        self.count = 0
+        self._tmp = f"{path}.tmp"
+        self._file = open(self._tmp, "wb")
+        self._file.write(MAGIC)
+
+    def write_chunk(self, records: List[dict], vectors):
+        """Append records (dicts with id, text, metadata and hash) and their vectors"""
+        vectors = np.ascontiguousarray(vectors, dtype=self.dtype)
+        if vectors.shape != (len(records), self.dim):
+            raise ValueError(f"Expected {len(records)} vectors of dimension {self.dim}, got {vectors.shape}")
+        padding = -self._file.tell() % _ALIGN
+        self._file.write(b"\0" * padding)
+        vector_offset = self._file.tell()
+        vector_bytes = vectors.tobytes()
+        self._file.write(vector_bytes)
+        records_bytes = zlib.compress(json.dumps(records, separators=(",", ":")).encode("utf-8"), 1)
+        records_offset = self._file.tell()
+        self._file.write(records_bytes)
+        self.chunks.append({
+            "rows": len(records),
+            "vector_offset": vector_offset,
+            "vector_crc": zlib.crc32(vector_bytes),
+            "records_offset": records_offset,
+            "records_length": len(records_bytes),
+            "records_crc": zlib.crc32(records_bytes),
+        })
+        self.count += len(records)
+
+    def close(self):
+        """Write the footer and move the finished snapshot into place"""
+        footer = json.dumps({
+            **self.header,
+            "dim": self.dim,
+            "dtype": self.dtype.name,
+            "count": self.count,
+            "chunks": self.chunks,
+        }).encode("utf-8")
+        self._file.write(footer)
+        self._file.write(_TRAILER.pack(len(footer), MAGIC))
+        self._file.close()
+        # Only complete snapshots ever appear under the final name
+        os.replace(self._tmp, self.path)
+
+    def abort(self):
+        self._file.close()
+        if os.path.exists(self._tmp):
+            os.remove(self._tmp)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+class SnapshotReader:
+    """Reads a snapshot written by ``SnapshotWriter``.
+
+    The file is memory-mapped, so vectors are paged in as chunks are read
+    instead of being loaded up front. Every chunk is checked against its
+    checksums when it is read.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        size = os.path.getsize(path)
+        if size < len(MAGIC) + _TRAILER.size:
+            raise SnapshotError(f"{path} is too short to be a snapshot")
+        with open(path, "rb") as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise SnapshotError(f"{path} is not a snapshot")
+            f.seek(size - _TRAILER.size)
+            footer_length, magic = _TRAILER.unpack(f.read(_TRAILER.size))
+            if magic != MAGIC or footer_length > size - len(MAGIC) - _TRAILER.size:
+                raise SnapshotError(f"{path} is truncated")
+            f.seek(size - _TRAILER.size - footer_length)
+            self.header = json.loads(f.read(footer_length))
+        self.dim = self.header["dim"]
+        self.dtype = np.dtype(self.header["dtype"]).newbyteorder("<")
+        self.count = self.header["count"]
+        self.chunks = self.header["chunks"]
+        self._data = np.memmap(path, dtype=np.uint8, mode="r")
+
+    def __len__(self) -> int:
+        return self.count
+
+    def vectors(self, index: int) -> np.ndarray:
+        """Vectors of a chunk as a read-only view of the mapped file"""
+        chunk = self.chunks[index]
+        length = chunk["rows"] * self.dim * self.dtype.itemsize
+        return self._data[chunk["vector_offset"]:chunk["vector_offset"] + length].view(self.dtype).reshape(
+            chunk["rows"], self.dim
+        )
+
+    def _records_data(self, index: int) -> np.ndarray:
+        chunk = self.chunks[index]
+        return self._data[chunk["records_offset"]:chunk["records_offset"] + chunk["records_length"]]
+
+    def check(self, index: int):
+        """Raise SnapshotError if a chunk's vectors or records fail their checksums"""
+        chunk = self.chunks[index]
+        if zlib.crc32(self.vectors(index)) != chunk["vector_crc"]:
+            raise SnapshotError(f"Vectors of chunk {index} in {self.path} fail their checksum")
+        if zlib.crc32(self._records_data(index)) != chunk["records_crc"]:
+            raise SnapshotError(f"Records of chunk {index} in {self.path} fail their checksum")
+
+    def read_chunk(self, index: int) -> Tuple[List[dict], np.ndarray]:
+        """Checked records and float32 vectors of a chunk"""
+        self.check(index)
+        records = json.loads(zlib.decompress(self._records_data(index)))
+        vectors = self.vectors(index)
+        if len(records) != len(vectors):
+            raise SnapshotError(f"Chunk {index} in {self.path} has {len(records)} records for {len(vectors)} vectors")
+        # A plain array, not a memmap, so per-row views stay cheap
+        return records, np.array(vectors, dtype=np.float32)
+
+    def __iter__(self) -> Iterator[Tuple[List[dict], np.ndarray]]:
+        for index in range(len(self.chunks)):
+            yield self.read_chunk(index)
+
+    def verify(self) -> bool:
+        """Check every chunk's checksums without decoding anything"""
+        try:
+            for index in range(len(self.chunks)):
+                self.check(index)
+            return True
+        except SnapshotError as e:
+            logging.error(str(e))
+            return False
+
+    def close(self):
+        self._data = None
@@ -1,11 +1,30 @@
-from typing import Dict, Optional
+from typing import Dict, List, Literal, Optional, Set
 from datetime import datetime
-from pydantic import BaseModel, HttpUrl
+from pydantic import BaseModel, HttpUrl, model_validator
 import json
 import os
 import logging
-import requests
-from langchain.schema import Document
+import threading
+from langchain_core.documents import Document
+from http_client import default_client
+from routing import RoutingIndex
+from source_store import SourceStore
+
+class PaginationConfig(BaseModel):
+    type: Literal["page", "offset", "cursor"] = "page"
+    page_param: Optional[str] = None  # Defaults to "page" for page and "offset" for offset pagination
+    size_param: Optional[str] = "per_page"
+    page_size: int = 100
+    start: Optional[int] = None  # Defaults to 1 for page and 0 for offset pagination
+    cursor_param: str = "cursor"
+    cursor_key: Optional[str] = "next_cursor"  # Dotted path to the next cursor in the response body
+    max_pages: Optional[int] = None
+
+    @model_validator(mode="after")
+    def _default_page_param(self):
+        if self.page_param is None:
+            self.page_param = "offset" if self.type == "offset" else "page"
+        return self
 
 class APISourceConfig(BaseModel):
     name: str
@@ -18,9 +37,11 @@ class APISourceConfig(BaseModel):
     data_key: Optional[str] = None
     active: bool = True
     added_at: datetime = datetime.now()
-    document_ids: Optional[list] = []
     user_id: Optional[str] = None
     username: Optional[str] = None
+    pagination: Optional[PaginationConfig] = None
+    aliases: Optional[list] = []  # Other names the user may be referred to by in questions
+    metadata_version: int = 0  # Schema of the stored metadata, see formatters.METADATA_VERSION
     
     class Config:
         json_encoders = {
@@ -28,74 +49,184 @@ class APISourceConfig(BaseModel):
         }
 
 class SourceManager:
-    def __init__(self, config_path: str = "sources_config.json"):
-        self.config_path = config_path
-        self.sources: Dict[str, APISourceConfig] = {}
-        self._load_sources()
+    """Source configs, their stored document hashes and the routing index built from them.
+
+    Job workers and the server add, remove and update sources concurrently,
+    so changes are serialized by a lock. ``sources`` is replaced rather than
+    mutated when a source is added or removed, so readers can iterate it
+    without holding the lock.
+    """
+
+    def __init__(self, config_path: str = "sources_config.json", db_path: str = "sources.sqlite"):
+        self.config_path = config_path  # Legacy JSON config, migrated into the store on first load
+        self.store = SourceStore(db_path)
+        self._sources: Optional[Dict[str, APISourceConfig]] = None
+        self._routing = RoutingIndex()
+        self._routing_stale = True
+        self._namespace_refs: Optional[Dict[str, Set[str]]] = None  # Namespace -> ids of all sources using it
+        self._lock = threading.RLock()
+    
+    @property
+    def sources(self) -> Dict[str, APISourceConfig]:
+        """Source configs, read from the store on first use"""
+        if self._sources is None:
+            with self._lock:
+                if self._sources is None:
+                    self._load_sources()
+        return self._sources
+    
+    @property
+    def routing(self) -> RoutingIndex:
+        if self._routing_stale:
+            with self._lock:
+                if self._routing_stale:
+                    self._rebuild_routing()
+        return self._routing
+    
+    def namespace_sources(self, namespace: str) -> List[str]:
+        """Ids of all sources, active or not, that store documents in a namespace"""
+        with self._lock:
+            if self._namespace_refs is None:
+                refs = {}
+                for source_id, source in self.sources.items():
+                    refs.setdefault(source.namespace, set()).add(source_id)
+                self._namespace_refs = refs
+            return sorted(self._namespace_refs.get(namespace, ()))
     
     def _load_sources(self):
-        """Load sources from config file"""
+        """Load source configs from the store, migrating a legacy JSON config first"""
+        sources = {}
         try:
-            if os.path.exists(self.config_path):
-                logging.info(f"Loading sources from {self.config_path}")
-                with open(self.config_path, 'r') as f:
-                    try:
-                        data = json.load(f)
-                        logging.info(f"Loaded data: {json.dumps(data, indent=2)}")
-                        for source_id, source_data in data.items():
-                            source_data['added_at'] = datetime.fromisoformat(source_data['added_at'])
-                            self.sources[source_id] = APISourceConfig(**source_data)
-                        logging.info(f"Loaded {len(self.sources)} sources")
-                    except json.JSONDecodeError:
-                        logging.error("JSON file is corrupted")
-                        self.sources = {}
-                        if os.path.exists(self.config_path):
-                            backup_path = f"{self.config_path}.bak"
-                            os.rename(self.config_path, backup_path)
-            else:
-                logging.info(f"No config file found at {self.config_path}")
-                self.sources = {}
+            if self.store.is_empty() and os.path.exists(self.config_path):
+                self._migrate_json()
+            for source_id, source_data in self.store.load_configs().items():
+                source_data['added_at'] = datetime.fromisoformat(source_data['added_at'])
+                sources[source_id] = APISourceConfig(**source_data)
+            logging.info(f"Loaded {len(sources)} sources")
         except Exception as e:
             logging.error(f"Error loading sources: {str(e)}")
-            self.sources = {}
+        self._sources = sources
+    
+    def _migrate_json(self):
+        """Move sources and their document ids from sources_config.json into the store"""
+        logging.info(f"Migrating sources from {self.config_path}")
+        with open(self.config_path, 'r') as f:
+            try:
+                data = json.load(f)
+            except json.JSONDecodeError:
+                logging.error("JSON file is corrupted")
+                data = None
+        if data is None:
+            os.rename(self.config_path, f"{self.config_path}.bak")
+            return
+        
+        # Every entry is validated before anything is written, so a bad entry
+        # is skipped on its own instead of leaving the migration half done
+        sources = {}
+        for source_id, source_data in data.items():
+            try:
+                document_ids = source_data.pop('document_ids', None) or []
+                document_hashes = source_data.pop('document_hashes', None) or {}
+                source_data['added_at'] = datetime.fromisoformat(source_data['added_at'])
+                config = self._config_data(APISourceConfig(**source_data))
+            except Exception as e:
+                logging.error(f"Skipping source {source_id} while migrating: {str(e)}")
+                continue
+            # Ids written before content hashes existed are kept without a hash
+            documents = {doc_id: None for doc_id in document_ids}
+            documents.update(document_hashes)
+            sources[source_id] = (config, documents)
+        self.store.add_sources(sources)
+        os.rename(self.config_path, f"{self.config_path}.migrated")
+        skipped = len(data) - len(sources)
+        logging.info(f"Migrated {len(sources)} sources to {self.store.path}"
+                     + (f", skipped {skipped} (kept in {self.config_path}.migrated)" if skipped else ""))
+    
+    @staticmethod
+    def _config_data(source: APISourceConfig) -> dict:
+        return {
+            **source.dict(exclude={'endpoint'}),
+            'endpoint': str(source.endpoint),
+            'added_at': source.added_at.isoformat()
+        }
     
     def _save_sources(self):
-        """Save sources to config file"""
+        """Save all source configs"""
         try:
-            data = {
-                source_id: {
-                    **source.dict(exclude={'endpoint'}),
-                    'endpoint': str(source.endpoint),
-                    'added_at': source.added_at.isoformat()
-                }
-                for source_id, source in self.sources.items()
-            }
-            # Write to a temporary file first
-            temp_path = f"{self.config_path}.tmp"
-            with open(temp_path, 'w') as f:
-                json.dump(data, f, indent=2)
-            # Then rename it to the actual config file
-            os.replace(temp_path, self.config_path)
+            with self._lock:
+                self.store.save_configs({
+                    source_id: self._config_data(source) for source_id, source in self.sources.items()
+                })
         except Exception as e:
             logging.error(f"Error saving sources: {str(e)}")
             raise
     
+    def save_source(self, source_id: str):
+        """Save the config of a single source"""
+        with self._lock:
+            self.store.save_config(source_id, self._config_data(self.sources[source_id]))
+    
+    def _rebuild_routing(self):
+        """Refresh the routing index after the set of active sources changed"""
+        self._routing.rebuild((id, source) for id, source in self.sources.items() if source.active)
+        self._routing_stale = False
+    
     def add_source(self, source_id: str, config: dict) -> APISourceConfig:
         """Add a new API source"""
         source = APISourceConfig(**config)
-        self.sources[source_id] = source
-        self._save_sources()
+        with self._lock:
+            self._sources = {**self.sources, source_id: source}
+            self.save_source(source_id)
+            self.store.clear_documents(source_id)
+            self._routing_stale = True
+            self._namespace_refs = None
         return source
     
+    def set_active(self, source_id: str, active: bool = True):
+        """Activate or deactivate a source without removing it"""
+        with self._lock:
+            if source_id in self.sources:
+                self.sources[source_id].active = active
+                self.save_source(source_id)
+                self._routing_stale = True
+                return
+        logging.warning(f"Source {source_id} not found in sources")
+    
     def remove_source(self, source_id: str):
         """Remove a source completely"""
-        if source_id in self.sources:
-            logging.info(f"Removing source {source_id} from sources")
-            del self.sources[source_id]  # Actually delete the source
-            self._save_sources()
-            logging.info(f"Source {source_id} removed and config saved")
-        else:
-            logging.warning(f"Source {source_id} not found in sources")
+        with self._lock:
+            if source_id in self.sources:
+                logging.info(f"Removing source {source_id} from sources")
+                self._sources = {id: source for id, source in self.sources.items() if id != source_id}
+                self.store.delete_source(source_id)
+                self._routing_stale = True
+                self._namespace_refs = None
+                logging.info(f"Source {source_id} removed")
+                return
+        logging.warning(f"Source {source_id} not found in sources")
+    
+    def set_metadata_version(self, source_id: str, version: int):
+        """Record that a source's stored documents now carry the metadata of ``version``"""
+        with self._lock:
+            source = self.sources.get(source_id)
+            if source is not None and source.metadata_version != version:
+                source.metadata_version = version
+                self.save_source(source_id)
+    
+    def get_document_hashes(self, source_id: str) -> Dict[str, Optional[str]]:
+        """Ids of the documents a source has stored, with their content hashes"""
+        return self.store.document_hashes(source_id)
+    
+    def update_documents(self, source_id: str, upserted: Dict[str, Optional[str]], removed=()):
+        """Record documents upserted for a source and forget removed ones"""
+        self.store.update_documents(source_id, upserted, removed)
+    
+    def get_validators(self, source_id: str) -> Optional[dict]:
+        return self.store.validators(source_id)
+    
+    def set_validators(self, source_id: str, validators: Optional[dict]):
+        """Remember the ETag/Last-Modified of a complete fetch, or forget them with None"""
+        self.store.set_validators(source_id, validators)
     
     def get_active_sources(self) -> Dict[str, APISourceConfig]:
         """Get all active sources"""
@@ -104,10 +235,7 @@ class SourceManager:
         return active_sources
     
     def load(self) -> list[Document]:
-        response = requests.get(self.endpoint, params=self.params, headers=self.headers)
-        response.raise_for_status()
-        
-        data = response.json()
+        data = default_client.get_json(self.endpoint, params=self.params, headers=self.headers)
         if self.data_key:
             data = data[self.data_key]
         
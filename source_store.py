@@ -0,0 +1,155 @@
+import json
+import logging
+import sqlite3
+import threading
+from typing import Dict, Iterable, Optional, Tuple
+
+_MAX_PARAMS = 500  # Stay well below SQLite's bound parameter limit
+
+
+class SourceStore:
+    """SQLite persistence for source configs and the documents each source stored.
+
+    Configs are small JSON rows in ``sources``; document ids and their content
+    hashes live in a separate ``documents`` table keyed by (source_id, doc_id),
+    and HTTP validators for conditional refreshes in ``validators``.
+    Changing one source therefore only touches that source's rows, and
+    reading the configs never reads document ids.
+    """
+
+    def __init__(self, path: str = "sources.sqlite"):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA foreign_keys=ON")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS sources (source_id TEXT PRIMARY KEY, config TEXT NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS documents ("
+            "source_id TEXT NOT NULL REFERENCES sources (source_id) ON DELETE CASCADE, "
+            "doc_id TEXT NOT NULL, hash TEXT, PRIMARY KEY (source_id, doc_id)) WITHOUT ROWID"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS validators ("
+            "source_id TEXT PRIMARY KEY REFERENCES sources (source_id) ON DELETE CASCADE, "
+            "etag TEXT, last_modified TEXT)"
+        )
+        self._conn.commit()
+
+    def is_empty(self) -> bool:
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM sources LIMIT 1").fetchone() is None
+
+    def load_configs(self) -> Dict[str, dict]:
+        with self._lock:
+            rows = self._conn.execute("SELECT source_id, config FROM sources").fetchall()
+        return {source_id: json.loads(config) for source_id, config in rows}
+
+    def save_config(self, source_id: str, config: dict):
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO sources (source_id, config) VALUES (?, ?) "
+                "ON CONFLICT (source_id) DO UPDATE SET config = excluded.config",
+                (source_id, json.dumps(config))
+            )
+            self._conn.commit()
+
+    def save_configs(self, configs: Dict[str, dict]):
+        with self._lock:
+            self._conn.executemany(
+                "INSERT INTO sources (source_id, config) VALUES (?, ?) "
+                "ON CONFLICT (source_id) DO UPDATE SET config = excluded.config",
+                [(source_id, json.dumps(config)) for source_id, config in configs.items()]
+            )
+            self._conn.commit()
+
+    def add_sources(self, sources: Dict[str, Tuple[dict, Dict[str, Optional[str]]]]):
+        """Save configs together with their document hashes in one transaction"""
+        with self._lock:
+            try:
+                self._conn.executemany(
+                    "INSERT INTO sources (source_id, config) VALUES (?, ?) "
+                    "ON CONFLICT (source_id) DO UPDATE SET config = excluded.config",
+                    [(source_id, json.dumps(config)) for source_id, (config, _) in sources.items()]
+                )
+                self._conn.executemany(
+                    "INSERT INTO documents (source_id, doc_id, hash) VALUES (?, ?, ?) "
+                    "ON CONFLICT (source_id, doc_id) DO UPDATE SET hash = excluded.hash",
+                    [(source_id, doc_id, digest)
+                     for source_id, (_, documents) in sources.items() for doc_id, digest in documents.items()]
+                )
+                self._conn.commit()
+            except Exception:
+                self._conn.rollback()
+                raise
+
+    def delete_source(self, source_id: str):
+        """Delete a source config together with its document ids"""
+        with self._lock:
+            self._conn.execute("DELETE FROM sources WHERE source_id = ?", (source_id,))
+            self._conn.commit()
+
+    def document_hashes(self, source_id: str) -> Dict[str, Optional[str]]:
+        """Document id -> content hash (None for ids stored before hashes existed)"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT doc_id, hash FROM documents WHERE source_id = ?", (source_id,)
+            ).fetchall()
+        return dict(rows)
+
+    def document_count(self, source_id: str) -> int:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM documents WHERE source_id = ?", (source_id,)
+            ).fetchone()[0]
+
+    def update_documents(self, source_id: str, upserted: Dict[str, Optional[str]], removed: Iterable[str] = ()):
+        """Record new or changed document hashes and forget removed ids, in one transaction"""
+        removed = list(removed)
+        with self._lock:
+            try:
+                self._conn.executemany(
+                    "INSERT INTO documents (source_id, doc_id, hash) VALUES (?, ?, ?) "
+                    "ON CONFLICT (source_id, doc_id) DO UPDATE SET hash = excluded.hash",
+                    [(source_id, doc_id, digest) for doc_id, digest in upserted.items()]
+                )
+                for start in range(0, len(removed), _MAX_PARAMS):
+                    chunk = removed[start:start + _MAX_PARAMS]
+                    placeholders = ",".join("?" * len(chunk))
+                    self._conn.execute(
+                        f"DELETE FROM documents WHERE source_id = ? AND doc_id IN ({placeholders})",
+                        [source_id, *chunk]
+                    )
+                self._conn.commit()
+            except Exception:
+                self._conn.rollback()
+                raise
+        logging.debug(f"Recorded {len(upserted)} documents and removed {len(removed)} for {source_id}")
+
+    def clear_documents(self, source_id: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM documents WHERE source_id = ?", (source_id,))
+            self._conn.execute("DELETE FROM validators WHERE source_id = ?", (source_id,))
+            self._conn.commit()
+
+    def validators(self, source_id: str) -> Optional[dict]:
+        """ETag and Last-Modified of the last complete fetch of a source"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT etag, last_modified FROM validators WHERE source_id = ?", (source_id,)
+            ).fetchone()
+        return {"etag": row[0], "last_modified": row[1]} if row else None
+
+    def set_validators(self, source_id: str, validators: Optional[dict]):
+        with self._lock:
+            if validators and (validators.get("etag") or validators.get("last_modified")):
+                self._conn.execute(
+                    "INSERT INTO validators (source_id, etag, last_modified) VALUES (?, ?, ?) "
+                    "ON CONFLICT (source_id) DO UPDATE SET etag = excluded.etag, last_modified = excluded.last_modified",
+                    (source_id, validators.get("etag"), validators.get("last_modified"))
+                )
+            else:
+                self._conn.execute("DELETE FROM validators WHERE source_id = ?", (source_id,))
+            self._conn.commit()
@@ -0,0 +1,116 @@
+import threading
+
+import pytest
+from langchain_core.documents import Document
+
+from ingest import BulkDeleter, IngestPipeline, IngestProgress
+
+
+def documents(count: int):
+    return [Document(page_content=f"doc {i}") for i in range(count)]
+
+
+def embed(texts):
+    return [[float(len(text))] for text in texts]
+
+
+def by_content(doc):
+    return doc.page_content
+
+
+class Flaky:
+    """Upsert that fails the first ``failures`` calls for each batch it sees"""
+
+    def __init__(self, failures: int):
+        self.failures = failures
+        self.calls = {}
+        self.stored = {}
+        self.lock = threading.Lock()
+
+    def __call__(self, ids, embeddings, docs, namespace):
+        assert len(ids) == len(embeddings) == len(docs)
+        with self.lock:
+            key = ids[0]
+            self.calls[key] = self.calls.get(key, 0) + 1
+            if self.calls[key] <= self.failures:
+                raise RuntimeError("unavailable")
+            self.stored.update(zip(ids, embeddings))
+
+
+def test_pipeline_commits_every_batch():
+    upsert = Flaky(failures=0)
+    committed_batches = []
+    progress = IngestProgress()
+    committed, stats = IngestPipeline(embed, upsert, batch_size=3).run(
+        documents(10), "ns", id_fn=by_content, progress=progress, on_commit=committed_batches.append
+    )
+    assert sorted(committed) == sorted(f"doc {i}" for i in range(10))
+    assert sorted(len(batch) for batch in committed_batches) == [1, 3, 3, 3]
+    assert (stats.documents, stats.batches, stats.failed_batches, stats.retries) == (10, 4, 0, 0)
+    assert (progress.embedded, progress.upserted) == (10, 10)
+    assert upsert.stored["doc 3"] == [5.0]
+
+
+def test_retries_are_counted_and_recover():
+    upsert = Flaky(failures=2)
+    committed, stats = IngestPipeline(embed, upsert, batch_size=5, max_retries=2, retry_backoff=0).run(
+        documents(10), "ns", id_fn=by_content
+    )
+    assert len(committed) == 10
+    assert (stats.retries, stats.failed_batches) == (4, 0)
+
+
+def test_batch_failing_after_retries_is_left_out():
+    upsert = Flaky(failures=3)
+    progress = IngestProgress()
+    committed, stats = IngestPipeline(embed, upsert, batch_size=5, max_retries=2, retry_backoff=0).run(
+        documents(10), "ns", id_fn=by_content, progress=progress
+    )
+    assert committed == []
+    assert (stats.documents, stats.failed_batches, stats.failed_documents, stats.retries) == (0, 2, 10, 4)
+    assert progress.upserted == 0
+
+
+def test_embedding_failure_skips_only_that_batch():
+    def failing_embed(texts):
+        if "doc 0" in texts:
+            raise ValueError("model error")
+        return embed(texts)
+
+    committed, stats = IngestPipeline(failing_embed, Flaky(failures=0), batch_size=4).run(
+        documents(10), "ns", id_fn=by_content
+    )
+    assert sorted(committed) == sorted(f"doc {i}" for i in range(4, 10))
+    assert (stats.batches, stats.failed_batches, stats.failed_documents) == (3, 1, 4)
+
+
+def test_cancel_stops_before_the_next_batch():
+    progress = IngestProgress()
+
+    def cancelling_embed(texts):
+        progress.cancel()
+        return embed(texts)
+
+    committed, stats = IngestPipeline(cancelling_embed, Flaky(failures=0), batch_size=2).run(
+        documents(10), "ns", id_fn=by_content, progress=progress
+    )
+    assert len(committed) == 2
+    assert stats.cancelled
+
+
+@pytest.mark.parametrize("failures, deleted", [(0, 10), (1, 10), (5, 0)])
+def test_bulk_delete_accounting(failures, deleted):
+    calls = {}
+
+    def delete(ids, namespace):
+        calls[ids[0]] = calls.get(ids[0], 0) + 1
+        if calls[ids[0]] <= failures:
+            raise RuntimeError("unavailable")
+
+    progress = IngestProgress()
+    completed, stats = BulkDeleter(delete, batch_size=4, max_retries=1, retry_backoff=0).run(
+        (str(i) for i in range(10)), "ns", progress=progress
+    )
+    assert len(completed) == progress.deleted == stats.documents == deleted
+    assert stats.failed_documents == 10 - deleted
+    assert stats.batches == 3
@@ -0,0 +1,64 @@
+import json
+
+import pytest
+
+from json_stream import JSONArrayStream
+
+ITEMS = [
+    {"id": 1, "name": "Café \"Ünïcode\" [not, an] {array}", "amount": -12.5},
+    {"id": 2, "tags": ["a", "b"], "nested": {"x": [1, 2, {"y": None}]}},
+    12345,
+    "plain, string]",
+    [],
+    1e-7,
+]
+BODY = json.dumps({"meta": {"prev": "]"}, "data": ITEMS, "next_cursor": "abc"}, ensure_ascii=False).encode("utf-8")
+
+
+def chunked(data: bytes, size: int):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 64, len(BODY)])
+def test_items_and_envelope_across_chunk_boundaries(size):
+    stream = JSONArrayStream(chunked(BODY, size), "data")
+    assert list(stream) == ITEMS
+    assert stream.envelope == {"meta": {"prev": "]"}, "data": None, "next_cursor": "abc"}
+
+
+def test_number_split_at_chunk_boundary():
+    assert list(JSONArrayStream([b"[12", b"34, 5", b"6]"])) == [1234, 56]
+
+
+def test_top_level_array_of_str_chunks():
+    assert list(JSONArrayStream(['[{"a": 1},', ' {"b": 2}]'])) == [{"a": 1}, {"b": 2}]
+
+
+def test_empty_array():
+    stream = JSONArrayStream([b'{"data": [], "total": 0}'], "data")
+    assert list(stream) == []
+    assert stream.envelope == {"data": None, "total": 0}
+
+
+def test_key_only_matched_at_top_level():
+    body = b'{"meta": {"data": "nested"}, "data": [1, 2]}'
+    assert list(JSONArrayStream(chunked(body, 5), "data")) == [1, 2]
+
+
+def test_non_array_value_falls_back_to_whole_body():
+    stream = JSONArrayStream([b'{"data": {"id": 1}}'], "data")
+    assert list(stream) == [{"id": 1}]
+    assert stream.envelope == {"data": {"id": 1}}
+
+
+def test_unterminated_array_raises():
+    with pytest.raises(json.JSONDecodeError):
+        list(JSONArrayStream([b'[{"a": 1}, {"b": ']))
+
+
+def test_long_stream_with_buffer_trimming():
+    items = [{"id": i, "text": "x" * 100} for i in range(2000)]
+    body = json.dumps({"data": items, "page": 3}).encode("utf-8")
+    stream = JSONArrayStream(chunked(body, 4096), "data")
+    assert list(stream) == items
+    assert stream.envelope == {"data": None, "page": 3}
@@ -0,0 +1,139 @@
+import numpy as np
+import pytest
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+import local_store
+from local_store import LocalVectorStore
+
+
+class AxisEmbeddings(Embeddings):
+    """Embeds "axis N" as the N-th unit vector, so the nearest document is predictable"""
+
+    dim = 8
+
+    def _embed(self, text: str):
+        vector = np.zeros(self.dim)
+        vector[int(text.split()[1]) % self.dim] = 1.0
+        return vector.tolist()
+
+    def embed_documents(self, texts):
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text):
+        return self._embed(text)
+
+
+def transactions(store: LocalVectorStore, namespace: str = "tx"):
+    ids = [f"t{i}" for i in range(8)]
+    metadatas = [
+        {"type": "transaction", "merchant": ["Starbucks", "Delta"][i % 2], "abs_amount": float(10 * i),
+         "month": i + 1, "tags": ["a", "b"] if i < 2 else []}
+        for i in range(8)
+    ]
+    store.add_texts([f"axis {i}" for i in range(8)], metadatas, ids=ids, namespace=namespace)
+    return ids
+
+
+@pytest.fixture(params=["memory", "disk"])
+def store(request, tmp_path):
+    return LocalVectorStore(AxisEmbeddings(), path=None if request.param == "memory" else str(tmp_path / "store"))
+
+
+def found(store, filter, k=10, query="axis 0"):
+    return sorted(doc.id for doc, _ in store.similarity_search_with_score(query, k=k, filter=filter, namespace="tx"))
+
+
+def test_nearest_first(store):
+    transactions(store)
+    results = store.similarity_search_with_score("axis 3", k=2, namespace="tx")
+    assert results[0][0].id == "t3"
+    assert results[0][1] == pytest.approx(1.0)
+    assert results[1][1] == pytest.approx(0.0)
+
+
+@pytest.mark.parametrize("filter, expected", [
+    ({"merchant": "Delta"}, ["t1", "t3", "t5", "t7"]),
+    ({"merchant": {"$in": ["Delta", "Unknown"]}, "month": {"$lte": 4}}, ["t1", "t3"]),
+    ({"merchant": {"$ne": "Delta"}, "abs_amount": {"$gt": 20, "$lt": 60}}, ["t4"]),
+    ({"merchant": {"$nin": ["Delta"]}, "month": {"$eq": 7}}, ["t6"]),
+    ({"tags": "b"}, ["t0", "t1"]),
+    ({"$or": [{"month": 1}, {"abs_amount": {"$gte": 70}}]}, ["t0", "t7"]),
+    ({"$and": [{"type": "transaction"}, {"merchant": "Starbucks"}, {"month": {"$gte": 5}}]}, ["t4", "t6"]),
+    ({"missing_field": {"$gte": 0}}, []),
+])
+def test_filters(store, filter, expected):
+    transactions(store)
+    assert found(store, filter) == expected
+    assert store.count("tx", filter) == len(expected)
+
+
+def test_unsupported_operator(store):
+    transactions(store)
+    with pytest.raises(ValueError):
+        found(store, {"month": {"$regex": "1"}})
+
+
+def test_upsert_replaces_and_delete_tombstones(store):
+    transactions(store)
+    store.add_texts(["axis 5"], [{"merchant": "Uber", "month": 12}], ids=["t0"], namespace="tx")
+    store.delete(ids=["t1"], namespace="tx")
+    assert store.count("tx") == 7
+    assert found(store, {"merchant": "Starbucks"}) == ["t2", "t4", "t6"]
+    assert found(store, {"month": 12}) == ["t0"]
+    assert "t1" not in found(store, None)
+    # The replacement carries its new vector
+    _, vectors = store.get_embeddings_by_ids(["t0"], "tx")
+    assert np.argmax(vectors[0]) == 5
+
+
+def test_update_metadata_keeps_vector(store):
+    transactions(store)
+    store.update_metadata({"t2": {"merchant": "Delta", "date_days": 19000}}, namespace="tx")
+    assert found(store, {"date_days": {"$gte": 19000}}) == ["t2"]
+    documents, vectors = store.get_embeddings_by_ids(["t2", "nope"], namespace="tx")
+    assert [doc.metadata["merchant"] for doc in documents] == ["Delta"]
+    assert documents[0].metadata["month"] == 3
+    assert np.argmax(vectors[0]) == 2
+
+
+def test_compaction_keeps_live_rows(store, monkeypatch):
+    monkeypatch.setattr(local_store, "_COMPACT_MIN_DEAD_ROWS", 4)
+    transactions(store)
+    for _ in range(3):
+        transactions(store)
+    store.delete(ids=["t0", "t1", "t2"], namespace="tx")
+    namespace = store._namespace("tx")
+    assert namespace.size == namespace.count == 5
+    assert found(store, {"merchant": "Delta"}) == ["t3", "t5", "t7"]
+    assert store.similarity_search_with_score("axis 4", k=1, namespace="tx")[0][0].id == "t4"
+
+
+def test_persisted_state_reloads(tmp_path):
+    path = str(tmp_path / "store")
+    store = LocalVectorStore(AxisEmbeddings(), path=path)
+    transactions(store)
+    store.delete(ids=["t3"], namespace="tx")
+    store.update_metadata({"t4": {"merchant": "Uber"}}, namespace="tx")
+    store._namespace("tx").compact()
+    store.delete(ids=["t5"], namespace="tx")
+
+    reloaded = LocalVectorStore(AxisEmbeddings(), path=path)
+    assert reloaded.count("tx") == 6
+    assert found(reloaded, {"merchant": "Uber"}) == ["t4"]
+    assert found(reloaded, {"merchant": "Delta"}) == ["t1", "t7"]
+    assert reloaded.similarity_search_with_score("axis 6", k=1, namespace="tx")[0][0].id == "t6"
+
+
+def test_delete_all_and_unknown_namespace(store):
+    transactions(store)
+    store.delete(namespace="tx", delete_all=True)
+    assert store.count("tx") == 0
+    assert store.similarity_search("axis 1", namespace="tx") == []
+    assert store.get_by_ids(["t1"], namespace="other") == []
+
+
+def test_upsert_embeddings_normalizes(store):
+    store.upsert_embeddings(["a"], [[3.0, 4.0] + [0.0] * 6], [Document(page_content="x", metadata={})], "tx")
+    _, vectors = store.get_embeddings_by_ids(["a"], "tx")
+    assert np.linalg.norm(vectors[0]) == pytest.approx(1.0)
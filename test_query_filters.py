@@ -0,0 +1,59 @@
+from datetime import date
+
+import pytest
+
+from query_filters import extract_filters, mentions, to_day
+
+TODAY = date(2024, 6, 15)
+
+
+@pytest.mark.parametrize("question", [
+    "which costs went up over 100%",
+    "costs over 100 %",
+    "anything that grew over 100%.",
+    "spending more than 50 percent on rent",
+    "more than 5 transactions at Starbucks",
+])
+def test_percentages_and_counts_are_not_amounts(question):
+    filters = extract_filters(question, today=TODAY)
+    assert filters.min_amount is None
+    assert filters.max_amount is None
+
+
+@pytest.mark.parametrize("question, bounds", [
+    ("purchases over $100", (100.0, None)),
+    ("coffee under 20 dollars", (None, 20.0)),
+    ("between $50 and $200 last month", (50.0, 200.0)),
+    ("over 1,250.50 at Delta", (1250.5, None)),
+    ("anything over $2k", (2000.0, None)),
+    ("flights under 1.5k", (None, 1500.0)),
+    ("between $500 and 1.2m", (500.0, 1200000.0)),
+    ("over 5min", (None, None)),
+])
+def test_amounts(question, bounds):
+    filters = extract_filters(question, today=TODAY)
+    assert (filters.min_amount, filters.max_amount) == bounds
+
+
+def test_years_are_not_amounts():
+    filters = extract_filters("spending after 2023", today=TODAY)
+    assert filters.min_amount is None
+
+
+def test_year_range():
+    filters = extract_filters("spending between 2020 and 2023", today=TODAY)
+    assert (filters.start_day, filters.end_day) == (to_day("2020-01-01"), to_day("2023-12-31"))
+    assert filters.min_amount is None
+
+
+def test_relative_period():
+    filters = extract_filters("groceries last month", today=TODAY)
+    assert (filters.start_day, filters.end_day) == (to_day("2024-05-01"), to_day("2024-05-31"))
+
+
+def test_mentions_whole_words_only():
+    assert mentions("how much on food last week", "food")
+    assert not mentions("how much on seafood", "food")
+    assert not mentions("trip to vegas", "gas")
+    assert mentions("food and drink in may", "food_and_drink", plural=True)
+    assert mentions("all my restaurants", "restaurant", plural=True)
@@ -0,0 +1,94 @@
+import os
+
+import numpy as np
+import pytest
+
+from snapshot import SnapshotError, SnapshotReader, SnapshotWriter
+
+DIM = 5
+
+
+def records(start: int, count: int):
+    return [{"id": f"d{i}", "text": f"doc {i}", "metadata": {"amount": i * 1.5, "tags": ["a"]}, "hash": f"h{i}"}
+            for i in range(start, start + count)]
+
+
+def vectors(start: int, count: int):
+    return np.arange(start * DIM, (start + count) * DIM, dtype=np.float32).reshape(count, DIM) / 100
+
+
+def write(path, dtype="float32", chunks=(3, 4, 1)):
+    with SnapshotWriter(str(path), dim=DIM, dtype=dtype, header={"namespace": "tx"}) as writer:
+        start = 0
+        for count in chunks:
+            writer.write_chunk(records(start, count), vectors(start, count))
+            start += count
+    return str(path)
+
+
+@pytest.mark.parametrize("dtype, tolerance", [("float32", 0), ("float16", 1e-3)])
+def test_round_trip(tmp_path, dtype, tolerance):
+    reader = SnapshotReader(write(tmp_path / "s.fsnap", dtype))
+    assert (len(reader), len(reader.chunks), reader.header["namespace"]) == (8, 3, "tx")
+    assert all(chunk["vector_offset"] % 64 == 0 for chunk in reader.chunks)
+    rows, values = [], []
+    for chunk_records, chunk_vectors in reader:
+        assert chunk_vectors.dtype == np.float32
+        rows += chunk_records
+        values.append(chunk_vectors)
+    assert rows == records(0, 8)
+    np.testing.assert_allclose(np.concatenate(values), vectors(0, 8), atol=tolerance)
+    assert reader.verify()
+    reader.close()
+
+
+def test_unfinished_snapshot_is_not_in_place(tmp_path):
+    path = str(tmp_path / "s.fsnap")
+    with pytest.raises(RuntimeError):
+        with SnapshotWriter(path, dim=DIM) as writer:
+            writer.write_chunk(records(0, 2), vectors(0, 2))
+            raise RuntimeError("export failed")
+    assert os.listdir(tmp_path) == []
+
+
+def test_shape_mismatch(tmp_path):
+    writer = SnapshotWriter(str(tmp_path / "s.fsnap"), dim=DIM)
+    with pytest.raises(ValueError):
+        writer.write_chunk(records(0, 3), vectors(0, 2))
+    with pytest.raises(ValueError):
+        SnapshotWriter(str(tmp_path / "other.fsnap"), dim=DIM, dtype="int8")
+    writer.abort()
+
+
+@pytest.mark.parametrize("part", ["vector", "records"])
+def test_corruption_fails_checksum(tmp_path, part):
+    path = write(tmp_path / "s.fsnap")
+    offset = SnapshotReader(path).chunks[1][f"{part}_offset"]
+    with open(path, "r+b") as f:
+        f.seek(offset + 1)
+        byte = f.read(1)
+        f.seek(offset + 1)
+        f.write(bytes([byte[0] ^ 0xFF]))
+    reader = SnapshotReader(path)
+    assert not reader.verify()
+    reader.read_chunk(0)
+    with pytest.raises(SnapshotError, match="checksum"):
+        reader.read_chunk(1)
+
+
+def test_truncated_and_foreign_files(tmp_path):
+    path = write(tmp_path / "s.fsnap")
+    with open(path, "rb") as f:
+        data = f.read()
+    truncated = tmp_path / "t.fsnap"
+    truncated.write_bytes(data[:-100])
+    with pytest.raises(SnapshotError, match="truncated"):
+        SnapshotReader(str(truncated))
+    foreign = tmp_path / "f.fsnap"
+    foreign.write_bytes(b"not a snapshot at all" * 4)
+    with pytest.raises(SnapshotError, match="not a snapshot"):
+        SnapshotReader(str(foreign))
+    short = tmp_path / "e.fsnap"
+    short.write_bytes(b"FSNAP")
+    with pytest.raises(SnapshotError, match="too short"):
+        SnapshotReader(str(short))
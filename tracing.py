@@ -0,0 +1,156 @@
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager, nullcontext
+from typing import Dict, Optional
+
+try:
+    from config import trace_enabled
+except ImportError:
+    trace_enabled = True
+
+try:
+    from config import trace_path
+except ImportError:
+    trace_path = None  # e.g. "trace.json", viewable in chrome://tracing or Perfetto
+
+_DISABLED = nullcontext()
+
+
+class Histogram:
+    """Latency samples of one stage; percentiles are taken over the most recent ``window`` samples"""
+
+    def __init__(self, window: int = 4096):
+        self.samples = deque(maxlen=window)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds: float):
+        self.samples.append(seconds)
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def percentile(self, q: float) -> float:
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        return ordered[min(int(q / 100 * len(ordered)), len(ordered) - 1)]
+
+    def summary(self) -> dict:
+        return {
+            "count": self.count,
+            "mean": self.total / self.count if self.count else 0.0,
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+            "p99": self.percentile(99),
+            "max": self.max,
+        }
+
+
+class Tracer:
+    """Spans, latency histograms and counters for the ingest and chat stages.
+
+    ``span(name)`` times a block into the histogram of that name; ``record``
+    adds a duration measured elsewhere and ``count`` bumps a counter such as
+    documents, bytes or tokens. When ``trace_path`` is set, spans are also
+    kept as Chrome trace events and written there by ``export``. A disabled
+    tracer hands out a shared no-op context, so instrumentation costs one
+    attribute check.
+    """
+
+    def __init__(self, enabled: bool = True, trace_path: Optional[str] = None, max_events: int = 100_000):
+        self.enabled = enabled
+        self.trace_path = trace_path
+        self.histograms: Dict[str, Histogram] = {}
+        self.counters: Dict[str, float] = {}
+        self.events = deque(maxlen=max_events)
+        self._origin = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def span(self, name: str, **args):
+        if not self.enabled:
+            return _DISABLED
+        return self._span(name, args)
+
+    @contextmanager
+    def _span(self, name: str, args: dict):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start, start=start, **args)
+
+    def record(self, name: str, seconds: float, start: Optional[float] = None, **args):
+        if not self.enabled:
+            return
+        with self._lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.add(seconds)
+            if self.trace_path:
+                if start is None:
+                    start = time.perf_counter() - seconds
+                self.events.append({
+                    "name": name,
+                    "cat": name.split(".", 1)[0],
+                    "ph": "X",
+                    "ts": (start - self._origin) * 1e6,
+                    "dur": seconds * 1e6,
+                    "pid": os.getpid(),
+                    "tid": threading.get_ident(),
+                    "args": args,
+                })
+
+    def count(self, name: str, value: float = 1):
+        if not self.enabled:
+            return
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "latency": {name: histogram.summary() for name, histogram in sorted(self.histograms.items())},
+                "counters": dict(sorted(self.counters.items())),
+            }
+
+    def format_stats(self) -> str:
+        stats = self.stats()
+        lines = [f"{'stage':<28}{'count':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}"]
+        for name, summary in stats["latency"].items():
+            lines.append(
+                f"{name:<28}{summary['count']:>8}{summary['p50'] * 1000:>10.1f}"
+                f"{summary['p95'] * 1000:>10.1f}{summary['p99'] * 1000:>10.1f}{summary['max'] * 1000:>10.1f}"
+            )
+        for name, value in stats["counters"].items():
+            lines.append(f"{name:<28}{value:>8g}")
+        return "\n".join(lines)
+
+    def export(self, path: Optional[str] = None):
+        """Write the recorded spans as a Chrome trace (JSON trace event format)"""
+        path = path or self.trace_path
+        if not path:
+            return
+        try:
+            with self._lock:
+                events = list(self.events)
+            with open(path, 'w') as f:
+                json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+            logging.info(f"Wrote {len(events)} trace events to {path}")
+        except Exception as e:
+            logging.error(f"Error exporting trace: {str(e)}")
+
+    def reset(self):
+        with self._lock:
+            self.histograms.clear()
+            self.counters.clear()
+            self.events.clear()
+
+
+tracer = Tracer(enabled=trace_enabled, trace_path=trace_path)